@@ -0,0 +1,73 @@
+"""Benchmark of compiled patterns against interpreted patterns checks.
+Checks every item of decompiled functions of current database with a set of patterns,
+verifies that both checks give the same results.
+Run as IDA script (File -> Script file...) or headless with python -m benchmarks.compiled_patterns
+on synthetic functions."""
+
+import time
+
+import herast.offline
+is_offline = herast.offline.install()
+
+import idautils
+
+from herapi import *
+from herast.tree.processing import TreeProcessor
+from herast.tree.pattern_context import PatternContext
+
+
+def make_patterns():
+	return {
+		"call with args": ExprInsPat(CallPat(ObjPat(), AnyPat(), NumPat(0), skip_missing=True)),
+		"symmetric add": AsgPat(VarBindPat("v"), AddPat(VarBindPat("v"), NumPat(1), symmetric=True)),
+		"or of calls": OrPat(CallPat(HelperPat("memset")), CallPat(HelperPat("memcpy")), CallPat(ObjPat(), ignore_arguments=True)),
+		"if with return": IfPat(AnyPat(), RetPat(), should_wrap_in_block=True),
+		"deep num": ExprInsPat(DeepExprPat(NumPat(0), bind_name="zero")),
+		"binded asg": ExprInsPat(AsgPat(BindItemPat("lhs"), BindItemPat("rhs", CastPat(AnyPat())))),
+	}
+
+def collect_items(functions_count):
+	trees = []
+	for func_ea in idautils.Functions():
+		if len(trees) >= functions_count:
+			break
+
+		cfunc = get_cfunc(func_ea)
+		if cfunc is None:
+			continue
+
+		tree_proc = TreeProcessor(cfunc)
+		trees.append((tree_proc, list(tree_proc.iterate_subitems(cfunc.body))))
+	return trees
+
+def measure(trees, checker, repeats=3):
+	best = None
+	results = []
+	for _ in range(repeats):
+		results = []
+		start = time.perf_counter()
+		for tree_proc, items in trees:
+			ctx = PatternContext(tree_proc)
+			for item in items:
+				results.append(checker(item, ctx))
+				ctx.cleanup()
+		elapsed = time.perf_counter() - start
+		best = elapsed if best is None else min(best, elapsed)
+	return best, results
+
+def main(functions_count=200):
+	if is_offline:
+		from herast.offline.samples import populate_database
+		populate_database(functions_count)
+
+	trees = collect_items(functions_count)
+	print("%d functions, %d items" % (len(trees), sum(len(items) for _, items in trees)))
+	for name, pattern in make_patterns().items():
+		interpreted, expected = measure(trees, pattern.check)
+		compiled, results = measure(trees, compile_pattern(pattern))
+		status = "ok" if results == expected else "MISMATCH"
+		print("%-16s interpreted %8.4f compiled %8.4f speedup x%.1f %s" % (name, interpreted, compiled, interpreted / compiled, status))
+
+
+if __name__ == "__main__":
+	main()
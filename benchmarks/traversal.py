@@ -0,0 +1,112 @@
+"""Benchmark of ctree traversal on large synthetic trees.
+Compares current traversal engine with previous list based one.
+Run as IDA script (File -> Script file...) or headless with python -m benchmarks.traversal"""
+
+import time
+
+import herast.offline
+herast.offline.install()
+
+import idaapi
+
+from herast.tree.processing import iterate_all_subitems, iterate_all_subinstrs, BFS_ORDER, DFS_ORDER
+from herast.tree.consts import binary_expressions_ops, unary_expressions_ops
+
+
+class Node:
+	"""Synthetic ctree item, has only attributes used during traversal."""
+	def __init__(self, op, **kwargs):
+		self.op = op
+		self.__dict__.update(kwargs)
+
+	def is_expr(self):
+		return self.op < idaapi.cit_empty
+
+class Slots:
+	def __init__(self, **kwargs):
+		self.__dict__.update(kwargs)
+
+
+def make_expression(depth):
+	if depth == 0:
+		return Node(idaapi.cot_var)
+	if depth % 3 == 0:
+		return Node(idaapi.cot_call, x=Node(idaapi.cot_obj), a=[make_expression(depth - 1), Node(idaapi.cot_num)])
+	return Node(idaapi.cot_add, x=make_expression(depth - 1), y=Node(idaapi.cot_num))
+
+def make_instruction(i):
+	expr = make_expression(4)
+	if i % 4 == 0:
+		body = Node(idaapi.cit_block, cblock=[Node(idaapi.cit_expr, cexpr=expr)])
+		return Node(idaapi.cit_if, cif=Slots(expr=make_expression(2), ithen=body, ielse=None))
+	if i % 4 == 1:
+		body = Node(idaapi.cit_block, cblock=[Node(idaapi.cit_expr, cexpr=expr)])
+		return Node(idaapi.cit_for, cfor=Slots(init=make_expression(1), expr=make_expression(1), step=make_expression(1), body=body))
+	return Node(idaapi.cit_expr, cexpr=expr)
+
+def make_tree(instructions_count):
+	return Node(idaapi.cit_block, cblock=[make_instruction(i) for i in range(instructions_count)])
+
+
+# previous implementation, kept here for comparison
+legacy_op2func = {
+	idaapi.cit_expr:     lambda x: [x.cexpr],
+	idaapi.cit_block:    lambda x: [i for i in x.cblock],
+	idaapi.cit_if:       lambda x: [x.cif.ithen, x.cif.ielse, x.cif.expr],
+	idaapi.cit_for:      lambda x: [x.cfor.body, x.cfor.init, x.cfor.expr, x.cfor.init],
+	idaapi.cot_call:     lambda x: [i for i in x.a] + [x.x],
+}
+for i in unary_expressions_ops:
+	legacy_op2func[i] = lambda x: [x.x]
+for i in binary_expressions_ops:
+	legacy_op2func[i] = lambda x: [x.x, x.y]
+
+def legacy_get_children(item):
+	handler = legacy_op2func.get(item.op, None)
+	if handler is None:
+		return []
+	return list(filter(None, handler(item)))
+
+def legacy_iterate_all_subitems(item):
+	unprocessed_items = [item]
+	while len(unprocessed_items) != 0:
+		current_item = unprocessed_items.pop(0)
+		yield current_item
+		unprocessed_items += legacy_get_children(current_item)
+
+def legacy_iterate_all_subinstrs(instr):
+	unprocessed_items = [instr]
+	while len(unprocessed_items) != 0:
+		current_item = unprocessed_items.pop(0)
+		yield current_item
+		children = legacy_get_children(current_item)
+		children = [c for c in children if not c.is_expr()]
+		unprocessed_items += children
+
+
+def measure(name, iterator_factory, repeats=3):
+	best = None
+	count = 0
+	for _ in range(repeats):
+		start = time.perf_counter()
+		count = sum(1 for _ in iterator_factory())
+		elapsed = time.perf_counter() - start
+		best = elapsed if best is None else min(best, elapsed)
+	print("%-28s %8d items %10.4f seconds" % (name, count, best))
+	return best
+
+def main(sizes=(1000, 5000, 20000)):
+	for size in sizes:
+		tree = make_tree(size)
+		print("tree with %d top level instructions" % size)
+		legacy = measure("legacy subitems", lambda: legacy_iterate_all_subitems(tree))
+		bfs = measure("bfs subitems", lambda: iterate_all_subitems(tree, BFS_ORDER))
+		measure("dfs subitems", lambda: iterate_all_subitems(tree, DFS_ORDER))
+		legacy_instrs = measure("legacy subinstrs", lambda: legacy_iterate_all_subinstrs(tree))
+		instrs = measure("bfs subinstrs", lambda: iterate_all_subinstrs(tree, BFS_ORDER))
+		print("speedup: subitems x%.1f, subinstrs x%.1f" % (legacy / bfs, legacy_instrs / instrs))
+		print()
+
+
+if __name__ == "__main__":
+	main()
@@ -14,8 +14,18 @@ from herast.settings.settings_manager import *
 from herast.passive_manager import *
 
 from herast.tree.utils import *
-from herast.tree.matcher import Matcher, get_cfunc
+from herast.tree.matcher import Matcher, MatchRecord, get_cfunc, get_cfunc_cache
 from herast.tree.scheme import Scheme
+from herast.tree.pattern_compiler import compile_pattern
+from herast.tree.pattern_optimizer import optimize_pattern
+from herast.tree.pattern_analysis import find_pattern_candidates
+from herast.tree.pattern_tuning import tune_pattern, tune_scheme, save_tuned_plan, load_tuned_plan
+from herast.tree.match_cache import get_match_cache
+from herast.tree.feature_index import get_feature_index
+from herast.tree.call_graph import get_callers_index
+from herast.tree.symbols import get_symbol_cache
+from herast.tree.profiler import enable_profiling, disable_profiling, reset_profiling, get_schemes_profile, print_profile
+from herast.corpus import export_corpus, match_corpus, CorpusReader, CorpusWriter
 from herast.settings import runtime_settings
 
 def __print_padded(*args, padlen=0):
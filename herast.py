@@ -11,12 +11,24 @@ def reload_modules():
 	idaapi.require('herast.tree.consts')
 	idaapi.require('herast.tree.utils')
 	idaapi.require('herast.tree.pattern_context')
+	idaapi.require('herast.tree.symbols')
 	idaapi.require('herast.tree.processing')
 	idaapi.require('herast.tree.patterns.base_pattern')
 	idaapi.require('herast.tree.patterns.abstracts')
 	idaapi.require('herast.tree.patterns.instructions')
 	idaapi.require('herast.tree.patterns.expressions')
 	idaapi.require('herast.tree.patterns.helpers')
+	idaapi.require('herast.tree.pattern_analysis')
+	idaapi.require('herast.tree.pattern_optimizer')
+	idaapi.require('herast.tree.pattern_compiler')
+	idaapi.require('herast.tree.pattern_tuning')
+	idaapi.require('herast.tree.pattern_network')
+	idaapi.require('herast.tree.anchors')
+	idaapi.require('herast.tree.profiler')
+	idaapi.require('herast.tree.prefilter')
+	idaapi.require('herast.tree.match_cache')
+	idaapi.require('herast.tree.feature_index')
+	idaapi.require('herast.tree.call_graph')
 	idaapi.require('herast.tree.matcher')
 	idaapi.require('herast.tree.callbacks')
 	idaapi.require('herast.tree.actions')
@@ -24,6 +36,7 @@ def reload_modules():
 
 	idaapi.require('herast.tree.scheme')
 	idaapi.require('herast.schemes_storage')
+	idaapi.require('herast.corpus')
 
 	idaapi.require('herast.passive_manager')
 
@@ -37,6 +50,12 @@ import herast.passive_manager as passive_manager
 import herast.settings.settings_manager as settings_manager
 
 from herast.tree.actions import action_manager, hx_callback_manager
+from herast.tree.match_cache import reset_match_cache
+from herast.tree.feature_index import reset_feature_index, on_function_decompiled
+from herast.tree.call_graph import reset_callers_index
+from herast.tree.matcher import get_cfunc_cache, reset_cfunc_cache
+from herast.settings import runtime_settings
+from herast.tree.symbols import reset_symbol_cache
 
 
 def unload_callback():
@@ -86,14 +105,20 @@ def herast_callback(*args):
 	assert isinstance(cfunc.body.cblock, idaapi.cblock_t), "Function body must be a cblock_t"
 
 	try:
-		matcher = passive_manager.get_passive_matcher()
+		# function is decompiled again, so cached decompilation is outdated
+		if runtime_settings.USE_CFUNC_CACHE:
+			get_cfunc_cache().invalidate(cfunc.entry_ea)
+
 		if settings_manager.get_time_matching():
 			traversal_start = time.time()
-			matcher.match_cfunc(cfunc)
+			passive_manager.match_passively(cfunc)
 			traversal_end = time.time()
 			print("[TIME] Tree traversal done within %f seconds" % (traversal_end - traversal_start))
 		else:
-			matcher.match_cfunc(cfunc)
+			passive_manager.match_passively(cfunc)
+
+		if runtime_settings.UPDATE_FEATURE_INDEX:
+			on_function_decompiled(cfunc)
 
 	except Exception as e:
 		print(e)
@@ -116,6 +141,11 @@ def main():
 	
 	# first import before IDB got loaded does not correctly loads settings
 	settings_manager.reload_settings()
+	reset_match_cache()
+	reset_feature_index()
+	reset_callers_index()
+	reset_cfunc_cache()
+	reset_symbol_cache()
 
 	__register_action(smanager_view.ShowScriptManager())
 	# dummy way to register action to unload hexrays-callback, thus it won't be triggered multiple times at once
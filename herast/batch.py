@@ -0,0 +1,176 @@
+"""Headless parallel matching of schemes storages over corpus of functions.
+
+Usage:
+	python -m herast.batch CORPUS -s STORAGE [-s STORAGE ...] [-j WORKERS] [-o RESULTS.json]
+
+Corpus is split into chunks of functions, every worker process loads storages
+once and then lazily reads only its functions from corpus, so trees are never
+sent between processes. Workers report matches and timings, that are merged in
+the main process.
+"""
+
+from __future__ import annotations
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import time
+
+import herast.offline
+herast.offline.install()
+
+from herast.corpus import CorpusReader
+
+
+class BatchResult:
+	"""Merged results of batch matching."""
+	def __init__(self):
+		# (function ea, item ea, scheme name)
+		self.matches : list[tuple[int, int, str]] = []
+		self.functions_count = 0
+		self.failed_functions : list[int] = []
+		# total time of matching in workers
+		self.matching_time = 0.0
+		self.wall_time = 0.0
+		self.workers_count = 0
+
+	def merge(self, chunk_result: dict):
+		self.matches += [tuple(m) for m in chunk_result["matches"]]
+		self.functions_count += chunk_result["functions_count"]
+		self.failed_functions += chunk_result["failed_functions"]
+		self.matching_time += chunk_result["matching_time"]
+
+	def get_schemes_matches_count(self) -> dict[str, int]:
+		counts = {}
+		for _, _, scheme_name in self.matches:
+			counts[scheme_name] = counts.get(scheme_name, 0) + 1
+		return counts
+
+	def get_matched_functions(self) -> list[int]:
+		return sorted({func_ea for func_ea, _, _ in self.matches})
+
+	def to_dict(self) -> dict:
+		return {
+			"functions_count": self.functions_count,
+			"matched_functions_count": len(self.get_matched_functions()),
+			"schemes": self.get_schemes_matches_count(),
+			"matches": sorted(self.matches),
+			"failed_functions": sorted(self.failed_functions),
+			"stats": {
+				"workers": self.workers_count,
+				"wall_time": self.wall_time,
+				"matching_time": self.matching_time,
+				"functions_per_second": self.functions_count / self.wall_time if self.wall_time else 0.0,
+			},
+		}
+
+	def print_summary(self):
+		print("matched %d functions out of %d in %.2f seconds with %d workers" % (
+			len(self.get_matched_functions()), self.functions_count, self.wall_time, self.workers_count))
+		for scheme_name, count in sorted(self.get_schemes_matches_count().items()):
+			print("    %-40s %d matches" % (scheme_name, count))
+		if self.failed_functions:
+			print("[!] %d functions failed" % len(self.failed_functions))
+
+
+def get_storages_paths(paths: list[str]) -> list[str]:
+	"""Expand folders into storages files, like passive manager does."""
+	storages_paths = []
+	for path in paths:
+		path = os.path.abspath(path)
+		if os.path.isdir(path):
+			storages_paths += sorted(glob.iglob(path + '/**/**.py', recursive=True))
+		else:
+			storages_paths.append(path)
+	return storages_paths
+
+
+# worker process state
+__worker_matcher = None
+__worker_reader = None
+
+def __initialize_worker(corpus_path: str, storages_paths: list[str]):
+	global __worker_matcher, __worker_reader
+	herast.offline.install()
+	from herast.tree.matcher import Matcher
+	import herast.passive_manager as passive_manager
+
+	__worker_matcher = Matcher()
+	for storage_path in storages_paths:
+		storage = passive_manager.load_storage(storage_path)
+		if storage is None:
+			continue
+		for name, scheme in storage.get_schemes():
+			__worker_matcher.add_scheme(name, scheme)
+	__worker_reader = CorpusReader(corpus_path)
+
+def __match_chunk(functions_eas: list[int]) -> dict:
+	matches = []
+	failed_functions = []
+
+	def on_match(scheme_name, item, ctx):
+		matches.append((ctx.get_func_ea(), item.ea, scheme_name))
+
+	__worker_matcher.add_match_callback(on_match)
+	start = time.perf_counter()
+	for func_ea in functions_eas:
+		try:
+			cfunc = __worker_reader.get_cfunc(func_ea)
+			__worker_matcher.match_cfunc(cfunc)
+		except Exception as e:
+			print("[!] Failed to match function %#x: %s" % (func_ea, e))
+			failed_functions.append(func_ea)
+	matching_time = time.perf_counter() - start
+	__worker_matcher.remove_match_callback(on_match)
+
+	return {
+		"matches": matches,
+		"functions_count": len(functions_eas),
+		"failed_functions": failed_functions,
+		"matching_time": matching_time,
+	}
+
+def match_corpus_parallel(corpus_path: str, storages_paths: list[str], workers=None, chunk_size=64) -> BatchResult:
+	"""Match schemes from storages on every function in corpus in parallel.
+
+	:param corpus_path: path to corpus file
+	:param storages_paths: paths to storages files or folders with them
+	:param workers: count of worker processes, CPU count by default
+	:param chunk_size: count of functions sent to a worker at once
+	"""
+	corpus_path = os.path.abspath(corpus_path)
+	storages_paths = get_storages_paths(storages_paths)
+	with CorpusReader(corpus_path) as reader:
+		functions_eas = reader.get_functions_eas()
+
+	chunks = [functions_eas[i:i + chunk_size] for i in range(0, len(functions_eas), chunk_size)]
+	result = BatchResult()
+	result.workers_count = workers or os.cpu_count() or 1
+
+	start = time.perf_counter()
+	with multiprocessing.Pool(result.workers_count, __initialize_worker, (corpus_path, storages_paths)) as pool:
+		for chunk_result in pool.imap_unordered(__match_chunk, chunks):
+			result.merge(chunk_result)
+	result.wall_time = time.perf_counter() - start
+	return result
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(prog="python -m herast.batch", description="Match schemes storages over corpus of functions")
+	parser.add_argument("corpus", help="path to corpus file")
+	parser.add_argument("-s", "--storage", action="append", required=True, help="storage file or folder with storages")
+	parser.add_argument("-j", "--workers", type=int, default=None, help="count of worker processes")
+	parser.add_argument("--chunk-size", type=int, default=64, help="count of functions in one task for worker")
+	parser.add_argument("-o", "--output", default=None, help="path to JSON file with results")
+	args = parser.parse_args(argv)
+
+	result = match_corpus_parallel(args.corpus, args.storage, args.workers, args.chunk_size)
+	result.print_summary()
+	if args.output is not None:
+		with open(args.output, "w") as f:
+			json.dump(result.to_dict(), f, indent=1)
+
+
+if __name__ == "__main__":
+	main()
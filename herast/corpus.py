@@ -0,0 +1,377 @@
+"""Corpus of decompiled functions, stored in compact on-disk format.
+Allows to match schemes against exported functions without decompiling them again.
+
+File format (all integers are little endian):
+	header:  magic "HRSTCRP1", u32 length, zlib compressed JSON with ops names
+	records: u64 function ea, u32 length, zlib compressed JSON with function record
+	index:   record with BADADDR ea, its payload is JSON list of [function ea, record offset]
+	trailer: u64 index record offset, magic "HRSTEND1"
+
+Function record contains function name, names and strings of used objects and
+list of nodes in postorder, so root node is the last one. Node is a list of
+[op, ea, label_num, children nodes indexes, leaf value]. Children indexes are in
+order of item slots (e.g. x, y, z or call's x and arguments), missing ones are -1.
+Leaf value is number, object ea, variable index, helper name, string, member
+offset, goto label or switch cases values.
+
+Records can be read sequentially until index record, so corpus is streamable.
+Index allows to lazily load single functions. Loaded functions are
+herast.offline.ctree items, that are meant to be matched with offline shim installed.
+"""
+
+from __future__ import annotations
+import json
+import struct
+import zlib
+import idaapi
+import idautils
+import idc
+
+from herast.offline import ctree
+from herast.tree.consts import cexpr_op2str, cinsn_op2str
+from herast.tree.processing import get_item_slots, get_item_leaf
+
+
+MAGIC = b"HRSTCRP1"
+END_MAGIC = b"HRSTEND1"
+VERSION = 1
+INDEX_EA = 0xFFFFFFFFFFFFFFFF
+
+RECORD_HEADER = struct.Struct("<QI")
+TRAILER = struct.Struct("<Q8s")
+
+
+def get_ops_names() -> dict[int, str]:
+	"""Get ops with their full names, e.g. cot_asg. Names are used to
+	translate ops between IDA versions."""
+	names = {op: "cot_" + name for op, name in cexpr_op2str.items()}
+	names.update({op: "cit_" + name for op, name in cinsn_op2str.items()})
+	return names
+
+
+def get_string(ea):
+	if not idaapi.is_strlit(idaapi.get_flags(ea)):
+		return None
+
+	s = idc.get_strlit_contents(ea)
+	if s is None:
+		return None
+	return s.decode(errors="replace")
+
+def encode_function(cfunc) -> dict:
+	"""Make serializable record of decompiled function."""
+	nodes = []
+	names = {}
+	strings = {}
+	# indexes of already encoded children
+	encoded = []
+	unprocessed = [(cfunc.body, None)]
+	while unprocessed:
+		item, slots = unprocessed.pop()
+		if slots is None:
+			slots = get_item_slots(item)
+			unprocessed.append((item, slots))
+			unprocessed += [(s, None) for s in reversed(slots) if s is not None]
+			continue
+
+		children_count = sum(1 for s in slots if s is not None)
+		children = encoded[len(encoded) - children_count:]
+		del encoded[len(encoded) - children_count:]
+		children = iter(children)
+		children = [next(children) if s is not None else -1 for s in slots]
+
+		if item.op == idaapi.cot_obj:
+			name = idaapi.get_name(item.obj_ea)
+			if name:
+				names[item.obj_ea] = name
+			s = get_string(item.obj_ea)
+			if s is not None:
+				strings[item.obj_ea] = s
+
+		encoded.append(len(nodes))
+		nodes.append([item.op, item.ea, item.label_num, children, get_item_leaf(item)])
+
+	return {
+		"ea": cfunc.entry_ea,
+		"name": idaapi.get_name(cfunc.entry_ea),
+		"names": list(names.items()),
+		"strings": list(strings.items()),
+		"nodes": nodes,
+	}
+
+def decode_function(record: dict, ops2offline: dict[int, int], ops_names: dict[int, str]|None = None) -> ctree.cfunc_t:
+	"""Build offline ctree of function from its record.
+
+	:param ops2offline: ops in record -> ops of offline ctree
+	:param ops_names: ops in record -> their names, for error messages
+	:raises ValueError: record has op, that is not supported by offline ctree
+	"""
+	items = []
+	for op, ea, label_num, children, leaf in record["nodes"]:
+		offline_op = ops2offline.get(op)
+		if offline_op is None:
+			op_name = (ops_names or {}).get(op, str(op))
+			raise ValueError("Function %#x has op %s, that is not supported by offline ctree" % (record["ea"], op_name))
+		op = offline_op
+		children = [items[c] if c != -1 else None for c in children]
+		if op <= ctree.cot_last:
+			item = decode_expression(op, ea, label_num, children, leaf)
+		else:
+			item = decode_instruction(op, ea, label_num, children, leaf)
+		items.append(item)
+	return ctree.cfunc_t(record["ea"], items[-1])
+
+def decode_expression(op, ea, label_num, children, leaf):
+	if op == ctree.cot_call:
+		item = ctree.call(children[0], *children[1:], ea=ea)
+		item.label_num = label_num
+		return item
+
+	item = ctree.cexpr_t(op, *children, ea=ea, label_num=label_num)
+	if op == ctree.cot_num:
+		item.n = ctree.cnumber_t(leaf)
+	elif op == ctree.cot_obj:
+		item.obj_ea = leaf
+	elif op == ctree.cot_var:
+		item.v = ctree.var_ref_t(leaf)
+	elif op == ctree.cot_helper:
+		item.helper = leaf
+	elif op == ctree.cot_str:
+		item.string = leaf
+	elif op in (ctree.cot_memref, ctree.cot_memptr):
+		item.m = leaf
+	return item
+
+def decode_instruction(op, ea, label_num, children, leaf):
+	item = ctree.cinsn_t(op, ea, label_num)
+	if op == ctree.cit_block:
+		item.cblock = ctree.cblock_t(children)
+	elif op == ctree.cit_expr:
+		item.cexpr = children[0]
+	elif op == ctree.cit_if:
+		item.cif = ctree.cif_t(*children)
+	elif op == ctree.cit_for:
+		item.cfor = ctree.cfor_t(*children)
+	elif op == ctree.cit_while:
+		item.cwhile = ctree.cwhile_t(*children)
+	elif op == ctree.cit_do:
+		item.cdo = ctree.cdo_t(*children)
+	elif op == ctree.cit_return:
+		item.creturn = ctree.creturn_t(children[0])
+	elif op == ctree.cit_goto:
+		item.cgoto = ctree.cgoto_t(leaf)
+	elif op == ctree.cit_switch:
+		cases = []
+		for values, case_insn in zip(leaf, children[1:]):
+			case = ctree.ccase_t(values)
+			case.__dict__.update(case_insn.__dict__)
+			cases.append(case)
+		item.cswitch = ctree.cswitch_t(children[0], cases)
+	return item
+
+def pack_payload(obj) -> bytes:
+	return zlib.compress(json.dumps(obj, separators=(',', ':')).encode())
+
+def unpack_payload(data: bytes):
+	return json.loads(zlib.decompress(data))
+
+
+class CorpusWriter:
+	"""Writes functions records one by one, index is written on close."""
+	def __init__(self, path: str):
+		self.file = open(path, "wb")
+		self.index : list[tuple[int, int]] = []
+		header = pack_payload({"version": VERSION, "ops": get_ops_names()})
+		self.file.write(MAGIC + struct.pack("<I", len(header)) + header)
+
+	def add_function(self, cfunc):
+		self.add_record(encode_function(cfunc))
+
+	def add_record(self, record: dict):
+		self.index.append((record["ea"], self.file.tell()))
+		self.__write_record(record["ea"], pack_payload(record))
+
+	def __write_record(self, ea, payload: bytes):
+		self.file.write(RECORD_HEADER.pack(ea, len(payload)) + payload)
+
+	def close(self):
+		if self.file.closed:
+			return
+
+		index_offset = self.file.tell()
+		self.__write_record(INDEX_EA, pack_payload(self.index))
+		self.file.write(TRAILER.pack(index_offset, END_MAGIC))
+		self.file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+
+class CorpusReader:
+	"""Lazily loads functions from corpus."""
+	def __init__(self, path: str):
+		self.file = open(path, "rb")
+		if self.file.read(len(MAGIC)) != MAGIC:
+			raise ValueError("%s is not a herast corpus" % path)
+
+		header_length, = struct.unpack("<I", self.file.read(4))
+		header = unpack_payload(self.file.read(header_length))
+		if header["version"] != VERSION:
+			raise ValueError("Unsupported corpus version %s" % header["version"])
+
+		self.records_offset = self.file.tell()
+		self.ops_names = {int(op): name for op, name in header["ops"].items()}
+		# ops, that are unknown to offline ctree, are not supported
+		self.ops2offline = {op: getattr(ctree, name) for op, name in self.ops_names.items() if hasattr(ctree, name)}
+		self.index : dict[int, int] = self.__read_index()
+
+	def __read_index(self) -> dict[int, int]:
+		self.file.seek(0, 2)
+		file_size = self.file.tell()
+		if file_size - self.records_offset >= TRAILER.size:
+			self.file.seek(file_size - TRAILER.size)
+			index_offset, magic = TRAILER.unpack(self.file.read(TRAILER.size))
+			if magic == END_MAGIC:
+				_, payload = self.__read_record(index_offset)
+				return {ea: offset for ea, offset in unpack_payload(payload)}
+
+		# corpus was not closed properly, so index is rebuilt from records
+		print("[!] corpus index is missing, scanning records")
+		return {ea: offset for ea, offset, _ in self.__iterate_records()}
+
+	def __read_record(self, offset):
+		self.file.seek(offset)
+		header = self.file.read(RECORD_HEADER.size)
+		if len(header) < RECORD_HEADER.size:
+			return None, None
+
+		ea, length = RECORD_HEADER.unpack(header)
+		payload = self.file.read(length)
+		if len(payload) < length:
+			return None, None
+		return ea, payload
+
+	def __iterate_records(self):
+		offset = self.records_offset
+		while True:
+			ea, payload = self.__read_record(offset)
+			if ea is None or ea == INDEX_EA:
+				return
+			yield ea, offset, payload
+			offset += RECORD_HEADER.size + len(payload)
+
+	def get_functions_eas(self) -> list[int]:
+		return list(self.index.keys())
+
+	def get_record(self, func_ea: int) -> dict|None:
+		offset = self.index.get(func_ea)
+		if offset is None:
+			return None
+
+		_, payload = self.__read_record(offset)
+		return unpack_payload(payload)
+
+	def get_cfunc(self, func_ea: int) -> ctree.cfunc_t|None:
+		"""Load single function from corpus."""
+		record = self.get_record(func_ea)
+		if record is None:
+			return None
+		return self.__load_record(record)
+
+	def iterate_functions(self):
+		"""Sequentially load all functions from corpus. Functions with ops,
+		that are not supported by offline ctree, are skipped."""
+		for _, _, payload in self.__iterate_records():
+			record = unpack_payload(payload)
+			try:
+				cfunc = self.__load_record(record)
+			except ValueError as e:
+				print("[!] Skipping function:", e)
+				continue
+			yield cfunc
+
+	def __load_record(self, record: dict) -> ctree.cfunc_t:
+		import herast.offline
+		if herast.offline.is_installed():
+			from herast.offline import idaapi as offline_idaapi
+			for ea, name in record["names"]:
+				offline_idaapi.set_name(ea, name)
+			offline_idaapi.strings.update(record["strings"])
+			if record["name"]:
+				offline_idaapi.set_name(record["ea"], record["name"])
+		return decode_function(record, self.ops2offline, self.ops_names)
+
+	def register_functions(self):
+		"""Load all functions into offline database, so they are available for
+		Matcher.match_everywhere and other database wide matching."""
+		from herast.offline import idaapi as offline_idaapi
+		for cfunc in self.iterate_functions():
+			offline_idaapi.register_function(cfunc)
+
+	def close(self):
+		self.file.close()
+
+	def __len__(self):
+		return len(self.index)
+
+	def __contains__(self, func_ea):
+		return func_ea in self.index
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+
+def export_corpus(path: str, functions_eas=None) -> int:
+	"""Decompile functions and save them in corpus.
+
+	:param path: path to corpus file
+	:param functions_eas: addresses of functions, all functions by default
+	:return: count of exported functions
+	"""
+	from herast.tree.matcher import get_cfunc
+	if functions_eas is None:
+		functions_eas = idautils.Functions()
+
+	count = 0
+	with CorpusWriter(path) as writer:
+		for func_ea in functions_eas:
+			cfunc = get_cfunc(func_ea)
+			if cfunc is None:
+				continue
+			writer.add_function(cfunc)
+			count += 1
+	return count
+
+def __iterate_functions_by_eas(reader: CorpusReader, functions_eas):
+	"""Load functions by addresses. Missing functions and ones with ops,
+	that are not supported by offline ctree, are skipped."""
+	for func_ea in functions_eas:
+		try:
+			cfunc = reader.get_cfunc(func_ea)
+		except ValueError as e:
+			print("[!] Skipping function:", e)
+			continue
+		if cfunc is not None:
+			yield cfunc
+
+def match_corpus(matcher, path: str, functions_eas=None):
+	"""Match functions from corpus without decompilation.
+
+	:param matcher: Matcher with schemes
+	:param path: path to corpus file
+	:param functions_eas: addresses of functions to match, all functions by default
+	"""
+	with CorpusReader(path) as reader:
+		if functions_eas is None:
+			cfuncs = reader.iterate_functions()
+		else:
+			cfuncs = __iterate_functions_by_eas(reader, functions_eas)
+
+		for cfunc in cfuncs:
+			matcher.match_cfunc(cfunc)
@@ -0,0 +1,37 @@
+"""IDA-free stand-in for ctree and IDA modules, that are used by herast.
+Allows to run matcher, patterns and schemes headless, e.g. for benchmarking.
+
+Shim should be installed before any other herast import:
+	import herast.offline
+	herast.offline.install()
+	from herapi import *
+"""
+
+import sys
+
+
+def is_installed() -> bool:
+	from herast.offline import idaapi
+	return sys.modules.get("idaapi") is idaapi
+
+def install() -> bool:
+	"""Register shim modules as idaapi, idautils, idc and ida_hexrays.
+	Does nothing inside IDA.
+
+	:return: is shim used instead of IDA modules
+	"""
+	if is_installed():
+		return True
+
+	try:
+		import idaapi
+		return False
+	except ImportError:
+		pass
+
+	from herast.offline import idaapi, idautils, idc, ida_hexrays
+	sys.modules["idaapi"] = idaapi
+	sys.modules["idautils"] = idautils
+	sys.modules["idc"] = idc
+	sys.modules["ida_hexrays"] = ida_hexrays
+	return True
@@ -0,0 +1,506 @@
+"""Pure python model of HexRays ctree. Mimics attributes of idaapi
+ctree items, that are used by herast patterns, matcher and tree processor."""
+
+from __future__ import annotations
+
+
+BADADDR = 0xFFFFFFFFFFFFFFFF
+
+# [NOTE]: ops values are actual for 7.6
+cot_empty    = 0
+cot_comma    = 1
+cot_asg      = 2
+cot_asgbor   = 3
+cot_asgxor   = 4
+cot_asgband  = 5
+cot_asgadd   = 6
+cot_asgsub   = 7
+cot_asgmul   = 8
+cot_asgsshr  = 9
+cot_asgushr  = 10
+cot_asgshl   = 11
+cot_asgsdiv  = 12
+cot_asgudiv  = 13
+cot_asgsmod  = 14
+cot_asgumod  = 15
+cot_tern     = 16
+cot_lor      = 17
+cot_land     = 18
+cot_bor      = 19
+cot_xor      = 20
+cot_band     = 21
+cot_eq       = 22
+cot_ne       = 23
+cot_sge      = 24
+cot_uge      = 25
+cot_sle      = 26
+cot_ule      = 27
+cot_sgt      = 28
+cot_ugt      = 29
+cot_slt      = 30
+cot_ult      = 31
+cot_sshr     = 32
+cot_ushr     = 33
+cot_shl      = 34
+cot_add      = 35
+cot_sub      = 36
+cot_mul      = 37
+cot_sdiv     = 38
+cot_udiv     = 39
+cot_smod     = 40
+cot_umod     = 41
+cot_fadd     = 42
+cot_fsub     = 43
+cot_fmul     = 44
+cot_fdiv     = 45
+cot_fneg     = 46
+cot_neg      = 47
+cot_cast     = 48
+cot_lnot     = 49
+cot_bnot     = 50
+cot_ptr      = 51
+cot_ref      = 52
+cot_postinc  = 53
+cot_postdec  = 54
+cot_preinc   = 55
+cot_predec   = 56
+cot_call     = 57
+cot_idx      = 58
+cot_memref   = 59
+cot_memptr   = 60
+cot_num      = 61
+cot_fnum     = 62
+cot_str      = 63
+cot_obj      = 64
+cot_var      = 65
+cot_insn     = 66
+cot_sizeof   = 67
+cot_helper   = 68
+cot_type     = 69
+cot_last     = cot_type
+cit_empty    = 70
+cit_block    = 71
+cit_expr     = 72
+cit_if       = 73
+cit_for      = 74
+cit_while    = 75
+cit_do       = 76
+cit_switch   = 77
+cit_break    = 78
+cit_continue = 79
+cit_return   = 80
+cit_goto     = 81
+cit_asm      = 82
+cit_end      = 83
+
+
+def __collect_op_names(prefix):
+	names = {}
+	for name, value in sorted(globals().items()):
+		if name.startswith(prefix) and isinstance(value, int):
+			names[value] = name[len(prefix):]
+	return names
+
+
+class tinfo_t:
+	"""Type information, only names, pointers and structures are modeled."""
+	def __init__(self, name="", pointed_object: tinfo_t|None = None, is_struct=False):
+		self.name = name
+		self.pointed_object = pointed_object
+		self.struct = is_struct
+
+	def is_ptr(self):
+		return self.pointed_object is not None
+
+	def get_pointed_object(self):
+		return self.pointed_object
+
+	def is_struct(self):
+		return self.struct
+
+	def __str__(self):
+		if self.pointed_object is not None:
+			return str(self.pointed_object) + " *"
+		return self.name
+
+	def __eq__(self, other):
+		return isinstance(other, tinfo_t) and str(self) == str(other)
+
+	def __hash__(self):
+		return hash(str(self))
+
+
+class cnumber_t:
+	def __init__(self, value=0):
+		self._value = value
+
+	def value(self, _type=None):
+		return self._value
+
+
+class var_ref_t:
+	def __init__(self, idx=0):
+		self.idx = idx
+		self.mba = None
+
+
+class citem_t:
+	"""Base class for ctree items."""
+	def __init__(self, op=cot_empty, ea=BADADDR, label_num=-1):
+		self.op = op
+		self.ea = ea
+		self.label_num = label_num
+
+	@property
+	def obj_id(self):
+		return id(self)
+
+	@property
+	def opname(self):
+		return op_to_typename.get(self.op, "")
+
+	@property
+	def cinsn(self):
+		return self
+
+	def to_specific_type(self):
+		return self
+
+	def is_expr(self):
+		return self.op <= cot_last
+
+	def get_children(self) -> list[citem_t]:
+		"""Get all child items in order of their slots."""
+		return []
+
+	def iterate_subtree(self):
+		unprocessed = [self]
+		while unprocessed:
+			item = unprocessed.pop()
+			yield item
+			unprocessed.extend(reversed(item.get_children()))
+
+	def contains_label(self):
+		return any(i.label_num != -1 for i in self.iterate_subtree())
+
+	def find_parent_of(self, item):
+		for parent in self.iterate_subtree():
+			for child in parent.get_children():
+				if child is item:
+					return parent
+		return None
+
+	def print1(self, _func=None):
+		return self.opname
+
+	def __repr__(self):
+		return "<%s %s ea=%#x>" % (type(self).__name__, self.opname, self.ea)
+
+
+class cexpr_t(citem_t):
+	"""Expression item."""
+	def __init__(self, op=cot_empty, x=None, y=None, z=None, ea=BADADDR, label_num=-1):
+		super().__init__(op, ea, label_num)
+		self.x : cexpr_t|None = x
+		self.y : cexpr_t|None = y
+		self.z : cexpr_t|None = z
+		self.a : carglist_t|None = None
+		self.n : cnumber_t|None = None
+		self.v : var_ref_t|None = None
+		self.obj_ea = BADADDR
+		self.m = 0
+		self.helper = None
+		self.string = None
+		self.type = tinfo_t()
+
+	def get_children(self):
+		if self.op == cot_call:
+			children = list(self.a or ())
+			if self.x is not None:
+				children.append(self.x)
+			return children
+		return [c for c in (self.x, self.y, self.z) if c is not None]
+
+	def __get_leaf_value(self):
+		if self.op == cot_num:
+			return self.n._value
+		if self.op == cot_obj:
+			return self.obj_ea
+		if self.op == cot_var:
+			return self.v.idx
+		if self.op == cot_helper:
+			return self.helper
+		if self.op == cot_str:
+			return self.string
+		if self.op in (cot_memref, cot_memptr):
+			return self.m
+		return None
+
+	def equal_effect(self, other: cexpr_t) -> bool:
+		if other is None or self.op != other.op:
+			return False
+
+		if self.__get_leaf_value() != other.__get_leaf_value():
+			return False
+
+		children = self.get_children()
+		other_children = other.get_children()
+		if len(children) != len(other_children):
+			return False
+		return all(c.equal_effect(o) for c, o in zip(children, other_children))
+
+	def print1(self, _func=None):
+		if self.op == cot_obj:
+			s = strings.get(self.obj_ea)
+			if s is not None:
+				return '"%s"' % s
+			return names.get(self.obj_ea) or "%#x" % self.obj_ea
+		if self.op == cot_num:
+			return str(self.n._value)
+		if self.op == cot_var:
+			return "v%d" % self.v.idx
+		if self.op == cot_helper:
+			return self.helper
+		if self.op == cot_str:
+			return '"%s"' % self.string
+		return self.opname
+
+
+class carg_t(cexpr_t):
+	"""Call argument."""
+	def assign(self, expr: cexpr_t):
+		self.__dict__.update(expr.__dict__)
+
+
+class carglist_t(list):
+	def push_back(self, arg: carg_t):
+		self.append(arg)
+
+
+class cblock_t(list):
+	"""Block of instructions. Items are compared by identity, like in HexRays."""
+	def push_back(self, insn: cinsn_t):
+		self.append(insn)
+
+	def index(self, item):
+		for i, insn in enumerate(self):
+			if insn is item:
+				return i
+		return None
+
+	def remove(self, item):
+		idx = self.index(item)
+		if idx is None:
+			return False
+		del self[idx]
+		return True
+
+
+class cif_t:
+	def __init__(self, expr=None, ithen=None, ielse=None):
+		self.expr : cexpr_t|None = expr
+		self.ithen : cinsn_t|None = ithen
+		self.ielse : cinsn_t|None = ielse
+
+
+class cfor_t:
+	def __init__(self, init=None, expr=None, step=None, body=None):
+		self.init : cexpr_t|None = init
+		self.expr : cexpr_t|None = expr
+		self.step : cexpr_t|None = step
+		self.body : cinsn_t|None = body
+
+
+class cwhile_t:
+	def __init__(self, expr=None, body=None):
+		self.expr : cexpr_t|None = expr
+		self.body : cinsn_t|None = body
+
+
+class cdo_t:
+	def __init__(self, body=None, expr=None):
+		self.body : cinsn_t|None = body
+		self.expr : cexpr_t|None = expr
+
+
+class creturn_t:
+	def __init__(self, expr=None):
+		self.expr : cexpr_t|None = expr
+
+
+class cgoto_t:
+	def __init__(self, label_num=-1):
+		self.label_num = label_num
+
+
+class cswitch_t:
+	def __init__(self, expr=None, cases=None):
+		self.expr : cexpr_t|None = expr
+		self.cases : list[ccase_t] = cases or []
+
+
+class cinsn_t(citem_t):
+	"""Instruction item."""
+	def __init__(self, op=cit_empty, ea=BADADDR, label_num=-1):
+		super().__init__(op, ea, label_num)
+		self.cblock : cblock_t|None = None
+		self.cexpr : cexpr_t|None = None
+		self.cif : cif_t|None = None
+		self.cfor : cfor_t|None = None
+		self.cwhile : cwhile_t|None = None
+		self.cdo : cdo_t|None = None
+		self.creturn : creturn_t|None = None
+		self.cswitch : cswitch_t|None = None
+		self.cgoto : cgoto_t|None = None
+
+	def get_children(self):
+		op = self.op
+		if op == cit_block:
+			children = list(self.cblock)
+		elif op == cit_expr:
+			children = [self.cexpr]
+		elif op == cit_if:
+			children = [self.cif.ithen, self.cif.ielse, self.cif.expr]
+		elif op == cit_for:
+			children = [self.cfor.body, self.cfor.init, self.cfor.expr, self.cfor.step]
+		elif op == cit_while:
+			children = [self.cwhile.body, self.cwhile.expr]
+		elif op == cit_do:
+			children = [self.cdo.body, self.cdo.expr]
+		elif op == cit_return:
+			children = [self.creturn.expr]
+		elif op == cit_switch:
+			children = list(self.cswitch.cases) + [self.cswitch.expr]
+		else:
+			children = []
+		return [c for c in children if c is not None]
+
+
+class ccase_t(cinsn_t):
+	"""Switch case, instruction with case values."""
+	def __init__(self, values=(), body: cinsn_t|None = None, ea=BADADDR):
+		super().__init__(cit_block, ea)
+		self.values = list(values)
+		self.cblock = cblock_t([body] if body is not None else [])
+
+
+class cfunc_t:
+	"""Decompiled function."""
+	def __init__(self, entry_ea, body: cinsn_t):
+		self.entry_ea = entry_ea
+		self.body = body
+
+	def __repr__(self):
+		return "<cfunc_t %#x>" % self.entry_ea
+
+cfuncptr_t = cfunc_t
+
+
+def qswap(a, b):
+	"""Swap contents of two items, items identities stay the same."""
+	a.__dict__, b.__dict__ = b.__dict__, a.__dict__
+
+
+op_to_typename = {}
+op_to_typename.update(__collect_op_names("cot_"))
+op_to_typename.update(__collect_op_names("cit_"))
+cexpr_t.op_to_typename = {k: v for k, v in op_to_typename.items() if k <= cot_last}
+cinsn_t.op_to_typename = {k: v for k, v in op_to_typename.items() if k > cot_last}
+
+# offline "database" with names and strings
+names : dict[int, str] = {}
+strings : dict[int, str] = {}
+
+
+"""Helpers for trees construction"""
+
+def num(value, ea=BADADDR) -> cexpr_t:
+	e = cexpr_t(cot_num, ea=ea)
+	e.n = cnumber_t(value)
+	return e
+
+def obj(obj_ea, ea=BADADDR) -> cexpr_t:
+	e = cexpr_t(cot_obj, ea=ea)
+	e.obj_ea = obj_ea
+	return e
+
+def var(idx, ea=BADADDR) -> cexpr_t:
+	e = cexpr_t(cot_var, ea=ea)
+	e.v = var_ref_t(idx)
+	return e
+
+def helper(name, ea=BADADDR) -> cexpr_t:
+	e = cexpr_t(cot_helper, ea=ea)
+	e.helper = name
+	return e
+
+def string(value, ea=BADADDR) -> cexpr_t:
+	e = cexpr_t(cot_str, ea=ea)
+	e.string = value
+	return e
+
+def expr(op, x=None, y=None, z=None, ea=BADADDR) -> cexpr_t:
+	return cexpr_t(op, x, y, z, ea=ea)
+
+def member(op, x, m, ea=BADADDR) -> cexpr_t:
+	e = cexpr_t(op, x, ea=ea)
+	e.m = m
+	return e
+
+def call(callee, *args, ea=BADADDR) -> cexpr_t:
+	e = cexpr_t(cot_call, callee, ea=ea)
+	e.a = carglist_t()
+	for a in args:
+		arg = carg_t()
+		arg.assign(a)
+		e.a.push_back(arg)
+	return e
+
+def block(*insns, ea=BADADDR, label_num=-1) -> cinsn_t:
+	i = cinsn_t(cit_block, ea, label_num)
+	i.cblock = cblock_t(insns)
+	return i
+
+def expr_insn(e, ea=BADADDR, label_num=-1) -> cinsn_t:
+	i = cinsn_t(cit_expr, ea, label_num)
+	i.cexpr = e
+	return i
+
+def if_insn(cond, ithen, ielse=None, ea=BADADDR, label_num=-1) -> cinsn_t:
+	i = cinsn_t(cit_if, ea, label_num)
+	i.cif = cif_t(cond, ithen, ielse)
+	return i
+
+def for_insn(init, cond, step, body, ea=BADADDR, label_num=-1) -> cinsn_t:
+	i = cinsn_t(cit_for, ea, label_num)
+	i.cfor = cfor_t(init, cond, step, body)
+	return i
+
+def while_insn(cond, body, ea=BADADDR, label_num=-1) -> cinsn_t:
+	i = cinsn_t(cit_while, ea, label_num)
+	i.cwhile = cwhile_t(cond, body)
+	return i
+
+def do_insn(body, cond, ea=BADADDR, label_num=-1) -> cinsn_t:
+	i = cinsn_t(cit_do, ea, label_num)
+	i.cdo = cdo_t(body, cond)
+	return i
+
+def return_insn(e=None, ea=BADADDR, label_num=-1) -> cinsn_t:
+	i = cinsn_t(cit_return, ea, label_num)
+	i.creturn = creturn_t(e)
+	return i
+
+def goto_insn(target_label, ea=BADADDR, label_num=-1) -> cinsn_t:
+	i = cinsn_t(cit_goto, ea, label_num)
+	i.cgoto = cgoto_t(target_label)
+	return i
+
+def switch_insn(e, cases, ea=BADADDR, label_num=-1) -> cinsn_t:
+	i = cinsn_t(cit_switch, ea, label_num)
+	i.cswitch = cswitch_t(e, list(cases))
+	return i
+
+def insn(op, ea=BADADDR, label_num=-1) -> cinsn_t:
+	"""Make instruction without operands, e.g. cit_break or cit_continue."""
+	return cinsn_t(op, ea, label_num)
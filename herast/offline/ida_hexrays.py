@@ -0,0 +1,3 @@
+"""Shim of ida_hexrays module for running herast without IDA."""
+
+from herast.offline.idaapi import *
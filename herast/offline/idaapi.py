@@ -0,0 +1,199 @@
+"""Shim of idaapi module for running herast without IDA.
+Database is modeled with registered decompiled functions, names and strings."""
+
+from __future__ import annotations
+import os
+import tempfile
+
+from herast.offline.ctree import *
+from herast.offline.ctree import names, strings, op_to_typename
+
+
+MNG_NODEFINIT = 0x00000008
+MNG_NORETTYPE = 0x00000020
+
+FF_STRLIT = 0x50000000
+
+XREF_FAR = 1
+
+hxe_maturity = 9
+CMAT_FINAL = 8
+
+# registered functions: entry ea -> decompiled function
+functions : dict[int, cfunc_t] = {}
+# items addresses -> entry ea of function with them
+__items2functions : dict[int, int] = {}
+# entry ea -> end ea of function
+__functions_ends : dict[int, int] = {}
+# xrefs are objects usages of registered trees, modifications of trees do not change them like in IDA
+xrefs_to : dict[int, list[int]] = {}
+xrefs_from : dict[int, list[int]] = {}
+
+
+class DecompilationFailure(Exception):
+	pass
+
+
+class IDB_Hooks:
+	"""Only rename, function addition and database close events are generated."""
+	instances = []
+
+	def hook(self):
+		if self not in IDB_Hooks.instances:
+			IDB_Hooks.instances.append(self)
+		return True
+
+	def unhook(self):
+		if self in IDB_Hooks.instances:
+			IDB_Hooks.instances.remove(self)
+		return True
+
+	def renamed(self, ea, new_name, local_name, old_name=None):
+		return 0
+
+	def func_added(self, pfn):
+		return 0
+
+	def func_updated(self, pfn):
+		return 0
+
+	def deleting_func(self, pfn):
+		return 0
+
+	def closebase(self):
+		return 0
+
+
+class IDP_Hooks:
+	"""Xrefs events are not generated."""
+	instances = []
+
+	def hook(self):
+		if self not in IDP_Hooks.instances:
+			IDP_Hooks.instances.append(self)
+		return True
+
+	def unhook(self):
+		if self in IDP_Hooks.instances:
+			IDP_Hooks.instances.remove(self)
+		return True
+
+
+class func_t:
+	def __init__(self, start_ea, end_ea):
+		self.start_ea = start_ea
+		self.end_ea = end_ea
+
+
+def register_function(cfunc: cfunc_t, name: str|None = None):
+	"""Add decompiled function to offline database."""
+	functions[cfunc.entry_ea] = cfunc
+	__items2functions[cfunc.entry_ea] = cfunc.entry_ea
+	end_ea = cfunc.entry_ea
+	for item in cfunc.body.iterate_subtree():
+		if item.ea != BADADDR:
+			__items2functions.setdefault(item.ea, cfunc.entry_ea)
+			end_ea = max(end_ea, item.ea)
+		if item.op == cot_obj:
+			frm = item.ea if item.ea != BADADDR else cfunc.entry_ea
+			xrefs_to.setdefault(item.obj_ea, []).append(frm)
+			xrefs_from.setdefault(frm, []).append(item.obj_ea)
+	__functions_ends[cfunc.entry_ea] = end_ea + 1
+
+	if name is not None:
+		set_name(cfunc.entry_ea, name)
+
+	pfn = get_func(cfunc.entry_ea)
+	for hooks in list(IDB_Hooks.instances):
+		hooks.func_added(pfn)
+
+def reset_database():
+	"""Remove all registered functions, names and strings."""
+	functions.clear()
+	__items2functions.clear()
+	__functions_ends.clear()
+	xrefs_to.clear()
+	xrefs_from.clear()
+	names.clear()
+	strings.clear()
+	for hooks in list(IDB_Hooks.instances):
+		hooks.closebase()
+
+def decompile(ea, *args, **kwargs) -> cfunc_t:
+	func = get_func(ea)
+	if func is None or func.start_ea not in functions:
+		raise DecompilationFailure("no function at %#x" % ea)
+	return functions[func.start_ea]
+
+def get_func(ea) -> func_t|None:
+	start_ea = __items2functions.get(ea)
+	if start_ea is None:
+		return None
+
+	return func_t(start_ea, __functions_ends[start_ea])
+
+def get_func_name(ea):
+	func = get_func(ea)
+	if func is None:
+		return ""
+	return get_name(func.start_ea)
+
+def get_name(ea):
+	return names.get(ea, "")
+
+def set_name(ea, name, flags=0):
+	old_name = names.get(ea, "")
+	if old_name == name:
+		return True
+
+	names[ea] = name
+	for hooks in list(IDB_Hooks.instances):
+		hooks.renamed(ea, name, False, old_name)
+	return True
+
+def get_name_ea(_from, name):
+	for ea, n in names.items():
+		if n == name:
+			return ea
+	return BADADDR
+
+def is_mapped(ea):
+	return ea != BADADDR
+
+def get_flags(ea):
+	if ea in strings:
+		return FF_STRLIT
+	return 0
+
+def is_strlit(flags):
+	return flags & FF_STRLIT == FF_STRLIT
+
+def demangle_name(name, disable_mask, demreq=None):
+	return None
+
+def tag_remove(s):
+	return s
+
+def str2user(s):
+	return s
+
+def get_unk_type(size):
+	return tinfo_t("_UNKNOWN")
+
+def call_helper(rettype, args, name):
+	e = cexpr_t(cot_call, helper(name))
+	e.a = args
+	e.type = rettype
+	return e
+
+def get_user_idadir():
+	path = os.environ.get("HERAST_IDADIR", os.path.join(tempfile.gettempdir(), "herast_offline"))
+	os.makedirs(path, exist_ok=True)
+	return path
+
+def init_hexrays_plugin():
+	return True
+
+def require(modulename, package=None):
+	import importlib
+	return importlib.import_module(modulename, package)
@@ -0,0 +1,42 @@
+"""Shim of idautils module for running herast without IDA."""
+
+from herast.offline import idaapi
+
+
+class xref_t:
+	def __init__(self, frm, to):
+		self.frm = frm
+		self.to = to
+
+
+def Functions(start=None, end=None):
+	for ea in sorted(idaapi.functions.keys()):
+		if start is not None and ea < start:
+			continue
+		if end is not None and ea >= end:
+			continue
+		yield ea
+
+def XrefsTo(ea, flags=0):
+	"""Xrefs are objects usages in registered functions."""
+	for frm in sorted(idaapi.xrefs_to.get(ea, ())):
+		yield xref_t(frm, ea)
+
+def FuncItems(start):
+	"""Heads of function are addresses of its items."""
+	func = idaapi.get_func(start)
+	if func is None:
+		return
+	cfunc = idaapi.functions[func.start_ea]
+	eas = {func.start_ea}
+	eas.update(item.ea for item in cfunc.body.iterate_subtree() if item.ea != idaapi.BADADDR)
+	yield from sorted(eas)
+
+def XrefsFrom(ea, flags=0):
+	for to in idaapi.xrefs_from.get(ea, ()):
+		yield xref_t(ea, to)
+
+def Names():
+	for ea, name in sorted(idaapi.names.items()):
+		if name:
+			yield ea, name
@@ -0,0 +1,49 @@
+"""Shim of idc module for running herast without IDA."""
+
+from herast.offline import idaapi
+
+AR_STR = ord('S')
+
+BADADDR = idaapi.BADADDR
+
+# netnode arrays: id -> {index: value}
+__arrays : dict = {}
+__arrays_ids : dict = {}
+
+
+def get_name_ea_simple(name):
+	return idaapi.get_name_ea(idaapi.BADADDR, name)
+
+def get_strlit_contents(ea, length=-1, strtype=0):
+	s = idaapi.strings.get(ea)
+	if s is None:
+		return None
+	return s.encode()
+
+def get_array_id(name):
+	return __arrays_ids.get(name, -1)
+
+def create_array(name):
+	array_id = len(__arrays_ids) + 1
+	__arrays_ids[name] = array_id
+	__arrays[array_id] = {}
+	return array_id
+
+def delete_array(array_id):
+	__arrays.pop(array_id, None)
+	for name, i in list(__arrays_ids.items()):
+		if i == array_id:
+			del __arrays_ids[name]
+
+def set_array_string(array_id, idx, value):
+	if isinstance(value, str):
+		value = value.encode()
+	__arrays[array_id][idx] = value
+	return True
+
+def get_array_element(tag, array_id, idx):
+	return __arrays.get(array_id, {}).get(idx, 0)
+
+def get_last_index(tag, array_id):
+	indexes = __arrays.get(array_id, {}).keys()
+	return max(indexes, default=-1)
@@ -0,0 +1,107 @@
+"""Generator of synthetic decompiled functions for offline database."""
+
+from __future__ import annotations
+import random
+
+from herast.offline import ctree
+from herast.offline import idaapi
+
+
+# addresses and names of called objects in generated functions
+SAMPLE_OBJECTS = {
+	0x1000: "malloc",
+	0x1010: "free",
+	0x1020: "memcpy",
+	0x1030: "_Z10log_errorPKc",
+	0x1040: "g_config",
+}
+SAMPLE_HELPERS = ("memset", "__readfsqword", "LOBYTE")
+
+
+class FunctionGenerator:
+	"""Generates random, but reproducible for seed, ctree of function."""
+	def __init__(self, seed: int, entry_ea: int):
+		self.random = random.Random(seed)
+		self.entry_ea = entry_ea
+		self.next_ea = entry_ea
+
+	def new_ea(self):
+		self.next_ea += 4
+		return self.next_ea
+
+	def expression(self, depth: int) -> ctree.cexpr_t:
+		r = self.random
+		kind = r.randrange(10) if depth > 0 else r.randrange(3)
+		if kind == 0:
+			e = ctree.var(r.randrange(6))
+		elif kind == 1:
+			e = ctree.num(r.choice((0, 1, 2, 8, 0x10, -1)))
+		elif kind == 2:
+			e = ctree.obj(r.choice(list(SAMPLE_OBJECTS.keys())))
+		elif kind == 3:
+			args = [self.expression(depth - 1) for _ in range(r.randrange(4))]
+			e = ctree.call(ctree.obj(r.choice(list(SAMPLE_OBJECTS.keys()))), *args)
+		elif kind == 4:
+			e = ctree.call(ctree.helper(r.choice(SAMPLE_HELPERS)), self.expression(depth - 1))
+		elif kind == 5:
+			e = ctree.expr(ctree.cot_cast, self.expression(depth - 1))
+		elif kind == 6:
+			e = ctree.member(r.choice((ctree.cot_memref, ctree.cot_memptr)), self.expression(depth - 1), r.randrange(4) * 8)
+		elif kind == 7:
+			e = ctree.expr(ctree.cot_ptr, self.expression(depth - 1))
+		else:
+			op = r.choice((ctree.cot_add, ctree.cot_sub, ctree.cot_eq, ctree.cot_ne, ctree.cot_band, ctree.cot_idx))
+			e = ctree.expr(op, self.expression(depth - 1), self.expression(depth - 1))
+		e.ea = self.new_ea()
+		return e
+
+	def assignment(self, depth: int) -> ctree.cexpr_t:
+		e = ctree.expr(ctree.cot_asg, ctree.var(self.random.randrange(6)), self.expression(depth))
+		e.ea = self.new_ea()
+		return e
+
+	def instruction(self, depth: int) -> ctree.cinsn_t:
+		r = self.random
+		kind = r.randrange(8) if depth > 0 else r.randrange(3)
+		if kind == 0:
+			i = ctree.expr_insn(self.assignment(3))
+		elif kind == 1:
+			i = ctree.expr_insn(self.expression(3))
+		elif kind == 2:
+			i = ctree.return_insn(self.expression(1) if r.random() < 0.7 else None)
+		elif kind == 3 or kind == 4:
+			ielse = self.block(depth - 1) if r.random() < 0.4 else None
+			i = ctree.if_insn(self.expression(2), self.block(depth - 1), ielse)
+		elif kind == 5:
+			i = ctree.while_insn(self.expression(2), self.block(depth - 1))
+		elif kind == 6:
+			i = ctree.for_insn(self.assignment(0), self.expression(1), self.assignment(1), self.block(depth - 1))
+		else:
+			i = ctree.do_insn(self.block(depth - 1), self.expression(2))
+		i.ea = self.new_ea()
+		return i
+
+	def block(self, depth: int, size: int|None = None) -> ctree.cinsn_t:
+		if size is None:
+			size = self.random.randrange(1, 6)
+		i = ctree.block(*[self.instruction(depth) for _ in range(size)])
+		i.ea = self.new_ea()
+		return i
+
+	def function(self, depth=3, size=20) -> ctree.cfunc_t:
+		return ctree.cfunc_t(self.entry_ea, self.block(depth, size))
+
+
+def make_function(seed: int, entry_ea: int, depth=3, size=20) -> ctree.cfunc_t:
+	"""Make synthetic decompiled function, same seed gives same tree."""
+	return FunctionGenerator(seed, entry_ea).function(depth, size)
+
+def populate_database(functions_count: int, seed=0, depth=3, size=20, base_ea=0x100000):
+	"""Register synthetic functions and sample objects names in offline database."""
+	for ea, name in SAMPLE_OBJECTS.items():
+		idaapi.set_name(ea, name)
+
+	for i in range(functions_count):
+		entry_ea = base_ea + i * 0x10000
+		cfunc = make_function(seed + i, entry_ea, depth, size)
+		idaapi.register_function(cfunc, "sub_%X" % entry_ea)
@@ -4,11 +4,18 @@ import os
 from herast.schemes_storage import SchemesStorage
 from herast.tree.scheme import Scheme
 from herast.tree.matcher import Matcher
+from herast.tree.match_cache import get_match_cache, get_tree_hash
+from herast.tree.profiler import SchemeStats, get_schemes_profile
+from herast.tree.pattern_network import print_network_report
+from herast.settings import runtime_settings
 
 import herast.settings.settings_manager as settings_manager
 
 __schemes_storages : dict[str, SchemesStorage] = {}
 __passive_matcher = Matcher()
+# function ea -> (tree hash, schemes) of last passive matching, that matched nothing
+__unmatched_functions : dict[int, tuple[str, tuple]] = {}
+__passive_matching_stats = {"hits": 0, "misses": 0}
 
 def __find_python_files_in_folder(folder: str):
 	import glob
@@ -69,6 +76,74 @@ def get_passive_matcher() -> Matcher:
 	"""Get matcher, that automatically matches in every decompilation."""
 	return __passive_matcher
 
+def match_passively(cfunc):
+	"""Match passive matcher's schemes in decompiled function. Matching is skipped,
+	if function's tree and passive schemes are the same as in previous matching,
+	where no scheme matched anything."""
+	if not runtime_settings.SKIP_UNCHANGED_PASSIVE_MATCHING:
+		__passive_matcher.match_cfunc(cfunc)
+		return
+
+	func_ea = cfunc.entry_ea
+	# schemes objects are kept in key, so reloaded schemes are different even with same names
+	key = (get_tree_hash(cfunc.body), tuple(__passive_matcher.schemes.items()))
+	if __unmatched_functions.get(func_ea) == key:
+		__passive_matching_stats["hits"] += 1
+		return
+
+	__passive_matching_stats["misses"] += 1
+	# schemes might modify tree in place without reporting it, so any match
+	# makes result of matching depend on more than the tree and schemes
+	matches_count = 0
+	def on_match(scheme_name, item, ctx):
+		nonlocal matches_count
+		matches_count += 1
+
+	__passive_matcher.add_match_callback(on_match)
+	try:
+		__passive_matcher.match_cfunc(cfunc)
+	finally:
+		__passive_matcher.remove_match_callback(on_match)
+
+	if matches_count == 0:
+		__unmatched_functions[func_ea] = key
+	else:
+		__unmatched_functions.pop(func_ea, None)
+
+def get_passive_matching_stats() -> dict[str, int]:
+	"""Get counts of skipped (hits) and performed (misses) passive matchings."""
+	return dict(__passive_matching_stats)
+
+def reset_passive_matching_stats():
+	"""Forget previous passive matchings and reset their counters."""
+	__unmatched_functions.clear()
+	__passive_matching_stats["hits"] = 0
+	__passive_matching_stats["misses"] = 0
+
+def get_storages_profile() -> dict[str, SchemeStats]:
+	"""Get matching statistics of storages' schemes, {storage_path -> SchemeStats}.
+	Profiling should be enabled with enable_profiling."""
+	schemes_profile = get_schemes_profile()
+	profile = {}
+	for storage in __schemes_storages.values():
+		stats = SchemeStats()
+		for name, _ in storage.get_schemes():
+			scheme_stats = schemes_profile.get(name)
+			if scheme_stats is not None:
+				stats.merge(scheme_stats)
+
+		if stats.calls != 0:
+			profile[storage.path] = stats
+	return profile
+
+def print_shared_subpatterns_report():
+	"""Print subpatterns, that are shared by passive schemes, and how many checks they saved."""
+	network = __passive_matcher.get_pattern_network()
+	if network is None:
+		print("[!] Sharing of subpatterns is disabled in runtime settings")
+		return
+	print_network_report(network)
+
 def register_storage_scheme(name:str, scheme:Scheme):
 	"""API for storages to export their schemes.
 
@@ -262,6 +337,25 @@ def remove_storage_file(storage_path: str, global_settings=False) -> bool:
 	del __schemes_storages[storage_path]
 	return True
 
+def load_storage(storage_path: str) -> SchemesStorage|None:
+	"""Load storage and export its schemes to passive matcher regardless of
+	settings. Storage is not saved in settings, so it is used only once,
+	e.g. in headless matching."""
+	storage = get_storage(storage_path)
+	if storage is None:
+		storage = SchemesStorage(storage_path)
+		__schemes_storages[storage_path] = storage
+
+	if storage.is_loaded():
+		__unload_storage(storage)
+
+	if not storage.load_module():
+		print("Failed to load storage", storage_path)
+		return None
+
+	storage.enabled = True
+	return storage
+
 def reload_storage(storage_path: str) -> bool:
 	"""Reload storage module."""
 	storage = get_storage(storage_path)
@@ -270,6 +364,7 @@ def reload_storage(storage_path: str) -> bool:
 		return False
 
 	if storage.is_loaded():
+		get_match_cache().invalidate_schemes(s for _, s in storage.get_schemes())
 		__unload_storage(storage)
 
 	if not __load_storage(storage):
@@ -1 +1,49 @@
-CATCH_DURING_MATCHING = True
\ No newline at end of file
+CATCH_DURING_MATCHING = True
+
+# continue matching after tree modification instead of restarting from the root.
+# Items are matched in DFS order instead of BFS, so final trees are the same, but
+# schemes handlers are called and matches are collected in different order
+INCREMENTAL_MATCHING = False
+
+# compile schemes patterns into python functions instead of interpreting checks
+COMPILE_PATTERNS = False
+
+# rewrite schemes patterns into equivalent faster ones, e.g. fuse OrPat of ObjPat into MultiObjectPat
+OPTIMIZE_PATTERNS = True
+
+# check subpatterns, that are shared by several schemes, once per item
+SHARE_SUBPATTERNS = False
+
+# check schemes, that require selective objects, helpers or numbers, only on items near them
+ANCHORED_MATCHING = True
+
+# compare structural hashes of items before equal_effect, e.g. in BindItemPat. Pays off
+# when bound items are big and often compared, hashing is slower than failing equal_effect
+HASH_ITEMS_PRECHECK = False
+
+# skip schemes, that found nothing in unchanged functions during previous
+# match_everywhere and match_objects_xrefs runs
+USE_MATCH_CACHE = True
+
+# skip passive matching of function, if its tree and passive schemes did not
+# change since previous matching, where no scheme matched anything
+SKIP_UNCHANGED_PASSIVE_MATCHING = True
+
+# skip schemes, that require objects, helpers, numbers or ops missing in function
+PREFILTER_FUNCTIONS = True
+
+# do not decompile functions without xrefs to objects, that schemes require, in match_everywhere.
+# Not conservative: object might be used in function without xref to it, e.g. via computed reference
+PREFILTER_WITH_XREFS = False
+
+# reindex functions in database-wide feature index, that Matcher.match_candidates uses, whenever they are decompiled
+UPDATE_FEATURE_INDEX = True
+
+# look callers of objects up in reverse call graph, that is built once and updated on functions changes, instead of xrefs
+USE_CALLERS_INDEX = True
+
+# keep recently decompiled functions in matcher's LRU cache and remember decompilation failures,
+# cache is bounded by amount of functions and of their ctree items
+USE_CFUNC_CACHE = True
+CFUNC_CACHE_MAX_FUNCTIONS = 256
+CFUNC_CACHE_MAX_ITEMS = 1000000
\ No newline at end of file
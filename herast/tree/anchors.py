@@ -0,0 +1,111 @@
+"""Anchor-driven matching of schemes.
+
+Pattern, that requires a selective leaf in subtree of matched item (object,
+helper or number), is able to match only items, that are close ancestors of
+this leaf's occurrences. Occurrences are looked up in function's items index
+and their parents chains are walked up to get candidate items, so scheme is
+checked only on them instead of every item of function.
+
+Anchors are derived from required features of pattern, so the most selective
+clause of features in current function is used. Distance from matched item to
+anchor is bounded by height of pattern, since every pattern node checks
+item's children or the item itself after skipping a cast, except for
+DeepExprPat and user defined patterns, that might check any descendant.
+"""
+
+from __future__ import annotations
+
+from herast.tree.processing import TreeProcessor
+from herast.tree.scheme import Scheme
+from herast.tree.symbols import get_symbol_cache
+from herast.tree.patterns.base_pattern import BasePat
+from herast.tree.patterns.abstracts import DeepExprPat
+from herast.tree.pattern_analysis import get_required_features, is_builtin_pattern
+
+
+ANCHOR_KINDS = ("obj", "name", "helper", "num")
+
+
+def __get_pattern_height(pat: BasePat) -> int|None:
+	if not is_builtin_pattern(pat) or isinstance(pat, DeepExprPat):
+		return None
+
+	height = 0
+	for value in vars(pat).values():
+		children = [value] if isinstance(value, BasePat) else value if isinstance(value, (tuple, list)) else ()
+		for child in children:
+			if not isinstance(child, BasePat):
+				continue
+			child_height = __get_pattern_height(child)
+			if child_height is None:
+				return None
+			height = max(height, child_height)
+	return height + 1
+
+def get_max_anchor_distance(pat: BasePat) -> int|None:
+	"""Get how far from matched item might be items, that pattern checks. None means any descendant."""
+	height = __get_pattern_height(pat)
+	if height is None:
+		return None
+	# every pattern node might skip a cast
+	return 2 * height
+
+def get_pattern_anchors(pat: BasePat) -> tuple[list[frozenset], int|None]|None:
+	"""Get clauses of leaves features, one of features of every clause is in subtree
+	of every matched item, and max distance to them.
+
+	:return: clauses and distance or None if pattern has no anchors
+	"""
+	clauses = [c for c in get_required_features(pat, in_subtree=True) if c and all(kind in ANCHOR_KINDS for kind, _ in c)]
+	if not clauses:
+		return None
+	return clauses, get_max_anchor_distance(pat)
+
+def get_scheme_anchors(scheme: Scheme) -> tuple[list[frozenset], int|None]|None:
+	"""Get anchors of scheme's pattern. Schemes with custom matching have no anchors."""
+	if type(scheme).on_new_item is not Scheme.on_new_item:
+		return None
+
+	pattern = getattr(scheme, "pattern", None)
+	if not isinstance(pattern, BasePat):
+		return None
+	return get_pattern_anchors(pattern)
+
+def get_anchor_items(tree_proc: TreeProcessor, clause: frozenset) -> list:
+	"""Get items of function with any of clause's features."""
+	items = []
+	symbol_cache = get_symbol_cache()
+	for kind, value in clause:
+		if kind != "name":
+			items += tree_proc.get_items_by_feature(kind, value)
+			continue
+
+		for ea in tree_proc.get_features_values("obj"):
+			if symbol_cache.is_named(ea, value):
+				items += tree_proc.get_items_by_feature("obj", ea)
+	return items
+
+def get_anchored_items(tree_proc: TreeProcessor, anchors: tuple[list[frozenset], int|None]) -> set[int]|None:
+	"""Get obj_ids of items, where pattern with anchors might match.
+
+	:return: set of items ids or None if anchors are not selective enough in function
+	"""
+	clauses, distance = anchors
+	items_count = tree_proc.get_items_count()
+	anchor_items = min((get_anchor_items(tree_proc, c) for c in clauses), key=len)
+	# walking up from every anchor should be cheaper than checking every item
+	if len(anchor_items) * (distance or 8) > items_count:
+		return None
+
+	# item id -> how many steps up from it are already walked
+	walked : dict[int, int] = {}
+	for item in anchor_items:
+		steps = distance if distance is not None else items_count
+		while item is not None and steps >= 0:
+			item_id = item.obj_id
+			if walked.get(item_id, -1) >= steps:
+				break
+			walked[item_id] = steps
+			item = tree_proc.get_parent(item)
+			steps -= 1
+	return set(walked)
@@ -0,0 +1,249 @@
+"""Reverse call graph of database: object -> functions, that reference it.
+
+Looking callers up with xrefs resolves function of every xref on every call.
+CallersIndex is built in a single pass over items of all functions and keeps
+pairs of (referenced ea, function ea) in two parallel arrays, sorted by
+referenced ea, so callers of object are a slice of arrays, that is found with
+binary search. Functions, that are changed after building, are tracked with
+IDB hooks on functions, code, operands and bytes changes and with processor
+hooks on xrefs changes: their pairs in arrays are ignored and they are scanned
+again on next lookup. Index is rebuilt, when too many functions are changed.
+"""
+
+from __future__ import annotations
+import array
+import bisect
+import idaapi
+import idautils
+
+
+class CallersIndexHooks(idaapi.IDB_Hooks):
+	def __init__(self, index: CallersIndex):
+		super().__init__()
+		self.index = index
+
+	def func_added(self, pfn):
+		self.index.invalidate_function(pfn.start_ea)
+		return 0
+
+	def func_updated(self, pfn):
+		self.index.invalidate_function(pfn.start_ea)
+		return 0
+
+	def deleting_func(self, pfn):
+		self.index.invalidate_function(pfn.start_ea)
+		return 0
+
+	def set_func_start(self, pfn, new_start):
+		self.index.invalidate_function(pfn.start_ea)
+		self.index.invalidate_function(new_start)
+		return 0
+
+	def set_func_end(self, pfn, new_end):
+		self.index.invalidate_function(pfn.start_ea)
+		return 0
+
+	def make_code(self, insn):
+		self.index.invalidate_address(insn.ea)
+		return 0
+
+	def make_data(self, ea, *args):
+		self.index.invalidate_address(ea)
+		return 0
+
+	def destroyed_items(self, ea1, ea2, *args):
+		self.index.invalidate_address(ea1)
+		return 0
+
+	def op_type_changed(self, ea, n):
+		self.index.invalidate_address(ea)
+		return 0
+
+	def byte_patched(self, ea, *args):
+		self.index.invalidate_address(ea)
+		return 0
+
+	def closebase(self):
+		self.index.reset()
+		return 0
+
+
+class CallersIndexXrefsHooks(idaapi.IDP_Hooks):
+	"""Xrefs, that are added or deleted manually or by analysis inside of functions."""
+	def __init__(self, index: CallersIndex):
+		super().__init__()
+		self.index = index
+
+	def ev_add_cref(self, frm, to, *args):
+		self.index.invalidate_address(frm)
+		return 0
+
+	def ev_add_dref(self, frm, to, *args):
+		self.index.invalidate_address(frm)
+		return 0
+
+	def ev_del_cref(self, frm, to, *args):
+		self.index.invalidate_address(frm)
+		return 0
+
+	def ev_del_dref(self, frm, to, *args):
+		self.index.invalidate_address(frm)
+		return 0
+
+
+def get_function_references(func_ea: int) -> set[int]:
+	"""Get addresses, that are referenced from function's items. Ordinary flow
+	and jumps inside of function are skipped, except for recursive calls."""
+	func = idaapi.get_func(func_ea)
+	if func is None:
+		return set()
+
+	references = set()
+	for head in idautils.FuncItems(func.start_ea):
+		for xref in idautils.XrefsFrom(head, idaapi.XREF_FAR):
+			if xref.to == func.start_ea or not func.start_ea <= xref.to < func.end_ea:
+				references.add(xref.to)
+	return references
+
+
+class CallersIndex:
+	"""Index of "referenced ea -> functions, that reference it"."""
+	# index is rebuilt, when this part of functions is changed
+	REBUILD_CHANGED_RATIO = 0.125
+
+	def __init__(self):
+		# parallel arrays, sorted by referenced ea, None until index is built
+		self.__targets : array.array|None = None
+		self.__callers = array.array("Q")
+		self.__functions_count = 0
+		# functions, that changed since building, their pairs in arrays are ignored
+		self.__changed : set[int] = set()
+		# changed functions, that are not scanned again yet
+		self.__pending : set[int] = set()
+		# references of scanned again functions and their reverse
+		self.__rescanned_references : dict[int, set[int]] = {}
+		self.__rescanned_callers : dict[int, set[int]] = {}
+		self.hooks : CallersIndexHooks|None = None
+		self.xrefs_hooks : CallersIndexXrefsHooks|None = None
+		self.builds = 0
+
+	def install_hooks(self):
+		if self.hooks is not None:
+			return
+		self.hooks = CallersIndexHooks(self)
+		self.hooks.hook()
+		self.xrefs_hooks = CallersIndexXrefsHooks(self)
+		self.xrefs_hooks.hook()
+
+	def remove_hooks(self):
+		if self.hooks is None:
+			return
+		self.hooks.unhook()
+		self.xrefs_hooks.unhook()
+		self.hooks = None
+		self.xrefs_hooks = None
+
+	def reset(self):
+		"""Drop index, it is built again on next lookup."""
+		self.__targets = None
+		self.__callers = array.array("Q")
+		self.__functions_count = 0
+		self.__changed.clear()
+		self.__pending.clear()
+		self.__rescanned_references.clear()
+		self.__rescanned_callers.clear()
+
+	def build(self):
+		"""Scan all functions of database."""
+		self.reset()
+		pairs = []
+		for func_ea in idautils.Functions():
+			self.__functions_count += 1
+			pairs += [(target, func_ea) for target in get_function_references(func_ea)]
+		pairs.sort()
+
+		self.__targets = array.array("Q", (target for target, _ in pairs))
+		self.__callers = array.array("Q", (func_ea for _, func_ea in pairs))
+		self.builds += 1
+
+	def invalidate_function(self, func_ea: int):
+		"""Scan function again on next lookup, e.g. when function is changed."""
+		if self.__targets is None:
+			return
+		self.__changed.add(func_ea)
+		self.__pending.add(func_ea)
+
+	def invalidate_address(self, ea: int):
+		"""Scan function, that contains address, again on next lookup."""
+		if self.__targets is None:
+			return
+		func = idaapi.get_func(ea)
+		if func is not None:
+			self.invalidate_function(func.start_ea)
+
+	def __update(self):
+		if self.__targets is None or len(self.__changed) > self.__functions_count * self.REBUILD_CHANGED_RATIO:
+			self.build()
+			return
+
+		for func_ea in self.__pending:
+			for target in self.__rescanned_references.pop(func_ea, ()):
+				self.__rescanned_callers[target].discard(func_ea)
+
+			func = idaapi.get_func(func_ea)
+			if func is None or func.start_ea != func_ea:
+				continue
+
+			references = self.__rescanned_references[func_ea] = get_function_references(func_ea)
+			for target in references:
+				self.__rescanned_callers.setdefault(target, set()).add(func_ea)
+		self.__pending.clear()
+
+	def __get_direct_callers(self, ea: int) -> list[int]:
+		start = bisect.bisect_left(self.__targets, ea)
+		end = bisect.bisect_right(self.__targets, ea, start)
+		callers = self.__callers[start:end]
+		if not self.__changed:
+			return list(callers)
+
+		callers = [c for c in callers if c not in self.__changed]
+		rescanned = self.__rescanned_callers.get(ea)
+		if rescanned:
+			callers = sorted(set(callers) | rescanned)
+		return callers
+
+	def get_callers(self, ea: int, depth: int = 1) -> list[int]:
+		"""Get functions, that reference object, directly or via chain of calls.
+
+		:param depth: max length of chain, 1 is for direct references only
+		:return: sorted addresses of functions
+		"""
+		if self.__targets is None or self.__pending:
+			self.__update()
+
+		found = set()
+		current = [ea]
+		for _ in range(depth):
+			following = []
+			for callee in current:
+				for caller in self.__get_direct_callers(callee):
+					if caller not in found:
+						found.add(caller)
+						following.append(caller)
+			current = following
+		return sorted(found)
+
+
+__callers_index = CallersIndex()
+
+def get_callers_index() -> CallersIndex:
+	"""Get reverse call graph of database. Changes of functions are hooked since first use."""
+	__callers_index.install_hooks()
+	return __callers_index
+
+def reset_callers_index():
+	"""Drop index and hook functions changes again, e.g. when IDB is changed."""
+	global __callers_index
+	__callers_index.remove_hooks()
+	__callers_index = CallersIndex()
+	__callers_index.install_hooks()
@@ -0,0 +1,290 @@
+"""Database-wide inverted index of functions features.
+
+Index maps features of decompiled functions trees to addresses of functions,
+that contain them, so schemes are matched only in functions, that might have
+required features of their patterns, without decompiling the rest of database.
+Features are the ones of function prefilter (herast/tree/prefilter.py) except
+objects names, since objects might be renamed, names are resolved via indexed
+objects addresses on lookup.
+
+Index is stored in IDB as sorted and delta encoded lists of functions addresses
+per feature, it is saved with IDB and after Matcher.match_candidates. Functions
+are indexed, when they are matched by Matcher.match_candidates for the first
+time, and reindexed, whenever they are decompiled. Functions, that are changed
+(updated, patched, retyped, redefined), are dropped from index by IDB hooks, so
+they are decompiled and indexed again on next lookup. Changes, that were made
+while hooks were not installed, e.g. without herast loaded, are not noticed.
+"""
+
+from __future__ import annotations
+import array
+import bisect
+import json
+import idaapi
+
+from herast.tree.prefilter import get_tree_features, get_object_names
+from herast.settings.idb_settings import load_long_str_from_idb, save_long_str_to_idb
+
+
+def encode_eas(eas) -> list[int]:
+	"""Encode sorted addresses as differences of neighbours, they are short in JSON."""
+	encoded = []
+	previous = 0
+	for ea in eas:
+		encoded.append(ea - previous)
+		previous = ea
+	return encoded
+
+def decode_eas(encoded: list[int]) -> array.array:
+	eas = array.array("Q")
+	ea = 0
+	for delta in encoded:
+		ea += delta
+		eas.append(ea)
+	return eas
+
+
+class FeatureIndexHooks(idaapi.IDB_Hooks):
+	def __init__(self, index: FeatureIndex):
+		super().__init__()
+		self.index = index
+
+	def func_updated(self, pfn):
+		self.index.invalidate_function(pfn.start_ea)
+		return 0
+
+	def deleting_func(self, pfn):
+		self.index.invalidate_function(pfn.start_ea)
+		return 0
+
+	def set_func_start(self, pfn, new_start):
+		self.index.invalidate_function(pfn.start_ea)
+		return 0
+
+	def set_func_end(self, pfn, new_end):
+		self.index.invalidate_function(pfn.start_ea)
+		return 0
+
+	def make_code(self, insn):
+		self.index.invalidate_address(insn.ea)
+		return 0
+
+	def make_data(self, ea, *args):
+		self.index.invalidate_address(ea)
+		return 0
+
+	def op_type_changed(self, ea, n):
+		self.index.invalidate_address(ea)
+		return 0
+
+	def byte_patched(self, ea, *args):
+		self.index.invalidate_address(ea)
+		return 0
+
+	def ti_changed(self, ea, *args):
+		self.index.invalidate_address(ea)
+		return 0
+
+	def savebase(self):
+		self.index.save()
+		return 0
+
+	def closebase(self):
+		self.index.unload()
+		return 0
+
+
+class FeatureIndex:
+	"""Index of "feature -> sorted addresses of functions with feature"."""
+	array_name = "$herast:FeatureIndex"
+	version = 1
+
+	def __init__(self):
+		self.features : dict[tuple, array.array]|None = None
+		# function ea -> features of function, so they are dropped on function's update
+		self.functions : dict[int, list[tuple]] = {}
+		# functions, that changed before index was loaded
+		self.__stale_functions : set[int] = set()
+		self.is_dirty = False
+		self.hooks : FeatureIndexHooks|None = None
+
+	def install_hooks(self):
+		if self.hooks is not None:
+			return
+		self.hooks = FeatureIndexHooks(self)
+		self.hooks.hook()
+
+	def remove_hooks(self):
+		if self.hooks is None:
+			return
+		self.hooks.unhook()
+		self.hooks = None
+
+	def unload(self):
+		"""Forget index without saving, it is loaded from IDB again on next use."""
+		self.features = None
+		self.functions = {}
+		self.__stale_functions.clear()
+		self.is_dirty = False
+
+	def __load(self):
+		if self.features is not None:
+			return
+
+		self.features = {}
+		self.functions = {}
+		saved = load_long_str_from_idb(self.array_name)
+		if not saved:
+			return
+
+		try:
+			saved = json.loads(saved)
+			if saved["version"] != self.version:
+				print("[!] Feature index has unsupported version, it is reset")
+				return
+
+			self.functions = {ea: [] for ea in decode_eas(saved["functions"])}
+			for kind, value, encoded in saved["features"]:
+				feature = (kind, value)
+				eas = decode_eas(encoded)
+				self.features[feature] = eas
+				for ea in eas:
+					self.functions[ea].append(feature)
+		except Exception as e:
+			print("[!] Failed to load feature index, it is reset:", e)
+			self.features = {}
+			self.functions = {}
+
+		for func_ea in self.__stale_functions:
+			self.remove_function(func_ea)
+		self.__stale_functions.clear()
+
+	def save(self):
+		"""Save index to IDB, if it was changed."""
+		if not self.is_dirty or self.features is None:
+			return
+
+		saved = {
+			"version": self.version,
+			"functions": encode_eas(sorted(self.functions)),
+			"features": [[kind, value, encode_eas(eas)] for (kind, value), eas in self.features.items()],
+		}
+		save_long_str_to_idb(self.array_name, json.dumps(saved, separators=(',', ':')))
+		self.is_dirty = False
+
+	def clear(self):
+		self.features = {}
+		self.functions = {}
+		self.is_dirty = True
+		self.save()
+
+	def is_indexed(self, func_ea: int) -> bool:
+		self.__load()
+		return func_ea in self.functions
+
+	def get_indexed_functions(self) -> list[int]:
+		self.__load()
+		return sorted(self.functions)
+
+	def invalidate_function(self, func_ea: int):
+		"""Drop changed function, it is indexed again on next lookup. Index is not loaded for it."""
+		if self.features is None:
+			self.__stale_functions.add(func_ea)
+		else:
+			self.remove_function(func_ea)
+
+	def invalidate_address(self, ea: int):
+		func = idaapi.get_func(ea)
+		if func is not None:
+			self.invalidate_function(func.start_ea)
+
+	def remove_function(self, func_ea: int):
+		self.__load()
+		features = self.functions.pop(func_ea, None)
+		if features is None:
+			return
+
+		for feature in features:
+			eas = self.features[feature]
+			del eas[bisect.bisect_left(eas, func_ea)]
+			if not eas:
+				del self.features[feature]
+		self.is_dirty = True
+
+	def update_function(self, func_ea: int, root) -> bool:
+		"""Index features of function's tree.
+
+		:return: whether features of already indexed function have changed
+		"""
+		self.__load()
+		features = get_tree_features(root, with_names=False)
+		old_features = self.functions.get(func_ea)
+		if old_features is not None and features == set(old_features):
+			return False
+
+		self.remove_function(func_ea)
+		self.functions[func_ea] = list(features)
+		for feature in features:
+			eas = self.features.get(feature)
+			if eas is None:
+				eas = self.features[feature] = array.array("Q")
+			bisect.insort(eas, func_ea)
+		self.is_dirty = True
+		return old_features is not None
+
+	def get_feature_functions(self, kind: str, value) -> list[int]:
+		"""Get sorted addresses of indexed functions with feature, e.g. ("callee", ea) for callers of ea."""
+		self.__load()
+		return list(self.features.get((kind, value), ()))
+
+	def __get_named_objects(self, names: set[str]) -> dict[str, list[int]]:
+		named = {}
+		for kind, ea in self.features:
+			if kind != "obj":
+				continue
+			for name in get_object_names(ea):
+				if name in names:
+					named.setdefault(name, []).append(ea)
+		return named
+
+	def get_functions(self, clauses: list[frozenset]) -> set[int]|None:
+		"""Get indexed functions, that have at least one feature of every clause.
+
+		:return: addresses of functions or None if there are no clauses
+		"""
+		self.__load()
+		names = {value for clause in clauses for kind, value in clause if kind == "name"}
+		named_objects = self.__get_named_objects(names) if names else {}
+
+		functions = None
+		for clause in clauses:
+			clause_functions = set()
+			for kind, value in clause:
+				if kind == "name":
+					for ea in named_objects.get(value, ()):
+						clause_functions.update(self.features.get(("obj", ea), ()))
+				else:
+					clause_functions.update(self.features.get((kind, value), ()))
+			functions = clause_functions if functions is None else functions & clause_functions
+			if not functions:
+				break
+		return functions
+
+
+__feature_index = FeatureIndex()
+
+def get_feature_index() -> FeatureIndex:
+	"""Get features index of current IDB. Changes of functions are hooked since first use."""
+	__feature_index.install_hooks()
+	return __feature_index
+
+def reset_feature_index():
+	"""Drop index state and hook changes of functions again, e.g. when IDB is changed."""
+	global __feature_index
+	__feature_index.remove_hooks()
+	__feature_index = FeatureIndex()
+	__feature_index.install_hooks()
+
+def on_function_decompiled(cfunc):
+	"""Reindex decompiled function. Index is saved with IDB or after matching, not here."""
+	get_feature_index().update_function(cfunc.entry_ea, cfunc.body)
@@ -0,0 +1,207 @@
+"""Persistent cache of matching results, stored in IDB.
+
+For every function cache keeps structural hash of its ctree before matching
+and results of schemes, that were matched against this tree. Scheme is
+identified by version hash of its class source and its pattern. If function's
+tree and scheme did not change since scheme found nothing in it, then scheme
+is skipped for this function.
+
+Only "no match" results are used for skipping, because schemes, that matched
+something, might have side effects (tree modifications, collected information),
+that cache is not able to replay.
+"""
+
+from __future__ import annotations
+import hashlib
+import inspect
+import json
+import idaapi
+
+from herast.tree.processing import get_item_slots, get_item_leaf
+from herast.tree.patterns.base_pattern import BasePat
+from herast.tree.patterns.helpers import StructFieldAccessPat
+from herast.tree.pattern_analysis import iterate_subpatterns, is_builtin_pattern, get_pattern_fingerprint
+from herast.tree.scheme import Scheme
+from herast.tree.symbols import get_symbol_cache
+from herast.settings.idb_settings import load_long_str_from_idb, save_long_str_to_idb
+
+
+def get_tree_hash(root) -> str:
+	"""Get hash of tree structure and values. Names of used objects are
+	hashed too, since patterns might match objects by their names."""
+	parts = []
+	symbol_cache = get_symbol_cache()
+	unprocessed = [root]
+	while unprocessed:
+		item = unprocessed.pop()
+		if item is None:
+			parts.append("-")
+			continue
+
+		slots = get_item_slots(item)
+		leaf = get_item_leaf(item)
+		if item.op == idaapi.cot_obj:
+			leaf = (leaf, symbol_cache.get_name(leaf))
+		parts.append("%d:%d:%d:%r" % (item.op, len(slots), item.label_num, leaf))
+		unprocessed += reversed(slots)
+	return hashlib.blake2b("|".join(parts).encode(), digest_size=16).hexdigest()
+
+def is_scheme_cacheable(scheme: Scheme) -> bool:
+	"""Whether scheme's matching depends only on tree and scheme itself.
+	Schemes with custom matching or iteration callbacks might do something
+	even without matches or depend on external state, as well as user defined
+	patterns and patterns, that check types."""
+	scheme_type = type(scheme)
+	if scheme_type.on_new_item is not Scheme.on_new_item or \
+			scheme_type.on_tree_iteration_start is not Scheme.on_tree_iteration_start or \
+			scheme_type.on_tree_iteration_end is not Scheme.on_tree_iteration_end:
+		return False
+
+	pattern = getattr(scheme, "pattern", None)
+	if not isinstance(pattern, BasePat):
+		return False
+
+	for p in iterate_subpatterns(pattern):
+		if not is_builtin_pattern(p) or isinstance(p, StructFieldAccessPat):
+			return False
+	return True
+
+def get_scheme_version(scheme: Scheme) -> str:
+	"""Get hash of source of modules with scheme's classes and of scheme's pattern.
+	Whole modules are hashed, since scheme might use anything from its storage."""
+	sources = []
+	for cls in type(scheme).__mro__:
+		if cls is object:
+			continue
+
+		module = inspect.getmodule(cls)
+		try:
+			source = inspect.getsource(module) if module is not None else None
+		except (OSError, TypeError):
+			source = None
+
+		if source is None:
+			source = cls.__module__ + "." + cls.__qualname__
+		if source not in sources:
+			sources.append(source)
+
+	sources.append(get_pattern_fingerprint(scheme.pattern))
+	return hashlib.blake2b("\n".join(sources).encode(), digest_size=16).hexdigest()
+
+
+class MatchCache:
+	"""Cache of "function ea -> (tree hash, scheme version -> matched items eas)"."""
+	array_name = "$herast:MatchCache"
+
+	def __init__(self):
+		self.functions : dict[int, dict] | None = None
+		# scheme object id -> (scheme, version), scheme is kept to keep id unique
+		self.__versions : dict[int, tuple[Scheme, str]] = {}
+		self.is_dirty = False
+		self.hits = 0
+		self.misses = 0
+
+	def __load(self):
+		if self.functions is not None:
+			return
+
+		self.functions = {}
+		saved = load_long_str_from_idb(self.array_name)
+		if not saved:
+			return
+
+		try:
+			self.functions = {int(ea): entry for ea, entry in json.loads(saved).items()}
+		except Exception as e:
+			print("[!] Failed to load match cache, it is reset:", e)
+
+	def save(self):
+		"""Save cache to IDB, if it was changed."""
+		if not self.is_dirty or self.functions is None:
+			return
+
+		save_long_str_to_idb(self.array_name, json.dumps(self.functions, separators=(',', ':')))
+		self.is_dirty = False
+
+	def clear(self):
+		self.functions = {}
+		self.__versions.clear()
+		self.is_dirty = True
+		self.save()
+
+	def get_scheme_version(self, scheme: Scheme) -> str|None:
+		"""Get scheme version or None if scheme is not cacheable."""
+		cached = self.__versions.get(id(scheme))
+		if cached is not None:
+			return cached[1]
+
+		if not is_scheme_cacheable(scheme):
+			version = None
+		else:
+			version = get_scheme_version(scheme)
+		self.__versions[id(scheme)] = (scheme, version)
+		return version
+
+	def get_function_results(self, func_ea: int, tree_hash: str) -> dict[str, list[int]]:
+		"""Get results of schemes for function. Results are dropped if tree has changed."""
+		self.__load()
+		entry = self.functions.get(func_ea)
+		if entry is None or entry["tree"] != tree_hash:
+			entry = {"tree": tree_hash, "schemes": {}}
+			self.functions[func_ea] = entry
+			self.is_dirty = True
+		return entry["schemes"]
+
+	def is_known_no_match(self, results: dict[str, list[int]], scheme: Scheme) -> bool:
+		version = self.get_scheme_version(scheme)
+		if version is None:
+			return False
+
+		if results.get(version) == []:
+			self.hits += 1
+			return True
+
+		self.misses += 1
+		return False
+
+	def save_scheme_result(self, results: dict[str, list[int]], scheme: Scheme, matched_eas: list[int]):
+		version = self.get_scheme_version(scheme)
+		if version is None:
+			return
+
+		results[version] = matched_eas
+		self.is_dirty = True
+
+	def invalidate_schemes(self, schemes):
+		"""Drop cached results of schemes, e.g. when their storage is reloaded."""
+		self.__load()
+		versions = set()
+		for scheme in schemes:
+			cached = self.__versions.pop(id(scheme), None)
+			if cached is not None and cached[1] is not None:
+				versions.add(cached[1])
+
+		if not versions:
+			return
+
+		for entry in self.functions.values():
+			for version in versions:
+				entry["schemes"].pop(version, None)
+		self.is_dirty = True
+
+	def invalidate_function(self, func_ea: int):
+		self.__load()
+		if self.functions.pop(func_ea, None) is not None:
+			self.is_dirty = True
+
+
+__match_cache = MatchCache()
+
+def get_match_cache() -> MatchCache:
+	"""Get cache of matching results in current IDB."""
+	return __match_cache
+
+def reset_match_cache():
+	"""Drop cache state, e.g. when IDB is changed."""
+	global __match_cache
+	__match_cache = MatchCache()
@@ -1,11 +1,22 @@
+from __future__ import annotations
+import time
+from collections import OrderedDict
 import idaapi
 import idautils
 import idc
 
 from herast.tree.patterns.abstracts import BindItemPat, VarBindPat
 from herast.tree.pattern_context import PatternContext
-from herast.tree.processing import TreeProcessor
+from herast.tree.processing import TreeProcessor, get_children, iterate_all_subitems
 from herast.tree.scheme import Scheme
+from herast.tree.pattern_analysis import get_root_ops, get_siblings_lookahead
+from herast.tree.match_cache import MatchCache, get_match_cache, get_tree_hash
+from herast.tree.feature_index import FeatureIndex, get_feature_index
+from herast.tree.call_graph import get_callers_index
+from herast.tree.profiler import get_profiler
+from herast.tree.pattern_network import PatternNetwork, make_schemes_network
+from herast.tree.anchors import get_scheme_anchors, get_anchored_items
+from herast.tree.prefilter import get_scheme_required_features, get_objects_clauses, get_tree_features, get_names_eas, is_satisfied
 from herast.settings import runtime_settings
 
 
@@ -23,7 +34,21 @@ def get_func_start(addr):
 def is_func_start(addr):
 	return addr == get_func_start(addr)
 
-def get_cfunc(func_ea):
+def get_callers(ea, depth=1) -> list[int]:
+	"""Get functions, that reference object, directly or via chain of calls of at most depth length."""
+	if runtime_settings.USE_CALLERS_INDEX:
+		return get_callers_index().get_callers(ea, depth)
+
+	found = set()
+	current = [ea]
+	for _ in range(depth):
+		callers = {c for callee in current for c in get_func_calls_to(callee) if is_func_start(c)}
+		current = callers - found
+		found |= callers
+	return sorted(found)
+
+def decompile_function(func_ea):
+	"""Decompile function without caching."""
 	try:
 		cfunc = idaapi.decompile(func_ea)
 	except idaapi.DecompilationFailure:
@@ -34,10 +59,281 @@ def get_cfunc(func_ea):
 		print("Error: failed to decompile function {}".format(hex(func_ea)))
 	return cfunc
 
+def get_cfunc(func_ea):
+	"""Get decompiled function, from cfunc cache if it is enabled in runtime settings."""
+	if runtime_settings.USE_CFUNC_CACHE:
+		return get_cfunc_cache().get(func_ea)
+	return decompile_function(func_ea)
+
+
+class CfuncCacheHooks(idaapi.IDB_Hooks):
+	def __init__(self, cache: CfuncCache):
+		super().__init__()
+		self.cache = cache
+
+	def func_updated(self, pfn):
+		self.cache.invalidate(pfn.start_ea)
+		return 0
+
+	def deleting_func(self, pfn):
+		self.cache.invalidate(pfn.start_ea)
+		return 0
+
+	def set_func_start(self, pfn, new_start):
+		self.cache.invalidate(pfn.start_ea)
+		return 0
+
+	def set_func_end(self, pfn, new_end):
+		self.cache.invalidate(pfn.start_ea)
+		return 0
+
+	def ti_changed(self, ea, *args):
+		# type of instruction inside of function changes only that function
+		func = idaapi.get_func(ea)
+		if func is not None and func.start_ea != ea:
+			self.cache.invalidate(func.start_ea)
+			return 0
+
+		# type of object changes decompilation of functions, that use it, looking
+		# them up is too expensive inside of IDB event, so all functions are dropped
+		self.cache.clear()
+		return 0
+
+	def local_types_changed(self, *args):
+		self.cache.clear()
+		return 0
+
+	def closebase(self):
+		self.cache.clear()
+		return 0
+
+
+class CfuncCache:
+	"""LRU cache of "function start -> decompiled function", bounded by amount of
+	functions and their ctree items in runtime settings. Functions, that failed
+	to decompile, are remembered and are not decompiled again until invalidated."""
+	def __init__(self):
+		# function start -> (cfunc, amount of items), least recently used first
+		self.__entries : OrderedDict[int, tuple] = OrderedDict()
+		self.__items_count = 0
+		self.failures : set[int] = set()
+		self.hooks : CfuncCacheHooks|None = None
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.failures_skipped = 0
+
+	def install_hooks(self):
+		if self.hooks is not None:
+			return
+		self.hooks = CfuncCacheHooks(self)
+		self.hooks.hook()
+
+	def remove_hooks(self):
+		if self.hooks is None:
+			return
+		self.hooks.unhook()
+		self.hooks = None
+
+	def get(self, func_ea: int):
+		"""Get decompiled function, that contains address. None if decompilation failed."""
+		start_ea = get_func_start(func_ea)
+		if start_ea == idaapi.BADADDR:
+			start_ea = func_ea
+
+		entry = self.__entries.get(start_ea)
+		if entry is not None:
+			self.hits += 1
+			self.__entries.move_to_end(start_ea)
+			return entry[0]
+
+		if start_ea in self.failures:
+			self.failures_skipped += 1
+			return None
+
+		self.misses += 1
+		cfunc = decompile_function(func_ea)
+		if cfunc is None:
+			self.failures.add(start_ea)
+			return None
+
+		self.update(cfunc)
+		return cfunc
+
+	def update(self, cfunc):
+		"""Cache decompiled function, replacing its previous decompilation."""
+		entry = self.__entries.get(cfunc.entry_ea)
+		if entry is not None and entry[0] is cfunc:
+			return
+
+		self.invalidate(cfunc.entry_ea)
+		items_count = sum(1 for _ in iterate_all_subitems(cfunc.body))
+		self.__entries[cfunc.entry_ea] = (cfunc, items_count)
+		self.__items_count += items_count
+		self.__evict()
+
+	def __evict(self):
+		# the most recent function is kept even if it is bigger than limit
+		while len(self.__entries) > 1 and (len(self.__entries) > runtime_settings.CFUNC_CACHE_MAX_FUNCTIONS or
+				self.__items_count > runtime_settings.CFUNC_CACHE_MAX_ITEMS):
+			_, (_, items_count) = self.__entries.popitem(last=False)
+			self.__items_count -= items_count
+			self.evictions += 1
+
+	def invalidate(self, func_ea: int):
+		"""Drop cached function and its decompilation failure."""
+		self.failures.discard(func_ea)
+		entry = self.__entries.pop(func_ea, None)
+		if entry is not None:
+			self.__items_count -= entry[1]
+
+	def clear(self):
+		self.__entries.clear()
+		self.__items_count = 0
+		self.failures.clear()
+
+	def get_hit_rate(self) -> float:
+		total = self.hits + self.misses + self.failures_skipped
+		return (self.hits + self.failures_skipped) / total if total else 0.0
+
+	def get_items_count(self) -> int:
+		return self.__items_count
+
+	def __len__(self):
+		return len(self.__entries)
+
+
+__cfunc_cache = CfuncCache()
+
+def get_cfunc_cache() -> CfuncCache:
+	"""Get cache of decompiled functions. Changes of IDB are hooked since first use."""
+	__cfunc_cache.install_hooks()
+	return __cfunc_cache
+
+def reset_cfunc_cache():
+	"""Drop cached functions and hook changes again, e.g. when IDB is changed."""
+	global __cfunc_cache
+	__cfunc_cache.remove_hooks()
+	__cfunc_cache = CfuncCache()
+	__cfunc_cache.install_hooks()
+
+
+# statuses of item matching
+NOT_MODIFIED = 0
+MODIFIED_IN_REGION = 1
+MODIFIED = 2
+
+def is_modification_in_region(ctx: PatternContext, item, region) -> bool:
+	"""Check that all items, that context is about to modify, are inside region's subtree."""
+	region_ids = None
+	for modification in ctx.modified_instrs():
+		modified_id = modification.item.obj_id
+		if modified_id == item.obj_id:
+			continue
+
+		if region_ids is None:
+			region_ids = {i.obj_id for i in ctx.tree_proc.iterate_subitems(region)}
+		if modified_id not in region_ids:
+			return False
+	return True
+
+def get_observers(path, item, lookahead):
+	"""Get items, whose matching might change after modification of item's subtree.
+	These are item's ancestors and instructions preceding item or its ancestors in blocks.
+
+	:param path: item's ancestors from the root
+	:param lookahead: how many following instructions patterns might check, None for any
+	:return: list of (observer, depth)
+	"""
+	observers = []
+	chain = path + [item]
+	for depth in range(len(chain) - 1):
+		parent = chain[depth]
+		observers.append((parent, depth))
+		if parent.op != idaapi.cit_block or lookahead == 0:
+			continue
+
+		child_id = chain[depth + 1].obj_id
+		siblings = [i for i in parent.cblock]
+		child_idx = next((i for i, s in enumerate(siblings) if s.obj_id == child_id), 0)
+		first_idx = 0 if lookahead is None else max(0, child_idx - lookahead)
+		observers += [(s, depth + 1) for s in siblings[first_idx:child_idx]]
+	return observers
+
+def get_scheme_root_ops(scheme: Scheme) -> set[int]|None:
+	"""Get ops of items, that scheme is able to match. None means any item."""
+	# custom matching logic might accept anything
+	if type(scheme).on_new_item is not Scheme.on_new_item:
+		return None
+
+	pattern = getattr(scheme, "pattern", None)
+	if pattern is None:
+		return None
+	return get_root_ops(pattern)
+
+
+class MatchRecord:
+	"""Snapshot of successful match, that does not keep tree items alive.
+
+	:param bindings: name -> address of expression, saved in context, might be BADADDR for subexpressions
+	:param variables: name -> index of local variable, saved in context
+	"""
+	__slots__ = ("func_ea", "item_ea", "scheme_name", "bindings", "variables")
+
+	def __init__(self, func_ea: int, item_ea: int, scheme_name: str, bindings: dict[str, int], variables: dict[str, int]):
+		self.func_ea = func_ea
+		self.item_ea = item_ea
+		self.scheme_name = scheme_name
+		self.bindings = bindings
+		self.variables = variables
+
+	def __repr__(self):
+		return "MatchRecord(func_ea=%#x, item_ea=%#x, scheme_name=%r, bindings=%r, variables=%r)" % (
+			self.func_ea, self.item_ea, self.scheme_name, self.bindings, self.variables)
+
 
 class Matcher:
 	def __init__(self, *schemes):
-		self.schemes : dict[str, Scheme] = {"scheme" + str(i): s for i, s in enumerate(schemes)}
+		self.schemes : dict[str, Scheme] = {}
+		# scheme name -> ops of items scheme might match, None is for any item
+		self.__schemes_ops : dict[str, set[int]|None] = {}
+		# item op -> schemes to check with their names, lazily filled and dropped on schemes change
+		self.__op2schemes : dict[int, list[tuple[str, Scheme]]] = {}
+		# functions of (scheme name, item, ctx), called on every successful match
+		self.__match_callbacks = []
+		# names of schemes, that are not matched in current function
+		self.__skipped_schemes : set[str] = set()
+		# scheme name -> features, that function must contain for scheme to match, None if unknown
+		self.__schemes_features : dict[str, list[frozenset]|None] = {}
+		# names of schemes, whose features are missing in current function, until tree is modified
+		self.__prefiltered_schemes : set[str] = set()
+		# scheme name -> anchors of scheme's pattern, None if scheme has no anchors
+		self.__schemes_anchors : dict[str, tuple|None] = {}
+		# scheme name -> ids of items near anchors in current tree, None if every item is checked
+		self.__anchored_items : dict[str, set[int]|None] = {}
+		self.__anchored_tree : TreeProcessor|None = None
+		# network of subpatterns, shared by schemes, with key of schemes and settings it was made for
+		self.__network : PatternNetwork|None = None
+		self.__network_key = None
+		# scheme name -> checker of scheme's pattern in network, active ones are used during tree matching
+		self.__network_checkers : dict = {}
+		self.__active_checkers : dict = {}
+		# set by iter_matches: suspend matching after current item or stop it
+		self.__is_suspend_requested = False
+		self.__is_stop_requested = False
+		self.__profiler = get_profiler()
+		for i, s in enumerate(schemes):
+			self.add_scheme("scheme" + str(i), s)
+
+		# None means using runtime_settings.INCREMENTAL_MATCHING
+		self.incremental : bool|None = None
+		self.restarts = 0
+		self.restarts_avoided = 0
+		# skipped by function prefilter schemes matchings and functions, that were not decompiled
+		self.schemes_prefiltered = 0
+		self.functions_prefiltered = 0
+		# scheme checks, skipped since items are far from anchors
+		self.anchored_skips = 0
 
 	def match(self, func):
 		"""Match schemes for function body.
@@ -57,8 +353,11 @@ class Matcher:
 
 		raise Exception("Invalid function type")
 
-	def match_objects_xrefs(self, *objects):
-		"""Match objects' xrefs in functions. Might decompile a lot of functions"""
+	def match_objects_xrefs(self, *objects, depth=1):
+		"""Match objects' xrefs in functions. Might decompile a lot of functions
+
+		:param depth: also match callers of functions with xrefs up to this length of calls chain
+		"""
 		cfuncs_eas = set()
 		for obj in objects:
 			if isinstance(obj, int):
@@ -68,16 +367,195 @@ class Matcher:
 			else:
 				raise TypeError("Object is of unknown type, should be int|str")
 
-			calls = get_func_calls_to(func_ea)
-			calls = [c for c in calls if is_func_start(c)]
-			cfuncs_eas.update(calls)
+			cfuncs_eas.update(get_callers(func_ea, depth))
 
-		for func_ea in sorted(cfuncs_eas):
-			self.match(func_ea)
+		self.match_functions(sorted(cfuncs_eas))
 
 	def match_everywhere(self):
-		for func_ea in idautils.Functions():
-			self.match(func_ea)
+		functions_eas = idautils.Functions()
+		if runtime_settings.PREFILTER_FUNCTIONS and runtime_settings.PREFILTER_WITH_XREFS:
+			candidates = self.get_candidate_functions()
+			if candidates is not None:
+				functions_eas = list(functions_eas)
+				self.functions_prefiltered += sum(1 for ea in functions_eas if ea not in candidates)
+				functions_eas = [ea for ea in functions_eas if ea in candidates]
+		self.match_functions(functions_eas)
+
+	def get_candidate_functions(self) -> set[int]|None:
+		"""Get functions, that have xrefs to objects, required by schemes.
+
+		:return: addresses of functions or None if some scheme might match in any function
+		"""
+		candidates = set()
+		names_eas = None
+		for name in self.schemes.keys():
+			clauses = self.__schemes_features[name]
+			objects_clauses = get_objects_clauses(clauses) if clauses is not None else []
+			if not objects_clauses:
+				return None
+
+			scheme_candidates = None
+			for clause in objects_clauses:
+				objects_eas = set()
+				for kind, value in clause:
+					if kind == "obj":
+						objects_eas.add(value)
+						continue
+
+					if names_eas is None:
+						names_eas = get_names_eas()
+					objects_eas.update(names_eas.get(value, ()))
+
+				functions_eas = set()
+				for obj_ea in objects_eas:
+					functions_eas.update(get_callers(obj_ea))
+				scheme_candidates = functions_eas if scheme_candidates is None else scheme_candidates & functions_eas
+			candidates.update(scheme_candidates)
+		return candidates
+
+	def get_indexed_candidate_functions(self, index: FeatureIndex) -> set[int]|None:
+		"""Get indexed functions, that have features, required by schemes.
+
+		:return: addresses of functions or None if some scheme might match in any function
+		"""
+		candidates = set()
+		for name in self.schemes.keys():
+			clauses = self.__schemes_features[name]
+			if not clauses:
+				return None
+			candidates.update(index.get_functions(clauses))
+		return candidates
+
+	def match_candidates(self, functions_eas=None):
+		"""Match schemes only in functions, that might have features, required by
+		schemes, according to database-wide feature index. Functions missing in
+		index are decompiled and indexed first.
+
+		:param functions_eas: matched functions, all functions by default
+		"""
+		if functions_eas is None:
+			functions_eas = idautils.Functions()
+
+		index = get_feature_index()
+		functions_eas = list(functions_eas)
+		for func_ea in functions_eas:
+			if index.is_indexed(func_ea):
+				continue
+
+			cfunc = get_cfunc(func_ea)
+			if cfunc is not None:
+				index.update_function(func_ea, cfunc.body)
+		index.save()
+
+		candidates = self.get_indexed_candidate_functions(index)
+		if candidates is not None:
+			self.functions_prefiltered += sum(1 for ea in functions_eas if ea not in candidates)
+			functions_eas = [ea for ea in functions_eas if ea in candidates]
+		self.match_functions(functions_eas)
+
+	def iter_matches(self, functions_eas=None, limit: int|None = None, first_per_function=False):
+		"""Match schemes in functions one by one and yield records of matches as soon
+		as their items are matched. Schemes still handle matched items. Matching
+		is suspended between yields, so matcher should not be used until generator
+		is exhausted or closed.
+
+		:param functions_eas: matched functions, all functions by default
+		:param limit: stop after this amount of matches
+		:param first_per_function: stop matching function after its first match
+		:return: generator of MatchRecord
+		"""
+		if limit is not None and limit <= 0:
+			return
+
+		if functions_eas is None:
+			functions_eas = idautils.Functions()
+
+		records = []
+		matches_count = 0
+		def on_match(scheme_name, item, ctx):
+			if self.__is_stop_requested:
+				return
+
+			bindings = {name: expr.ea for name, expr in ctx.expressions.items() if expr is not None}
+			variables = {name: expr.v.idx for name, expr in ctx.variables.items() if expr is not None}
+			records.append(MatchRecord(ctx.get_func_ea(), item.ea, scheme_name, bindings, variables))
+			self.__is_suspend_requested = True
+			# the rest of schemes and items of function are not checked
+			if first_per_function or (limit is not None and matches_count + len(records) >= limit):
+				self.__is_stop_requested = True
+
+		self.add_match_callback(on_match)
+		try:
+			for func_ea in functions_eas:
+				cfunc = get_cfunc(func_ea)
+				if cfunc is None:
+					continue
+
+				matching = self.__iter_cfunc_matching(cfunc)
+				try:
+					for _ in matching:
+						for record in records:
+							yield record
+							matches_count += 1
+						records.clear()
+						if limit is not None and matches_count >= limit:
+							return
+				finally:
+					matching.close()
+					records.clear()
+					self.__is_suspend_requested = False
+					self.__is_stop_requested = False
+		finally:
+			self.remove_match_callback(on_match)
+
+	def match_functions(self, functions_eas):
+		"""Match schemes in functions. Schemes, that previously found nothing
+		in unchanged function, are skipped if match cache is enabled in runtime settings."""
+		if not runtime_settings.USE_MATCH_CACHE:
+			for func_ea in functions_eas:
+				self.match(func_ea)
+			return
+
+		cache = get_match_cache()
+		for func_ea in functions_eas:
+			self.__match_with_cache(cache, func_ea)
+		cache.save()
+
+	def __match_with_cache(self, cache: MatchCache, func_ea: int):
+		cfunc = get_cfunc(func_ea)
+		if cfunc is None:
+			return
+
+		tree_hash = get_tree_hash(cfunc.body)
+		results = cache.get_function_results(func_ea, tree_hash)
+		skipped = {name for name, scheme in self.schemes.items() if cache.is_known_no_match(results, scheme)}
+		if len(skipped) == len(self.schemes):
+			return
+
+		matched_eas = {name: set() for name in self.schemes if name not in skipped}
+		def on_match(scheme_name, item, ctx):
+			if scheme_name in matched_eas:
+				matched_eas[scheme_name].add(item.ea)
+
+		self.__set_skipped_schemes(skipped)
+		self.add_match_callback(on_match)
+		try:
+			self.match_cfunc(cfunc)
+		finally:
+			self.remove_match_callback(on_match)
+			self.__set_skipped_schemes(set())
+
+		# results of schemes, that did not match, might depend on
+		# modifications of other schemes, so they are saved only for unmodified tree.
+		# Schemes might modify items in place without restart, so tree is hashed again
+		is_tree_modified = get_tree_hash(cfunc.body) != tree_hash
+		for name, eas in matched_eas.items():
+			if eas or not is_tree_modified:
+				cache.save_scheme_result(results, self.schemes[name], sorted(eas))
+
+	def __set_skipped_schemes(self, schemes_names: set[str]):
+		self.__skipped_schemes = schemes_names
+		self.__op2schemes.clear()
 
 	def match_instruction(self, instr_addr):
 		func_addr = get_func_start(instr_addr)
@@ -92,30 +570,223 @@ class Matcher:
 
 	def match_cfunc(self, cfunc):
 		"""Match schemes in decompiled function."""
+		for _ in self.__iter_cfunc_matching(cfunc):
+			pass
+
+	def __iter_cfunc_matching(self, cfunc):
+		"""Match schemes in decompiled function. Generator is suspended
+		after items with matches, only when iter_matches requests it."""
 		tree_processor = TreeProcessor(cfunc)
 		ast_tree = cfunc.body
-		self.match_ast_tree(tree_processor, ast_tree)
+		if not runtime_settings.PREFILTER_FUNCTIONS:
+			yield from self.__iter_ast_tree_matching(tree_processor, ast_tree)
+			return
+
+		self.__prefilter_schemes(ast_tree)
+		try:
+			if len(self.__skipped_schemes | self.__prefiltered_schemes) < len(self.schemes):
+				yield from self.__iter_ast_tree_matching(tree_processor, ast_tree)
+		finally:
+			self.__set_prefiltered_schemes(set())
+
+	def __prefilter_schemes(self, ast_tree):
+		features = None
+		prefiltered = set()
+		for name, clauses in self.__schemes_features.items():
+			if not clauses or name in self.__skipped_schemes:
+				continue
+
+			if features is None:
+				features = get_tree_features(ast_tree)
+			if not is_satisfied(clauses, features):
+				prefiltered.add(name)
+
+		self.schemes_prefiltered += len(prefiltered)
+		self.__set_prefiltered_schemes(prefiltered)
+
+	def __set_prefiltered_schemes(self, schemes_names: set[str]):
+		if not schemes_names and not self.__prefiltered_schemes:
+			return
+		self.__prefiltered_schemes = schemes_names
+		self.__op2schemes.clear()
+
+	def __on_tree_modified(self):
+		# modified tree might have new features, so prefiltered schemes are matched
+		# again, items, that were checked before, did not change and still can not match
+		self.__set_prefiltered_schemes(set())
+		if self.__network is not None:
+			self.__network.reset_results()
+		self.__anchored_tree = None
+
+	def __is_far_from_anchors(self, tree_processor: TreeProcessor, scheme_name: str, item) -> bool:
+		anchors = self.__schemes_anchors.get(scheme_name)
+		if anchors is None or not runtime_settings.ANCHORED_MATCHING:
+			return False
+
+		if self.__anchored_tree is not tree_processor:
+			self.__anchored_tree = tree_processor
+			self.__anchored_items.clear()
+
+		if scheme_name not in self.__anchored_items:
+			self.__anchored_items[scheme_name] = get_anchored_items(tree_processor, anchors)
+
+		anchored_items = self.__anchored_items[scheme_name]
+		if anchored_items is None or item.obj_id in anchored_items:
+			return False
+
+		self.anchored_skips += 1
+		return True
+
+	def __get_schemes_key(self):
+		# patterns are in key, since they might be replaced, e.g. by tuning
+		return (
+			tuple((name, scheme, getattr(scheme, "pattern", None)) for name, scheme in self.schemes.items()),
+			runtime_settings.COMPILE_PATTERNS, runtime_settings.OPTIMIZE_PATTERNS,
+		)
+
+	def get_pattern_network(self) -> PatternNetwork|None:
+		"""Get network of subpatterns, shared by schemes. Network is made on
+		first matching, if sharing is enabled in runtime settings."""
+		if not runtime_settings.SHARE_SUBPATTERNS:
+			return None
+
+		key = self.__get_schemes_key()
+		if self.__network is None or self.__network_key != key:
+			self.__network, self.__network_checkers = make_schemes_network(self.schemes)
+			self.__network_key = key
+		return self.__network
 
 	def match_ast_tree(self, tree_processor: TreeProcessor, ast_tree):
-		schemes = [s for s in self.schemes.values()]
+		for _ in self.__iter_ast_tree_matching(tree_processor, ast_tree):
+			pass
+
+	def __iter_ast_tree_matching(self, tree_processor: TreeProcessor, ast_tree):
+		network = self.get_pattern_network()
+		if network is None:
+			yield from self.__iter_tree_iterations(tree_processor, ast_tree)
+			return
+
+		network.reset_results()
+		self.__active_checkers = self.__network_checkers
+		try:
+			yield from self.__iter_tree_iterations(tree_processor, ast_tree)
+		finally:
+			self.__active_checkers = {}
+			network.reset_results()
+
+	def __iter_tree_iterations(self, tree_processor: TreeProcessor, ast_tree):
+		schemes = [s for n, s in self.schemes.items() if n not in self.__skipped_schemes]
 		while True:
 			contexts = [PatternContext(tree_processor) for _ in schemes]
 			for i, scheme in enumerate(schemes):
 				scheme.on_tree_iteration_start(contexts[i])
 
-			is_tree_modified = False
-			for subitem in tree_processor.iterate_subitems(ast_tree):
-				is_tree_modified = self.check_schemes(tree_processor, subitem)
-				if is_tree_modified:
-					break
+			if self.is_incremental():
+				is_restart_needed = yield from self.__match_ast_tree_incrementally(tree_processor, ast_tree)
+			else:
+				is_restart_needed = yield from self.__match_ast_tree_once(tree_processor, ast_tree)
 
-			if is_tree_modified:
+			if is_restart_needed:
+				self.restarts += 1
 				continue
 
 			for i, scheme in enumerate(schemes):
 				scheme.on_tree_iteration_end(contexts[i])
 			break
 
+	def is_incremental(self) -> bool:
+		"""Whether matching continues after tree modification instead of restarting.
+		Incremental matching visits items in DFS order instead of BFS one."""
+		if self.incremental is not None:
+			return self.incremental
+		return runtime_settings.INCREMENTAL_MATCHING
+
+	def __match_ast_tree_once(self, tree_processor: TreeProcessor, ast_tree) -> bool:
+		"""Match tree items in BFS order until first modification. Generator
+		like __iter_cfunc_matching, that returns its result.
+
+		:return: is tree modified?
+		"""
+		for subitem in tree_processor.iterate_subitems(ast_tree):
+			is_modified = self.check_schemes(tree_processor, subitem)
+			if self.__is_suspend_requested:
+				self.__is_suspend_requested = False
+				yield
+			if self.__is_stop_requested:
+				return False
+			if is_modified:
+				return True
+		return False
+
+	def __match_ast_tree_incrementally(self, tree_processor: TreeProcessor, ast_tree) -> bool:
+		"""Match tree items in DFS order. After modification inside parent of
+		matched item only items, that are able to see modified subtree, are matched again:
+		parent's subtree, parent's ancestors and preceding instructions in their blocks.
+		Tree is fully matched again, if schemes might check any following instructions.
+		Generator like __iter_cfunc_matching, that returns its result.
+
+		:return: is full restart needed?
+		"""
+		lookahead = self.__get_siblings_lookahead()
+		# entries are (item, depth, is_traversed), items with is_traversed=False
+		# are only matched again and their children are skipped
+		stack = [(ast_tree, 0, True)]
+		# ancestors of current item and sizes of stack before their children were pushed
+		path = []
+		marks = []
+		while stack:
+			item, depth, is_traversed = stack.pop()
+			if is_traversed:
+				del path[depth:]
+				del marks[depth:]
+
+			parent = path[depth - 1] if depth > 0 else None
+			status = self.__check_schemes(tree_processor, item, parent)
+			if self.__is_suspend_requested:
+				self.__is_suspend_requested = False
+				yield
+			if self.__is_stop_requested:
+				return False
+
+			if status == NOT_MODIFIED:
+				if is_traversed:
+					marks.append(len(stack))
+					path.append(item)
+					children = get_children(item)
+					stack += [(c, depth + 1, True) for c in reversed(children)]
+				continue
+
+			# custom matching logic might look anywhere in the tree
+			if status == MODIFIED or parent is None or lookahead is None:
+				return True
+
+			# parent subtree is traversed again from scratch
+			self.restarts_avoided += 1
+			depth -= 1
+			del stack[marks[depth]:]
+			del path[depth:]
+			del marks[depth:]
+			stack.append((parent, depth, True))
+			observers = get_observers(path, parent, lookahead)
+			stack += [(o, d, False) for o, d in reversed(observers)]
+		return False
+
+	def __get_siblings_lookahead(self) -> int|None:
+		lookahead = 0
+		for scheme in self.schemes.values():
+			if type(scheme).on_new_item is not Scheme.on_new_item:
+				return None
+
+			pattern = getattr(scheme, "pattern", None)
+			if pattern is None:
+				continue
+
+			scheme_lookahead = get_siblings_lookahead(pattern)
+			if scheme_lookahead is None:
+				return None
+			lookahead = max(lookahead, scheme_lookahead)
+		return lookahead
+
 	def check_schemes(self, tree_processor: TreeProcessor, item: idaapi.citem_t) -> bool:
 		"""Match item in schemes.
 
@@ -123,18 +794,52 @@ class Matcher:
 		:param item: AST item
 		:return: is item modified/removed?
 		"""
+		return self.__check_schemes(tree_processor, item) != NOT_MODIFIED
+
+	def __check_schemes(self, tree_processor: TreeProcessor, item: idaapi.citem_t, region=None) -> int:
+		"""Match item in schemes.
+
+		:param region: AST item, whose subtree is checked for containing modified items
+		:return: NOT_MODIFIED, MODIFIED_IN_REGION or MODIFIED
+		"""
 		item_ctx = PatternContext(tree_processor)
 
-		for scheme in self.schemes.values():
-			if self.check_scheme(scheme, item, item_ctx):
-				return True
+		for name, scheme in self.get_named_schemes_for_op(item.op):
+			if self.__is_far_from_anchors(tree_processor, name, item):
+				continue
+
+			if self.check_scheme(scheme, item, item_ctx, name):
+				# tree is modified by scheme itself, nothing is known about changes
+				tree_processor.invalidate_caches()
+				self.__on_tree_modified()
+				if self.__profiler.enabled:
+					self.__profiler.get_scheme_stats(name).restarts += 1
+				return MODIFIED
 
+			# modified items might get deleted, so region is checked beforehand
+			is_in_region = region is not None and is_modification_in_region(item_ctx, item, region)
 			if self.finalize_item_context(item_ctx):
-				return True
+				status = MODIFIED_IN_REGION if is_in_region else MODIFIED
+				self.__on_tree_modified()
+				if self.__profiler.enabled:
+					stats = self.__profiler.get_scheme_stats(name)
+					stats.modifications += 1
+					if status == MODIFIED:
+						stats.restarts += 1
+					else:
+						stats.region_restarts += 1
+				return status
+
+			if self.__is_stop_requested:
+				break
 
-		return False
+		return NOT_MODIFIED
+
+	def check_scheme(self, scheme: Scheme, item: idaapi.citem_t, item_ctx: PatternContext, scheme_name: str|None = None) -> bool:
+		"""Match item in scheme and handle it if matched.
 
-	def check_scheme(self, scheme: Scheme, item: idaapi.citem_t, item_ctx: PatternContext):
+		:return: is tree modified by scheme's handler?
+		"""
 		if runtime_settings.CATCH_DURING_MATCHING:
 			try:
 				item_ctx.cleanup()
@@ -144,25 +849,60 @@ class Matcher:
 		else:
 			item_ctx.cleanup()
 
+		if self.__profiler.enabled:
+			return self.__check_scheme_profiled(scheme, item, item_ctx, scheme_name)
+
+		if not self.__is_item_matched(scheme, item, item_ctx, scheme_name):
+			return False
+
+		for callback in self.__match_callbacks:
+			callback(scheme_name, item, item_ctx)
+
+		return self.__handle_matched_item(scheme, item, item_ctx)
+
+	def __check_scheme_profiled(self, scheme: Scheme, item: idaapi.citem_t, item_ctx: PatternContext, scheme_name: str|None) -> bool:
+		stats = self.__profiler.get_scheme_stats(scheme_name or type(scheme).__name__)
+		stats.calls += 1
+		start = time.perf_counter()
+		is_matched = self.__is_item_matched(scheme, item, item_ctx, scheme_name)
+		stats.on_new_item_time.add(time.perf_counter() - start)
+		if not is_matched:
+			return False
+
+		stats.matches += 1
+		for callback in self.__match_callbacks:
+			callback(scheme_name, item, item_ctx)
+
+		start = time.perf_counter()
+		is_tree_modified = self.__handle_matched_item(scheme, item, item_ctx)
+		stats.on_matched_item_time.add(time.perf_counter() - start)
+		if is_tree_modified:
+			stats.modifications += 1
+		return is_tree_modified
+
+	def __is_item_matched(self, scheme: Scheme, item: idaapi.citem_t, item_ctx: PatternContext, scheme_name: str|None) -> bool:
+		# pattern with shared subpatterns is checked instead of scheme's own one
+		check = self.__active_checkers.get(scheme_name)
+		if check is None:
+			check = scheme.on_new_item
+
 		if runtime_settings.CATCH_DURING_MATCHING:
 			try:
-				if not scheme.on_new_item(item, item_ctx):
-					return False
+				return check(item, item_ctx)
 			except Exception as e:
 				print('[!] Got an exception during pattern matching: %s' % e)
 				return False
 		else:
-			if not scheme.on_new_item(item, item_ctx):
-				return False
+			return check(item, item_ctx)
 
+	def __handle_matched_item(self, scheme: Scheme, item: idaapi.citem_t, item_ctx: PatternContext) -> bool:
 		if runtime_settings.CATCH_DURING_MATCHING:
 			try:
 				is_tree_modified = scheme.on_matched_item(item, item_ctx)
 				if not isinstance(is_tree_modified, bool):
 					raise Exception("Handler return invalid return type, should be bool")
 
-				if is_tree_modified:
-					return True
+				return is_tree_modified
 			except Exception as e:
 				print('[!] Got an exception during pattern handling: %s' % e)
 				return False
@@ -171,8 +911,7 @@ class Matcher:
 			if not isinstance(is_tree_modified, bool):
 				raise Exception("Handler return invalid return type, should be bool")
 
-			if is_tree_modified:
-				return True
+			return is_tree_modified
 
 	def finalize_item_context(self, ctx: PatternContext):
 		tree_proc = ctx.tree_proc
@@ -192,11 +931,51 @@ class Matcher:
 	def get_scheme(self, scheme_name: str):
 		return self.schemes.get(scheme_name)
 
+	def get_schemes_for_op(self, op: int) -> list[Scheme]:
+		"""Get schemes, that are able to match item with given op. Keeps schemes order."""
+		return [scheme for _, scheme in self.get_named_schemes_for_op(op)]
+
+	def get_named_schemes_for_op(self, op: int) -> list[tuple[str, Scheme]]:
+		"""Same as get_schemes_for_op, but schemes are paired with their names."""
+		schemes = self.__op2schemes.get(op)
+		if schemes is not None:
+			return schemes
+
+		schemes = []
+		for name, scheme in self.schemes.items():
+			if name in self.__skipped_schemes or name in self.__prefiltered_schemes:
+				continue
+
+			ops = self.__schemes_ops[name]
+			if ops is None or op in ops:
+				schemes.append((name, scheme))
+		self.__op2schemes[op] = schemes
+		return schemes
+
+	def add_match_callback(self, callback):
+		"""Add function of (scheme name, item, ctx), that is called after successful
+		match of scheme's pattern and before scheme's handling of matched item."""
+		self.__match_callbacks.append(callback)
+
+	def remove_match_callback(self, callback):
+		if callback in self.__match_callbacks:
+			self.__match_callbacks.remove(callback)
+
 	def add_scheme(self, name:str, scheme:Scheme):
 		self.schemes[name] = scheme
+		self.__schemes_ops[name] = get_scheme_root_ops(scheme)
+		self.__schemes_features[name] = get_scheme_required_features(scheme)
+		self.__schemes_anchors[name] = get_scheme_anchors(scheme)
+		self.__anchored_tree = None
+		self.__op2schemes.clear()
 
 	def remove_scheme(self, scheme_name: str):
 		self.schemes.pop(scheme_name, None)
+		self.__schemes_ops.pop(scheme_name, None)
+		self.__schemes_features.pop(scheme_name, None)
+		self.__schemes_anchors.pop(scheme_name, None)
+		self.__anchored_tree = None
+		self.__op2schemes.clear()
 
 	def expressions_traversal_is_needed(self):
 		abstract_expression_patterns = (VarBindPat, BindItemPat)
@@ -0,0 +1,394 @@
+from __future__ import annotations
+import idaapi
+
+from herast.tree.patterns.base_pattern import BasePat
+from herast.tree.patterns.abstracts import AnyPat, OrPat, AndPat, BindItemPat, VarBindPat, DeepExprPat, RemovePat
+from herast.tree.patterns.expressions import ExpressionPat, CallPat, ObjPat, HelperPat, NumPat
+from herast.tree.patterns.instructions import InstructionPat
+from herast.tree.patterns.helpers import SeqPat, MultiObjectPat, IntPat, StringPat, StructFieldAccessPat
+from herast.tree.processing import TreeProcessor, get_summary_feature_bit
+
+
+def __get_checked_ops(pat: BasePat) -> set[int]|None:
+	"""Get ops of items, that are passed to pattern's check after casts skipping."""
+	if isinstance(pat, (AnyPat, DeepExprPat)):
+		return None
+
+	if isinstance(pat, OrPat):
+		ops = set()
+		for p in pat.pats:
+			child_ops = get_root_ops(p)
+			if child_ops is None:
+				ops = None
+				break
+			ops.update(child_ops)
+
+	elif isinstance(pat, AndPat):
+		ops = None
+		for p in pat.pats:
+			child_ops = get_root_ops(p)
+			if child_ops is None:
+				continue
+			ops = set(child_ops) if ops is None else ops & child_ops
+
+	elif isinstance(pat, (BindItemPat, RemovePat)):
+		ops = get_root_ops(pat.pat)
+
+	elif isinstance(pat, SeqPat):
+		ops = get_root_ops(pat.seq[0]) if pat.length > 0 else None
+
+	elif isinstance(pat, VarBindPat):
+		ops = {idaapi.cot_var}
+
+	elif isinstance(pat, (MultiObjectPat, StringPat)):
+		ops = {idaapi.cot_obj}
+
+	elif isinstance(pat, IntPat):
+		ops = {idaapi.cot_num, idaapi.cot_obj}
+
+	elif isinstance(pat, StructFieldAccessPat):
+		ops = {idaapi.cot_memptr, idaapi.cot_memref}
+
+	else:
+		ops = None
+
+	if pat.check_op is not None:
+		if ops is None:
+			ops = {pat.check_op}
+		else:
+			ops = ops & {pat.check_op}
+	return ops
+
+def get_root_ops(pat: BasePat) -> set[int]|None:
+	"""Get ops of items, that pattern is able to match.
+	Result is conservative, so pattern might still fail on items with these ops.
+
+	:param pat: AST pattern
+	:return: set of items ops or None if pattern might match item with any op
+	"""
+	ops = __get_checked_ops(pat)
+	if ops is None:
+		return None
+
+	if pat.skip_casts and not isinstance(pat, AnyPat):
+		ops.add(idaapi.cot_cast)
+	return ops
+
+def iterate_subpatterns(pat: BasePat):
+	"""Iterate over pattern and all its subpatterns, that are stored in its attributes."""
+	unprocessed = [pat]
+	while unprocessed:
+		current = unprocessed.pop()
+		yield current
+		for value in vars(current).values():
+			if isinstance(value, BasePat):
+				unprocessed.append(value)
+			elif isinstance(value, (tuple, list)):
+				unprocessed += [v for v in value if isinstance(v, BasePat)]
+
+def is_builtin_pattern(pat: BasePat) -> bool:
+	"""Whether pattern is one of herast patterns and not a user defined one."""
+	return type(pat).__module__.startswith("herast.tree.patterns.")
+
+def get_siblings_lookahead(pat: BasePat) -> int|None:
+	"""Get how many following instructions in a block pattern might check
+	after matched instruction.
+
+	:return: amount of instructions or None if it is unknown
+	"""
+	lookahead = 0
+	for p in iterate_subpatterns(pat):
+		if not is_builtin_pattern(p):
+			return None
+
+		if isinstance(p, SeqPat):
+			lookahead = max(lookahead, p.length - 1)
+	return lookahead
+
+def get_pattern_fingerprint(pat) -> str:
+	"""Get text representation of pattern with all its subpatterns and their attributes."""
+	if isinstance(pat, BasePat):
+		attributes = ", ".join("%s=%s" % (k, get_pattern_fingerprint(v)) for k, v in sorted(vars(pat).items()))
+		return "%s.%s(%s)" % (type(pat).__module__, type(pat).__qualname__, attributes)
+
+	if isinstance(pat, (tuple, list)):
+		return "[%s]" % ", ".join(get_pattern_fingerprint(p) for p in pat)
+	# order of sets depends on hash seed, while fingerprints are persisted between sessions
+	if isinstance(pat, (set, frozenset)):
+		return "{%s}" % ", ".join(sorted(get_pattern_fingerprint(p) for p in pat))
+	return repr(pat)
+
+def iterate_subpatterns_with_paths(pat: BasePat, path=""):
+	"""Iterate over pattern and all its subpatterns with their paths from root
+	pattern, e.g. "pats.1.first_operand". Path of root pattern is empty string."""
+	unprocessed = [(path, pat)]
+	while unprocessed:
+		current_path, current = unprocessed.pop()
+		yield current_path, current
+		prefix = current_path + "." if current_path else ""
+		children = []
+		for name, value in vars(current).items():
+			if isinstance(value, BasePat):
+				children.append((prefix + name, value))
+			elif isinstance(value, (tuple, list)):
+				children += [(prefix + name + "." + str(i), v) for i, v in enumerate(value) if isinstance(v, BasePat)]
+		unprocessed += reversed(children)
+
+def get_subpattern(pat: BasePat, path: str) -> BasePat|None:
+	"""Get subpattern by its path from root pattern."""
+	current = pat
+	for part in path.split(".") if path else ():
+		if isinstance(current, (tuple, list)):
+			if not part.isdigit() or int(part) >= len(current):
+				return None
+			current = current[int(part)]
+		else:
+			current = vars(current).get(part)
+		if current is None:
+			return None
+	return current if isinstance(current, BasePat) else None
+
+def is_side_effect_free(pat: BasePat) -> bool:
+	"""Whether checking pattern does not change matching context, so its
+	result does not depend on order of checking it with other patterns."""
+	for p in iterate_subpatterns(pat):
+		if not is_builtin_pattern(p):
+			return False
+
+		if isinstance(p, (BindItemPat, VarBindPat, RemovePat)):
+			return False
+
+		if isinstance(p, DeepExprPat) and p.bind_name is not None:
+			return False
+	return True
+
+
+# disjunction of patterns multiplies their clauses, extra clauses are dropped
+MAX_CLAUSES = 32
+
+
+def __get_object_features(pat: ObjPat) -> set:
+	features = set()
+	if pat.ea is not None:
+		features.add(("obj", pat.ea))
+	if pat.name is not None:
+		features.add(("name", pat.name))
+	return features
+
+def __get_disjunction(alternatives: list[list[frozenset]]) -> list[frozenset]:
+	clauses = [frozenset()]
+	for alternative in alternatives:
+		if not alternative:
+			return []
+		clauses = [c | a for c in clauses for a in alternative][:MAX_CLAUSES]
+	return clauses
+
+def get_required_features(pat: BasePat, in_subtree=False) -> list[frozenset]:
+	"""Get features, that are present in every function, where pattern matches.
+	Dropping any clause keeps result correct, so unknown patterns require nothing.
+	Features are described in herast/tree/prefilter.py.
+
+	:param in_subtree: get only features, that are present in subtree of matched item
+	:return: list of clauses, every clause is a set of alternative features
+	"""
+	if not is_builtin_pattern(pat) or isinstance(pat, AnyPat):
+		return []
+
+	clauses = []
+	if pat.check_op is not None:
+		clauses.append(frozenset({("op", pat.check_op)}))
+
+	if isinstance(pat, OrPat):
+		clauses += __get_disjunction([get_required_features(p, in_subtree) for p in pat.pats])
+
+	elif isinstance(pat, AndPat):
+		for p in pat.pats:
+			clauses += get_required_features(p, in_subtree)
+
+	elif isinstance(pat, (BindItemPat, DeepExprPat, RemovePat)):
+		clauses += get_required_features(pat.pat, in_subtree)
+
+	elif isinstance(pat, VarBindPat):
+		clauses.append(frozenset({("op", idaapi.cot_var)}))
+
+	elif isinstance(pat, SeqPat):
+		# following instructions are not in subtree of matched one
+		for p in pat.seq if not in_subtree else pat.seq[:1]:
+			clauses += get_required_features(p, in_subtree)
+
+	elif isinstance(pat, MultiObjectPat):
+		clauses.append(frozenset({("op", idaapi.cot_obj)}))
+		objects = [__get_object_features(o) for o in pat.objects]
+		if objects and all(objects):
+			clauses.append(frozenset(set().union(*objects)))
+
+	elif isinstance(pat, IntPat):
+		clauses.append(frozenset({("op", idaapi.cot_num), ("op", idaapi.cot_obj)}))
+		if pat.value is not None:
+			clauses.append(frozenset({("num", pat.value), ("obj", pat.value)}))
+
+	elif isinstance(pat, ObjPat):
+		features = __get_object_features(pat)
+		if features:
+			clauses.append(frozenset(features))
+
+	elif isinstance(pat, HelperPat):
+		if pat.helper_name is not None:
+			clauses.append(frozenset({("helper", pat.helper_name)}))
+
+	elif isinstance(pat, NumPat):
+		if pat.num is not None:
+			clauses.append(frozenset({("num", pat.num)}))
+
+	elif isinstance(pat, StructFieldAccessPat):
+		clauses.append(frozenset({("op", idaapi.cot_memref), ("op", idaapi.cot_memptr)}))
+		if pat.member_offset is not None:
+			clauses.append(frozenset({("member", pat.member_offset)}))
+
+	elif isinstance(pat, CallPat):
+		if pat.calling_function is not None:
+			clauses += get_required_features(pat.calling_function, in_subtree)
+		# missing arguments are not checked
+		if not pat.ignore_arguments and not pat.skip_missing:
+			for p in pat.arguments:
+				clauses += get_required_features(p, in_subtree)
+
+	elif isinstance(pat, (ExpressionPat, InstructionPat)):
+		# other items patterns check all their subpatterns
+		for value in vars(pat).values():
+			if isinstance(value, BasePat):
+				clauses += get_required_features(value, in_subtree)
+			elif isinstance(value, (tuple, list)):
+				for v in value:
+					if isinstance(v, BasePat):
+						clauses += get_required_features(v, in_subtree)
+
+	return list(dict.fromkeys(clauses))
+
+def get_objects_clauses(clauses: list[frozenset]) -> list[frozenset]:
+	"""Get clauses, that consist only of objects, so they could be resolved with xrefs."""
+	return [c for c in clauses if c and all(kind in ("obj", "name") for kind, _ in c)]
+
+def is_satisfied(clauses: list[frozenset], features: set) -> bool:
+	for clause in clauses:
+		if clause.isdisjoint(features):
+			return False
+	return True
+
+def __make_subtree_filter(clauses: list[frozenset]):
+	masks = []
+	for clause in clauses:
+		mask = 0
+		for kind, value in clause:
+			mask |= 1 << value if kind == "op" else get_summary_feature_bit(kind, value)
+		masks.append(mask)
+
+	if not masks:
+		return None
+	if len(masks) == 1:
+		mask = masks[0]
+		return lambda summary: summary & mask != 0
+	return lambda summary: all(summary & mask for mask in masks)
+
+def make_subtree_filter(pat: BasePat):
+	"""Make function of subtree summary -> bool, that rejects subtrees, where
+	pattern can not match any item. None means any subtree might contain match."""
+	return __make_subtree_filter(get_required_features(pat, in_subtree=True))
+
+
+def __get_callee_query(query: dict) -> dict|None:
+	if query.get("op") == idaapi.cot_obj and len(query) == 2:
+		return dict(query, op=idaapi.cot_call)
+	if query.get("op") == idaapi.cot_helper and "helper" in query:
+		return {"op": idaapi.cot_call, "helper": query["helper"]}
+	return None
+
+def __get_objects_queries(objects: list[ObjPat]) -> list[dict]:
+	queries = []
+	for o in objects:
+		if o.ea is None and o.name is None:
+			return [{"op": idaapi.cot_obj}]
+		# object matches either by address or by name
+		if o.ea is not None:
+			queries.append({"op": idaapi.cot_obj, "obj_ea": o.ea})
+		if o.name is not None:
+			queries.append({"op": idaapi.cot_obj, "name": o.name})
+	return queries
+
+def get_pattern_queries(pat: BasePat) -> list[dict]|None:
+	"""Get arguments of TreeProcessor.find, every item, that pattern matches
+	after casts skipping, is found by one of them.
+
+	:return: list of alternative queries or None if pattern might match any item
+	"""
+	if not is_builtin_pattern(pat):
+		return None
+
+	if isinstance(pat, OrPat):
+		queries = []
+		for p in pat.pats:
+			alternative = get_pattern_queries(p)
+			if alternative is None:
+				return None
+			queries += alternative
+		return queries
+
+	if isinstance(pat, AndPat):
+		alternatives = [q for q in (get_pattern_queries(p) for p in pat.pats) if q is not None]
+		return min(alternatives, key=len) if alternatives else None
+
+	if isinstance(pat, (BindItemPat, RemovePat)):
+		return get_pattern_queries(pat.pat)
+
+	if isinstance(pat, VarBindPat):
+		return [{"op": idaapi.cot_var}]
+
+	if isinstance(pat, MultiObjectPat):
+		return __get_objects_queries(pat.objects)
+
+	if isinstance(pat, ObjPat):
+		return __get_objects_queries([pat])
+
+	if isinstance(pat, HelperPat) and pat.helper_name is not None:
+		return [{"op": idaapi.cot_helper, "helper": pat.helper_name}]
+
+	if isinstance(pat, NumPat) and pat.num is not None:
+		return [{"op": idaapi.cot_num, "num": pat.num}]
+
+	if isinstance(pat, CallPat) and pat.calling_function is not None:
+		callee_queries = get_pattern_queries(pat.calling_function) or []
+		queries = [__get_callee_query(q) for q in callee_queries]
+		if queries and all(q is not None for q in queries):
+			return queries
+
+	if pat.check_op is not None:
+		return [{"op": pat.check_op}]
+	return None
+
+# pattern id -> (pattern, queries), pattern is kept to keep id unique
+__patterns_queries = {}
+
+def find_pattern_candidates(tree_proc: TreeProcessor, pat: BasePat) -> list|None:
+	"""Get items of function in BFS order, where pattern might match, via function's
+	items index instead of checking every item. Casts of found items are candidates
+	too, since patterns skip them.
+
+	:return: candidate items or None if pattern might match any item
+	"""
+	cached = __patterns_queries.get(id(pat))
+	if cached is None:
+		cached = __patterns_queries[id(pat)] = (pat, get_pattern_queries(pat))
+
+	queries = cached[1]
+	if queries is None:
+		return None
+
+	candidates = {}
+	for query in queries:
+		for item in tree_proc.find(**query):
+			while item is not None and item.obj_id not in candidates:
+				candidates[item.obj_id] = item
+				item = tree_proc.get_parent(item)
+				if item is not None and item.op != idaapi.cot_cast:
+					break
+	return tree_proc.sort_items(candidates.values())
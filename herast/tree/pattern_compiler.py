@@ -0,0 +1,374 @@
+from __future__ import annotations
+import idaapi
+
+from herast.tree.patterns.base_pattern import BasePat
+from herast.tree.patterns.abstracts import AnyPat, OrPat, AndPat, BindItemPat, VarBindPat, DeepExprPat, RemovePat
+from herast.tree.patterns.expressions import CallPat, HelperPat, NumPat, CastPat, ObjPat, RefPat, MemrefPat, PtrPat, \
+	MemptrPat, IdxPat, TernaryPat, VarPat, AbstractUnaryOpPat, AbstractBinaryOpPat, AsgPat
+from herast.tree.patterns.instructions import BlockPat, ExprInsPat, IfPat, ForPat, RetPat, WhilePat, DoPat, GotoPat
+from herast.tree.patterns.helpers import MultiObjectPat
+from herast.tree.pattern_optimizer import optimize_pattern
+from herast.tree.symbols import is_object_named, is_object_named_any
+from herast.settings import runtime_settings
+
+
+class UnsupportedPattern(Exception):
+	"""Pattern can not be compiled, so interpreted check is used for it."""
+
+
+class PatternCompiler:
+	"""Generates python source of a single function, that does the same
+	as pattern's check. Ops checks are inlined, casts skipping, labels and
+	debug branches are generated only if pattern uses them. Patterns, that
+	compiler does not know about, are checked with their own check.
+	"""
+	def __init__(self):
+		self.namespace = {"idaapi": idaapi, "is_object_named": is_object_named, "is_object_named_any": is_object_named_any}
+		self.functions : list[str] = []
+		self.names_counter = 0
+
+	def new_name(self, prefix):
+		self.names_counter += 1
+		return "%s%d" % (prefix, self.names_counter)
+
+	def add_const(self, value) -> str:
+		"""Make value accessible from generated code."""
+		if value is None or isinstance(value, (bool, int)):
+			return repr(value)
+		name = self.new_name("_c")
+		self.namespace[name] = value
+		return name
+
+	def add_function(self, emit_body) -> str:
+		"""Generate function of (item, ctx). Body returns False on fail."""
+		name = self.new_name("_check")
+		lines = ["def %s(item, ctx):" % name]
+		emit_body("item", 1, lines)
+		lines.append("\treturn True")
+		self.functions.append("\n".join(lines))
+		return name
+
+	def add_pattern_function(self, pat: BasePat) -> str:
+		return self.add_function(lambda var, indent, lines: self.emit(pat, var, indent, lines))
+
+	def compile(self, pat: BasePat):
+		name = self.add_pattern_function(pat)
+		source = "\n\n".join(self.functions)
+		code = compile(source, "<herast compiled %s>" % type(pat).__name__, "exec")
+		exec(code, self.namespace)
+		checker = self.namespace[name]
+		checker.source = source
+		return checker
+
+	def emit(self, pat: BasePat, var: str, indent: int, lines: list[str]):
+		"""Emit statements, that return False if pattern fails on item in var."""
+		if not isinstance(pat, BasePat):
+			raise UnsupportedPattern()
+
+		emitter, is_parent_checked = pattern_emitters.get(type(pat).check, (None, False))
+		body = []
+		try:
+			if emitter is None or pat.debug:
+				raise UnsupportedPattern()
+
+			if is_parent_checked:
+				var = self.emit_parent_check(pat, var, indent, body)
+			emitter(self, pat, var, indent, body)
+		except UnsupportedPattern:
+			body = []
+			self.emit_fail_if(body, indent, "not %s.check(%s, ctx)" % (self.add_const(pat), var))
+		lines += body
+
+	def emit_parent_check(self, pat: BasePat, var: str, indent: int, lines: list[str]) -> str:
+		"""Emit BasePat.parent_check part. Returns variable with checked item"""
+		self.emit_fail_if(lines, indent, "%s is None" % var)
+		if pat.skip_casts:
+			new_var = self.new_name("_i")
+			self.emit_line(lines, indent, "%s = %s.x if %s.op == %d else %s" % (new_var, var, var, idaapi.cot_cast, var))
+			var = new_var
+
+		if pat.check_op is not None:
+			self.emit_fail_if(lines, indent, "%s.op != %d" % (var, pat.check_op))
+
+		if pat.label_num == -2:
+			self.emit_fail_if(lines, indent, "%s.label_num == -1" % var)
+		elif pat.label_num is not None:
+			self.emit_fail_if(lines, indent, "%s.label_num != %s" % (var, self.add_const(pat.label_num)))
+		return var
+
+	def emit_line(self, lines: list[str], indent: int, line: str):
+		lines.append("\t" * indent + line)
+
+	def emit_fail_if(self, lines: list[str], indent: int, condition: str):
+		self.emit_line(lines, indent, "if %s: return False" % condition)
+
+	def emit_child(self, pat: BasePat, expr: str, indent: int, lines: list[str]):
+		"""Emit check of pattern on subitem, e.g. item.x"""
+		var = self.new_name("_i")
+		self.emit_line(lines, indent, "%s = %s" % (var, expr))
+		self.emit(pat, var, indent, lines)
+
+
+def __emit_any(compiler: PatternCompiler, pat: AnyPat, var, indent, lines):
+	if not pat.may_be_none:
+		compiler.emit_fail_if(lines, indent, "%s is None" % var)
+
+def __emit_or(compiler: PatternCompiler, pat: OrPat, var, indent, lines):
+	if len(pat.pats) == 0:
+		compiler.emit_line(lines, indent, "return False")
+		return
+
+	calls = ["%s(%s, ctx)" % (compiler.add_pattern_function(p), var) for p in pat.pats]
+	compiler.emit_fail_if(lines, indent, "not (%s)" % " or ".join(calls))
+
+def __emit_and(compiler: PatternCompiler, pat: AndPat, var, indent, lines):
+	for p in pat.pats:
+		compiler.emit(p, var, indent, lines)
+
+def __emit_bind_item(compiler: PatternCompiler, pat: BindItemPat, var, indent, lines):
+	compiler.emit(pat.pat, var, indent, lines)
+	name = compiler.add_const(pat.name)
+	current = compiler.new_name("_e")
+	compiler.emit_line(lines, indent, "%s = ctx.get_expr(%s)" % (current, name))
+	compiler.emit_line(lines, indent, "if %s is None: ctx.save_expr(%s, %s)" % (current, name, var))
+	compiler.emit_line(lines, indent, "elif not ctx.is_equal_effect(%s, %s): return False" % (var, current))
+
+def __emit_var_bind(compiler: PatternCompiler, pat: VarBindPat, var, indent, lines):
+	name = compiler.add_const(pat.name)
+	compiler.emit_fail_if(lines, indent, "%s.op != %d" % (var, idaapi.cot_var))
+	compiler.emit_line(lines, indent, "if ctx.has_var(%s):" % name)
+	compiler.emit_fail_if(lines, indent + 1, "ctx.get_var(%s).v.idx != %s.v.idx" % (name, var))
+	compiler.emit_line(lines, indent, "else: ctx.save_var(%s, %s)" % (name, var))
+
+def __emit_deep_expr(compiler: PatternCompiler, pat: DeepExprPat, var, indent, lines):
+	if not isinstance(pat.pat, BasePat):
+		raise UnsupportedPattern()
+
+	check = compiler.add_pattern_function(pat.pat)
+	subitem = compiler.new_name("_i")
+	subtree_filter = compiler.add_const(pat.get_subtree_filter())
+	compiler.emit_line(lines, indent, "for %s in ctx.tree_proc.iterate_subitems_filtered(%s, %s):" % (subitem, var, subtree_filter))
+	compiler.emit_line(lines, indent + 1, "if not %s(%s, ctx): continue" % (check, subitem))
+	if pat.bind_name is not None:
+		compiler.emit_line(lines, indent + 1, "ctx.save_expr(%s, %s)" % (compiler.add_const(pat.bind_name), subitem))
+	compiler.emit_line(lines, indent + 1, "break")
+	compiler.emit_line(lines, indent, "else: return False")
+
+def __emit_remove(compiler: PatternCompiler, pat: RemovePat, var, indent, lines):
+	compiler.emit(pat.pat, var, indent, lines)
+	compiler.emit_line(lines, indent, "ctx.modify_instr(%s, None)" % var)
+
+def __emit_call(compiler: PatternCompiler, pat: CallPat, var, indent, lines):
+	if pat.calling_function is not None:
+		compiler.emit_child(pat.calling_function, var + ".x", indent, lines)
+
+	if pat.ignore_arguments:
+		return
+
+	args = compiler.new_name("_a")
+	compiler.emit_line(lines, indent, "%s = %s.a" % (args, var))
+	arguments_count = len(pat.arguments)
+	if not pat.skip_missing:
+		compiler.emit_fail_if(lines, indent, "len(%s) != %d" % (args, arguments_count))
+		for i, arg in enumerate(pat.arguments):
+			compiler.emit_child(arg, "%s[%d]" % (args, i), indent, lines)
+		return
+
+	length = compiler.new_name("_l")
+	compiler.emit_line(lines, indent, "%s = len(%s)" % (length, args))
+	for i, arg in enumerate(pat.arguments):
+		compiler.emit_line(lines, indent, "if %s > %d:" % (length, i))
+		compiler.emit_child(arg, "%s[%d]" % (args, i), indent + 1, lines)
+
+def __emit_helper(compiler: PatternCompiler, pat: HelperPat, var, indent, lines):
+	if pat.helper_name is not None:
+		compiler.emit_fail_if(lines, indent, "%s != %s.helper" % (compiler.add_const(pat.helper_name), var))
+
+def __emit_num(compiler: PatternCompiler, pat: NumPat, var, indent, lines):
+	if pat.num is not None:
+		compiler.emit_fail_if(lines, indent, "%s != %s.n._value" % (compiler.add_const(pat.num), var))
+
+def __emit_cast(compiler: PatternCompiler, pat: CastPat, var, indent, lines):
+	compiler.emit_child(pat.pat, var + ".x", indent, lines)
+
+def __emit_obj(compiler: PatternCompiler, pat: ObjPat, var, indent, lines):
+	if pat.ea is None and pat.name is None:
+		return
+
+	if pat.ea is not None:
+		compiler.emit_line(lines, indent, "if %s.obj_ea != %s:" % (var, compiler.add_const(pat.ea)))
+		indent += 1
+
+	if pat.name is None:
+		compiler.emit_line(lines, indent, "return False")
+		return
+
+	name = compiler.add_const(pat.name)
+	compiler.emit_fail_if(lines, indent, "not is_object_named(%s.obj_ea, %s)" % (var, name))
+
+def __emit_multi_object(compiler: PatternCompiler, pat: MultiObjectPat, var, indent, lines):
+	compiler.emit_fail_if(lines, indent, "%s.op != %d" % (var, idaapi.cot_obj))
+	if pat.any_object:
+		return
+
+	condition = "%s.obj_ea not in %s" % (var, compiler.add_const(pat.eas))
+	if pat.names:
+		condition += " and not is_object_named_any(%s.obj_ea, %s)" % (var, compiler.add_const(pat.names))
+	compiler.emit_fail_if(lines, indent, condition)
+
+def __emit_ref(compiler: PatternCompiler, pat: RefPat, var, indent, lines):
+	compiler.emit_child(pat.referenced_object, var + ".x", indent, lines)
+
+def __emit_memref(compiler: PatternCompiler, pat: MemrefPat, var, indent, lines):
+	if pat.field is not None:
+		compiler.emit_fail_if(lines, indent, "%s != %s.m" % (compiler.add_const(pat.field), var))
+	compiler.emit_child(pat.referenced_object, var + ".x", indent, lines)
+
+def __emit_ptr(compiler: PatternCompiler, pat: PtrPat, var, indent, lines):
+	compiler.emit_child(pat.pointed_object, var + ".x", indent, lines)
+
+def __emit_memptr(compiler: PatternCompiler, pat: MemptrPat, var, indent, lines):
+	if pat.field is not None:
+		compiler.emit_fail_if(lines, indent, "%s != %s.m" % (compiler.add_const(pat.field), var))
+	compiler.emit_child(pat.pointed_object, var + ".x", indent, lines)
+
+def __emit_idx(compiler: PatternCompiler, pat: IdxPat, var, indent, lines):
+	compiler.emit_child(pat.pointed_object, var + ".x", indent, lines)
+	compiler.emit_child(pat.indx, var + ".y", indent, lines)
+
+def __emit_ternary(compiler: PatternCompiler, pat: TernaryPat, var, indent, lines):
+	compiler.emit_child(pat.condition, var + ".x", indent, lines)
+	compiler.emit_child(pat.positive_expression, var + ".y", indent, lines)
+	compiler.emit_child(pat.negative_expression, var + ".z", indent, lines)
+
+def __emit_nothing(compiler: PatternCompiler, pat: BasePat, var, indent, lines):
+	return
+
+def __emit_unary(compiler: PatternCompiler, pat: AbstractUnaryOpPat, var, indent, lines):
+	compiler.emit_child(pat.operand, var + ".x", indent, lines)
+
+def __emit_binary(compiler: PatternCompiler, pat: AbstractBinaryOpPat, var, indent, lines):
+	if not pat.symmetric:
+		compiler.emit_child(pat.first_operand, var + ".x", indent, lines)
+		compiler.emit_child(pat.second_operand, var + ".y", indent, lines)
+		return
+
+	def emit_direction(first, second):
+		def emit_body(v, i, l):
+			compiler.emit_child(pat.first_operand, v + first, i, l)
+			compiler.emit_child(pat.second_operand, v + second, i, l)
+		return compiler.add_function(emit_body)
+
+	# both directions are checked, same as in interpreted check
+	direct = compiler.new_name("_d")
+	swapped = compiler.new_name("_d")
+	compiler.emit_line(lines, indent, "%s = %s(%s, ctx)" % (direct, emit_direction(".x", ".y"), var))
+	compiler.emit_line(lines, indent, "%s = %s(%s, ctx)" % (swapped, emit_direction(".y", ".x"), var))
+	compiler.emit_fail_if(lines, indent, "not (%s or %s)" % (direct, swapped))
+
+def __emit_asg(compiler: PatternCompiler, pat: AsgPat, var, indent, lines):
+	compiler.emit_child(pat.lhs, var + ".x", indent, lines)
+	compiler.emit_child(pat.rhs, var + ".y", indent, lines)
+
+def __emit_block(compiler: PatternCompiler, pat: BlockPat, var, indent, lines):
+	block = compiler.new_name("_b")
+	compiler.emit_line(lines, indent, "%s = %s.cblock" % (block, var))
+	compiler.emit_fail_if(lines, indent, "len(%s) != %d" % (block, len(pat.sequence)))
+	for i, p in enumerate(pat.sequence):
+		compiler.emit_child(p, "%s[%d]" % (block, i), indent, lines)
+
+def __emit_expr_insn(compiler: PatternCompiler, pat: ExprInsPat, var, indent, lines):
+	compiler.emit_child(pat.expr, var + ".cexpr", indent, lines)
+
+def __emit_if(compiler: PatternCompiler, pat: IfPat, var, indent, lines):
+	cif = compiler.new_name("_s")
+	compiler.emit_line(lines, indent, "%s = %s.cif" % (cif, var))
+	compiler.emit_child(pat.condition, cif + ".expr", indent, lines)
+	compiler.emit_child(pat.then_branch, cif + ".ithen", indent, lines)
+	compiler.emit_child(pat.else_branch, cif + ".ielse", indent, lines)
+
+def __emit_for(compiler: PatternCompiler, pat: ForPat, var, indent, lines):
+	cfor = compiler.new_name("_s")
+	compiler.emit_line(lines, indent, "%s = %s.cfor" % (cfor, var))
+	compiler.emit_child(pat.init, cfor + ".init", indent, lines)
+	compiler.emit_child(pat.expr, cfor + ".expr", indent, lines)
+	compiler.emit_child(pat.step, cfor + ".step", indent, lines)
+	compiler.emit_child(pat.body, cfor + ".body", indent, lines)
+
+def __emit_return(compiler: PatternCompiler, pat: RetPat, var, indent, lines):
+	compiler.emit_child(pat.expr, var + ".creturn.expr", indent, lines)
+
+def __emit_while(compiler: PatternCompiler, pat: WhilePat, var, indent, lines):
+	cwhile = compiler.new_name("_s")
+	compiler.emit_line(lines, indent, "%s = %s.cwhile" % (cwhile, var))
+	compiler.emit_child(pat.expr, cwhile + ".expr", indent, lines)
+	compiler.emit_child(pat.body, cwhile + ".body", indent, lines)
+
+def __emit_do(compiler: PatternCompiler, pat: DoPat, var, indent, lines):
+	cdo = compiler.new_name("_s")
+	compiler.emit_line(lines, indent, "%s = %s.cdo" % (cdo, var))
+	compiler.emit_child(pat.body, cdo + ".body", indent, lines)
+	compiler.emit_child(pat.expr, cdo + ".expr", indent, lines)
+
+
+# pattern check implementation -> (emitter, is check decorated with parent_check)
+pattern_emitters = {
+	AnyPat.check:              (__emit_any, False),
+	OrPat.check:               (__emit_or, True),
+	AndPat.check:              (__emit_and, True),
+	BindItemPat.check:         (__emit_bind_item, True),
+	VarBindPat.check:          (__emit_var_bind, True),
+	DeepExprPat.check:         (__emit_deep_expr, True),
+	RemovePat.check:           (__emit_remove, True),
+	CallPat.check:             (__emit_call, True),
+	HelperPat.check:           (__emit_helper, True),
+	NumPat.check:              (__emit_num, True),
+	CastPat.check:             (__emit_cast, True),
+	ObjPat.check:              (__emit_obj, True),
+	RefPat.check:              (__emit_ref, True),
+	MemrefPat.check:           (__emit_memref, True),
+	PtrPat.check:              (__emit_ptr, True),
+	MemptrPat.check:           (__emit_memptr, True),
+	IdxPat.check:              (__emit_idx, True),
+	TernaryPat.check:          (__emit_ternary, True),
+	VarPat.check:              (__emit_nothing, True),
+	AbstractUnaryOpPat.check:  (__emit_unary, True),
+	AbstractBinaryOpPat.check: (__emit_binary, True),
+	AsgPat.check:              (__emit_asg, True),
+	BlockPat.check:            (__emit_block, True),
+	ExprInsPat.check:          (__emit_expr_insn, True),
+	IfPat.check:               (__emit_if, True),
+	ForPat.check:              (__emit_for, True),
+	RetPat.check:              (__emit_return, True),
+	WhilePat.check:            (__emit_while, True),
+	DoPat.check:               (__emit_do, True),
+	GotoPat.check:             (__emit_nothing, True),
+	MultiObjectPat.check:      (__emit_multi_object, True),
+}
+
+
+def compile_pattern(pat: BasePat):
+	"""Compile pattern into a function with the same signature and behaviour as pattern's check.
+	Pattern should not be changed after compiling.
+
+	:param pat: AST pattern
+	:return: function of (item, ctx) -> bool
+	"""
+	return PatternCompiler().compile(pat)
+
+def get_pattern_checker(pat: BasePat):
+	"""Get compiled pattern check if compiling is enabled in runtime settings, or falls
+	back to pattern's interpreted check otherwise. Pattern is optimized beforehand,
+	if it is enabled in runtime settings.
+	"""
+	if runtime_settings.OPTIMIZE_PATTERNS:
+		pat = optimize_pattern(pat)
+
+	if not runtime_settings.COMPILE_PATTERNS:
+		return pat.check
+
+	try:
+		return compile_pattern(pat)
+	except Exception as e:
+		print("[!] Failed to compile pattern, using interpreted check:", e)
+		return pat.check
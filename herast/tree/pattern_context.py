@@ -1,6 +1,7 @@
 from __future__ import annotations
 import idaapi
 from herast.tree.processing import TreeProcessor
+from herast.settings import runtime_settings
 
 class InstrModification:
 	def __init__(self, item, new_item):
@@ -43,6 +44,17 @@ class PatternContext:
 	def has_expr(self, name: str):
 		return self.expressions.get(name, None) is not None
 
+	def get_item_hash(self, item) -> int:
+		"""Get structural hash of item, that ignores casts and order of
+		commutative operands. Items, that are equal by effect, have equal hashes."""
+		return self.tree_proc.get_item_hash(item)
+
+	def is_equal_effect(self, item, other) -> bool:
+		"""Compare items with equal_effect. Items with different hashes are not compared."""
+		if runtime_settings.HASH_ITEMS_PRECHECK and self.get_item_hash(item) != self.get_item_hash(other):
+			return False
+		return item.equal_effect(other)
+
 	def cleanup(self):
 		self.variables.clear()
 		self.expressions.clear()
@@ -0,0 +1,197 @@
+"""Network of subpatterns, that are shared by several schemes.
+
+Schemes often have identical parts, e.g. ExprInsPat(CallPat("memset", ...))
+or IfPat(VarPat(), ...). Network hash-conses such subpatterns by their
+fingerprints: every distinct shared subpattern becomes a single SharedPat
+node, that checks item once and remembers result for the rest of matching
+pass, so other schemes get it without checking again. Results are kept
+until tree is modified.
+
+Only subpatterns, that do not bind or remove anything, are shared, since
+result of their check depends only on item and tree.
+"""
+
+from __future__ import annotations
+import copy
+
+from herast.tree.patterns.base_pattern import BasePat
+from herast.tree.pattern_context import PatternContext
+from herast.tree.scheme import Scheme
+from herast.tree.pattern_analysis import iterate_subpatterns, get_pattern_fingerprint, is_builtin_pattern, is_side_effect_free
+from herast.tree.pattern_compiler import get_pattern_checker
+from herast.tree.pattern_optimizer import optimize_pattern
+from herast.settings import runtime_settings
+
+
+class SharedPat(BasePat):
+	"""Subpattern, that is shared by several schemes. Results of checks are remembered per item."""
+	def __init__(self, pat: BasePat, fingerprint: str):
+		super().__init__(skip_casts=False)
+		self.pat = pat
+		self.fingerprint = fingerprint
+		self.checker = pat.check
+		# item obj_id -> result of check
+		self.results : dict[int, bool] = {}
+		# amount of places in schemes patterns, that use this node
+		self.references = 0
+		self.size = sum(1 for _ in iterate_subpatterns(pat))
+		self.evaluations = 0
+		self.hits = 0
+
+	def check(self, item, ctx: PatternContext) -> bool:
+		if item is None:
+			return False
+
+		item_id = item.obj_id
+		result = self.results.get(item_id)
+		if result is not None:
+			self.hits += 1
+			return result
+
+		self.evaluations += 1
+		result = self.results[item_id] = self.checker(item, ctx)
+		return result
+
+
+def __has_subpatterns(pat: BasePat) -> bool:
+	for value in vars(pat).values():
+		if isinstance(value, BasePat):
+			return True
+		if isinstance(value, (tuple, list)) and any(isinstance(v, BasePat) for v in value):
+			return True
+	return False
+
+def is_shareable_pattern(pat: BasePat) -> bool:
+	"""Whether result of pattern's check could be shared by schemes. Leaf patterns
+	are not shared, since checking them is as cheap as looking result up."""
+	return is_builtin_pattern(pat) and __has_subpatterns(pat) and is_side_effect_free(pat)
+
+
+class PatternNetwork:
+	"""Shared subpatterns of several patterns.
+
+	:param patterns: name -> pattern
+	"""
+	def __init__(self, patterns: dict[str, BasePat]):
+		self.patterns : dict[str, BasePat] = {}
+		self.nodes : dict[str, SharedPat] = {}
+
+		fingerprints = {}
+		counts = {}
+		for pattern in patterns.values():
+			for p in iterate_subpatterns(pattern):
+				if id(p) not in fingerprints:
+					fingerprints[id(p)] = (p, get_pattern_fingerprint(p) if is_shareable_pattern(p) else None)
+				fingerprint = fingerprints[id(p)][1]
+				if fingerprint is not None:
+					counts[fingerprint] = counts.get(fingerprint, 0) + 1
+
+		# subpattern, that is counted several times only inside of a single shared
+		# node, is not shared, so nodes without several references are dropped until none left
+		shared = {fingerprint for fingerprint, count in counts.items() if count > 1}
+		while True:
+			self.__build(patterns, shared, fingerprints)
+			unused = {f for f, node in self.nodes.items() if node.references < 2}
+			if not unused:
+				break
+			shared -= unused
+
+	def __build(self, patterns: dict[str, BasePat], shared: set[str], fingerprints: dict):
+		self.nodes = {}
+		self.patterns = {name: self.__share(pattern, shared, fingerprints) for name, pattern in patterns.items()}
+
+	def __share(self, pat: BasePat, shared: set[str], fingerprints: dict) -> BasePat:
+		fingerprint = fingerprints[id(pat)][1]
+		if fingerprint in shared:
+			node = self.nodes.get(fingerprint)
+			if node is None:
+				node = self.nodes[fingerprint] = SharedPat(self.__share_children(pat, shared, fingerprints), fingerprint)
+			node.references += 1
+			return node
+		return self.__share_children(pat, shared, fingerprints)
+
+	def __share_children(self, pat: BasePat, shared: set[str], fingerprints: dict) -> BasePat:
+		if not is_builtin_pattern(pat):
+			return pat
+
+		changes = {}
+		for name, value in vars(pat).items():
+			if isinstance(value, BasePat):
+				new_value = self.__share(value, shared, fingerprints)
+				if new_value is not value:
+					changes[name] = new_value
+
+			elif isinstance(value, (tuple, list)):
+				new_values = [self.__share(v, shared, fingerprints) if isinstance(v, BasePat) else v for v in value]
+				if any(n is not v for n, v in zip(new_values, value)):
+					changes[name] = type(value)(new_values)
+
+		if changes:
+			pat = copy.copy(pat)
+			vars(pat).update(changes)
+		return pat
+
+	def compile(self):
+		"""Make checkers of shared nodes, compiled if it is enabled in runtime settings."""
+		for node in self.nodes.values():
+			node.checker = get_pattern_checker(node.pat)
+
+	def get_checker(self, name: str):
+		return get_pattern_checker(self.patterns[name])
+
+	def reset_results(self):
+		"""Forget results of checks, e.g. when tree is modified or new tree is matched."""
+		for node in self.nodes.values():
+			if node.results:
+				node.results.clear()
+
+	def get_checks_saved(self) -> int:
+		"""Amount of shared nodes checks, that were not done thanks to remembered results."""
+		return sum(node.hits for node in self.nodes.values())
+
+	def get_pattern_checks_saved(self) -> int:
+		"""Upper bound of saved checks of patterns nodes, every saved shared node
+		check would have checked all its subpatterns at most."""
+		return sum(node.hits * node.size for node in self.nodes.values())
+
+	def reset_stats(self):
+		for node in self.nodes.values():
+			node.evaluations = 0
+			node.hits = 0
+
+
+def make_schemes_network(schemes: dict) -> tuple[PatternNetwork, dict]:
+	"""Make network of patterns of schemes, that do not override on_new_item.
+	Patterns are optimized beforehand, if it is enabled in runtime settings.
+
+	:param schemes: scheme name -> scheme
+	:return: network and scheme name -> checker of scheme's pattern
+	"""
+	patterns = {}
+	for name, scheme in schemes.items():
+		if type(scheme).on_new_item is not Scheme.on_new_item:
+			continue
+
+		pattern = getattr(scheme, "pattern", None)
+		if not isinstance(pattern, BasePat):
+			continue
+
+		if runtime_settings.OPTIMIZE_PATTERNS:
+			pattern = optimize_pattern(pattern)
+		patterns[name] = pattern
+
+	network = PatternNetwork(patterns)
+	network.compile()
+	checkers = {name: network.get_checker(name) for name in network.patterns}
+	return network, checkers
+
+def print_network_report(network: PatternNetwork):
+	"""Print shared subpatterns sorted by amount of saved checks."""
+	print("%-60s %5s %5s %10s %10s" % ("shared subpattern", "refs", "size", "checks", "saved"))
+	for node in sorted(network.nodes.values(), key=lambda n: n.hits * n.size, reverse=True):
+		description = node.fingerprint.replace("herast.tree.patterns.", "")
+		if len(description) > 60:
+			description = description[:57] + "..."
+		print("%-60s %5d %5d %10d %10d" % (description, node.references, node.size, node.evaluations, node.hits))
+	print("shared nodes: %d, checks saved: %d, patterns nodes checks saved: at most %d" % (
+		len(network.nodes), network.get_checks_saved(), network.get_pattern_checks_saved()))
@@ -0,0 +1,77 @@
+"""Rewriting of patterns into equivalent ones, that are faster to check.
+Optimized pattern is a copy, only changed nodes and their ancestors are copied.
+
+Passes:
+	- OrPat alternatives of plain ObjPat are fused into single MultiObjectPat,
+	  that looks objects up in sets of addresses and names
+"""
+
+from __future__ import annotations
+import copy
+import idaapi
+
+from herast.tree.patterns.base_pattern import BasePat
+from herast.tree.patterns.abstracts import OrPat
+from herast.tree.patterns.expressions import ObjPat
+from herast.tree.patterns.helpers import MultiObjectPat
+from herast.tree.pattern_analysis import is_builtin_pattern
+
+
+def is_plain_object_pattern(pat: BasePat) -> bool:
+	"""Whether pattern is ObjPat without any additional checks."""
+	return type(pat) is ObjPat and not pat.debug and pat.label_num is None and pat.check_op == idaapi.cot_obj
+
+def fuse_objects_alternatives(pat: OrPat) -> OrPat|None:
+	"""Fuse plain ObjPat alternatives into MultiObjectPat at place of the first one.
+	Alternatives are grouped by casts skipping, OrPat itself is kept, since it
+	skips casts too.
+
+	:return: new pattern or None if there is nothing to fuse
+	"""
+	groups : dict[bool, list[int]] = {}
+	for i, p in enumerate(pat.pats):
+		if is_plain_object_pattern(p):
+			groups.setdefault(p.skip_casts, []).append(i)
+
+	groups = {skip_casts: idxs for skip_casts, idxs in groups.items() if len(idxs) > 1}
+	if not groups:
+		return None
+
+	pats = []
+	for i, p in enumerate(pat.pats):
+		idxs = groups.get(getattr(p, "skip_casts", None)) if is_plain_object_pattern(p) else None
+		if idxs is None:
+			pats.append(p)
+		elif idxs[0] == i:
+			pats.append(MultiObjectPat(*[pat.pats[j] for j in idxs], skip_casts=p.skip_casts))
+
+	fused = copy.copy(pat)
+	fused.pats = tuple(pats)
+	return fused
+
+def optimize_pattern(pat: BasePat) -> BasePat:
+	"""Get optimized equivalent of pattern. User defined patterns are not changed."""
+	if not is_builtin_pattern(pat):
+		return pat
+
+	changes = {}
+	for name, value in vars(pat).items():
+		if isinstance(value, BasePat):
+			new_value = optimize_pattern(value)
+			if new_value is not value:
+				changes[name] = new_value
+
+		elif isinstance(value, (tuple, list)):
+			new_values = [optimize_pattern(v) if isinstance(v, BasePat) else v for v in value]
+			if any(n is not v for n, v in zip(new_values, value)):
+				changes[name] = type(value)(new_values)
+
+	if changes:
+		pat = copy.copy(pat)
+		vars(pat).update(changes)
+
+	if type(pat) is OrPat:
+		fused = fuse_objects_alternatives(pat)
+		if fused is not None:
+			pat = fused
+	return pat
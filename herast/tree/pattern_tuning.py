@@ -0,0 +1,210 @@
+"""Selectivity statistics of pattern nodes and reordering of commutative checks.
+
+Statistics mode checks pattern against every item of given functions and
+records how many times every pattern node was checked, how many checks passed
+and how much time they took. Using these statistics children of AndPat, OrPat
+and symmetric binary operations patterns are reordered, so cheap checks, that
+decide result most often, are done first.
+
+Reorderings are stored in a tuned plan, that is keyed by paths of pattern
+nodes (e.g. "pats.1.first_operand") and is saved as JSON, so it can be applied
+to the same pattern later without collecting statistics again. Only nodes,
+whose children do not bind or remove anything, are reordered, so tuned pattern
+matches exactly the same items with the same bindings.
+"""
+
+from __future__ import annotations
+import copy
+import json
+import time
+
+from herast.tree.processing import TreeProcessor
+from herast.tree.pattern_context import PatternContext
+from herast.tree.patterns.base_pattern import BasePat
+from herast.tree.patterns.abstracts import AndPat, OrPat
+from herast.tree.patterns.expressions import AbstractBinaryOpPat
+from herast.tree.pattern_analysis import iterate_subpatterns_with_paths, get_subpattern, get_pattern_fingerprint, is_side_effect_free
+
+
+PLAN_VERSION = 1
+
+
+class NodeStats:
+	"""Checks statistics of a single pattern node. Time includes checks of subpatterns."""
+	def __init__(self, calls=0, passes=0, time=0.0):
+		self.calls = calls
+		self.passes = passes
+		self.time = time
+
+	def get_cost(self) -> float:
+		"""Average time of a single check."""
+		return self.time / self.calls if self.calls else 0.0
+
+	def get_pass_rate(self) -> float:
+		return self.passes / self.calls if self.calls else 0.0
+
+	def to_dict(self) -> dict:
+		return {"calls": self.calls, "passes": self.passes, "time": self.time}
+
+	@classmethod
+	def from_dict(cls, d: dict) -> NodeStats:
+		return cls(d["calls"], d["passes"], d["time"])
+
+
+def __instrument(pat: BasePat, stats: NodeStats):
+	# instance attribute shadows class's check, so parent patterns call wrapper
+	original_check = pat.check
+	def check(item, ctx):
+		start = time.perf_counter()
+		result = original_check(item, ctx)
+		stats.time += time.perf_counter() - start
+		stats.calls += 1
+		if result:
+			stats.passes += 1
+		return result
+	pat.check = check
+
+def collect_pattern_statistics(pattern: BasePat, cfuncs, stats: dict[str, NodeStats]|None = None) -> dict[str, NodeStats]:
+	"""Check pattern against every item of functions and collect statistics
+	of its nodes. Pattern is checked directly, so schemes callbacks are not called.
+
+	:param pattern: pattern to collect statistics of
+	:param cfuncs: decompiled functions, e.g. from CorpusReader.iterate_functions
+	:param stats: statistics to add new ones to
+	:return: path of pattern node -> statistics of its checks
+	"""
+	if stats is None:
+		stats = {}
+
+	# node, that occurs several times in pattern, is accounted under its first path
+	instrumented = {}
+	for path, pat in iterate_subpatterns_with_paths(pattern):
+		if id(pat) in instrumented:
+			continue
+		node_stats = stats.get(path)
+		if node_stats is None:
+			node_stats = stats[path] = NodeStats()
+		__instrument(pat, node_stats)
+		instrumented[id(pat)] = pat
+
+	try:
+		for cfunc in cfuncs:
+			tree_proc = TreeProcessor(cfunc)
+			ctx = PatternContext(tree_proc)
+			for item in tree_proc.iterate_subitems(cfunc.body):
+				pattern.check(item, ctx)
+				ctx.cleanup()
+	finally:
+		for pat in instrumented.values():
+			del pat.check
+	return stats
+
+
+def __get_and_rank(node_stats: NodeStats|None, min_calls: int) -> float:
+	# expected cost of deciding and's result with this check
+	if node_stats is None or node_stats.calls < min_calls:
+		return float("inf")
+	return node_stats.get_cost() / max(1.0 - node_stats.get_pass_rate(), 1e-6)
+
+def __get_or_rank(node_stats: NodeStats|None, min_calls: int) -> float:
+	if node_stats is None or node_stats.calls < min_calls:
+		return float("inf")
+	return node_stats.get_cost() / max(node_stats.get_pass_rate(), 1e-6)
+
+def __get_child_stats(stats, paths, child):
+	return stats.get(paths.get(id(child)))
+
+def make_tuned_plan(pattern: BasePat, stats: dict[str, NodeStats], min_calls=16) -> dict:
+	"""Make plan of reordering pattern's commutative nodes from statistics.
+
+	:param min_calls: children checked fewer times are considered unknown and are not moved forward
+	"""
+	paths = {}
+	for path, pat in iterate_subpatterns_with_paths(pattern):
+		paths.setdefault(id(pat), path)
+
+	reorders = {}
+	swaps = []
+	for path, pat in iterate_subpatterns_with_paths(pattern):
+		if paths[id(pat)] != path:
+			continue
+
+		if isinstance(pat, (AndPat, OrPat)):
+			if len(pat.pats) < 2 or not all(is_side_effect_free(p) for p in pat.pats):
+				continue
+			get_rank = __get_and_rank if isinstance(pat, AndPat) else __get_or_rank
+			ranks = [get_rank(__get_child_stats(stats, paths, p), min_calls) for p in pat.pats]
+			# sort is stable, so unknown children keep their order
+			order = sorted(range(len(pat.pats)), key=lambda i: ranks[i])
+			if order != list(range(len(pat.pats))):
+				reorders[path] = order
+
+		elif isinstance(pat, AbstractBinaryOpPat) and pat.symmetric:
+			if not is_side_effect_free(pat.first_operand) or not is_side_effect_free(pat.second_operand):
+				continue
+			# both directions are always checked, swapping operands changes
+			# which of them is checked first in each direction
+			first_rank = __get_and_rank(__get_child_stats(stats, paths, pat.first_operand), min_calls)
+			second_rank = __get_and_rank(__get_child_stats(stats, paths, pat.second_operand), min_calls)
+			if second_rank < first_rank:
+				swaps.append(path)
+
+	return {
+		"version": PLAN_VERSION,
+		"fingerprint": get_pattern_fingerprint(pattern),
+		"reorders": reorders,
+		"swaps": swaps,
+		"stats": {path: s.to_dict() for path, s in stats.items()},
+	}
+
+def apply_tuned_plan(pattern: BasePat, plan: dict) -> BasePat:
+	"""Get copy of pattern with reordered nodes. Original pattern is returned,
+	if plan was made for another pattern."""
+	if plan.get("version") != PLAN_VERSION or plan.get("fingerprint") != get_pattern_fingerprint(pattern):
+		print("[!] Tuned plan does not match pattern, pattern is not changed")
+		return pattern
+
+	tuned = copy.deepcopy(pattern)
+	# nodes are resolved before changing, since reordering changes paths of descendants
+	reorders = [(get_subpattern(tuned, path), order) for path, order in plan["reorders"].items()]
+	swaps = [get_subpattern(tuned, path) for path in plan["swaps"]]
+
+	for pat, order in reorders:
+		if not isinstance(pat, (AndPat, OrPat)) or sorted(order) != list(range(len(pat.pats))):
+			continue
+		if not all(is_side_effect_free(p) for p in pat.pats):
+			continue
+		pat.pats = tuple(pat.pats[i] for i in order)
+
+	for pat in swaps:
+		if not isinstance(pat, AbstractBinaryOpPat) or not pat.symmetric:
+			continue
+		if not is_side_effect_free(pat.first_operand) or not is_side_effect_free(pat.second_operand):
+			continue
+		pat.first_operand, pat.second_operand = pat.second_operand, pat.first_operand
+	return tuned
+
+def tune_pattern(pattern: BasePat, cfuncs, min_calls=16) -> tuple[BasePat, dict]:
+	"""Collect statistics of pattern over functions and reorder it.
+
+	:return: tuned copy of pattern and its plan
+	"""
+	stats = collect_pattern_statistics(pattern, cfuncs)
+	plan = make_tuned_plan(pattern, stats, min_calls)
+	return apply_tuned_plan(pattern, plan), plan
+
+def tune_scheme(scheme, plan: dict):
+	"""Replace scheme's pattern with tuned one."""
+	scheme.pattern = apply_tuned_plan(scheme.pattern, plan)
+
+def save_tuned_plan(plan: dict, path: str):
+	with open(path, "w") as f:
+		json.dump(plan, f, indent=1)
+
+def load_tuned_plan(path: str) -> dict|None:
+	try:
+		with open(path) as f:
+			return json.load(f)
+	except (OSError, ValueError) as e:
+		print("[!] Failed to load tuned plan", path, e)
+		return None
@@ -78,7 +78,7 @@ class BindItemPat(BasePat):
 				ctx.save_expr(self.name, item)
 				return True
 			else:
-				return item.equal_effect(current_expr)
+				return ctx.is_equal_effect(item, current_expr)
 		return False
 
 
@@ -101,6 +101,21 @@ class VarBindPat(BasePat):
 			return True
 
 
+class SubtreeFilterCache:
+	"""Filter of subtrees, where pattern might match, made for a specific pattern object.
+	Representation is constant, so cache does not change fingerprints of patterns."""
+	def __init__(self, pat=None):
+		self.pat = pat
+		self.subtree_filter = None
+		if pat is not None:
+			# imported here, since analysis depends on patterns
+			from herast.tree.pattern_analysis import make_subtree_filter
+			self.subtree_filter = make_subtree_filter(pat)
+
+	def __repr__(self):
+		return "SubtreeFilterCache()"
+
+
 class DeepExprPat(BasePat):
 	"""Find pattern somewhere inside an item and save it in context if 
 	bind_name is provided."""
@@ -108,10 +123,18 @@ class DeepExprPat(BasePat):
 		super().__init__(**kwargs)
 		self.pat = pat
 		self.bind_name = bind_name
+		self.filter_cache = SubtreeFilterCache()
+
+	def get_subtree_filter(self):
+		"""Get function of subtree summary -> bool for pat, it is made again if pat is replaced."""
+		if self.filter_cache.pat is not self.pat:
+			self.filter_cache = SubtreeFilterCache(self.pat)
+		return self.filter_cache.subtree_filter
 
 	@BasePat.parent_check
 	def check(self, expr, ctx: PatternContext) -> bool:
-		for item in ctx.tree_proc.iterate_subitems(expr):
+		subtree_filter = self.get_subtree_filter()
+		for item in ctx.tree_proc.iterate_subitems_filtered(expr, subtree_filter):
 			if not self.pat.check(item, ctx):
 				continue
 			if self.bind_name is not None:
@@ -3,6 +3,7 @@ import idaapi
 
 from herast.tree.patterns.base_pattern import BasePat
 from herast.tree.pattern_context import PatternContext
+from herast.tree.symbols import is_object_named
 
 
 class ExpressionPat(BasePat):
@@ -159,12 +160,7 @@ class ObjPat(ExpressionPat):
 		if self.name is None:
 			return False
 
-		ea_name = idaapi.get_name(expression.obj_ea)
-		if self.name == ea_name:
-			return True
-
-		demangled_ea_name = idaapi.demangle_name(ea_name, idaapi.MNG_NODEFINIT | idaapi.MNG_NORETTYPE)
-		return demangled_ea_name == self.name
+		return is_object_named(expression.obj_ea, self.name)
 
 
 class RefPat(ExpressionPat):
@@ -2,6 +2,7 @@ import idaapi
 
 from herast.tree.patterns.base_pattern import BasePat
 from herast.tree.pattern_context import PatternContext
+from herast.tree.symbols import is_object_named_any
 from herast.tree.patterns.expressions import ObjPat, AsgPat, CallPat
 from herast.tree.patterns.instructions import ExprInsPat
 
@@ -32,8 +33,8 @@ class SeqPat(BasePat):
 		if parent is None:
 			return False
 
-		container = parent.cinsn.cblock
-		start_from = container.index(instruction)
+		container = ctx.tree_proc.get_block_instrs(parent)
+		start_from = ctx.tree_proc.get_instr_position(instruction)
 		if start_from + self.length > len(container):
 			return False
 
@@ -52,18 +53,25 @@ class SeqPat(BasePat):
 class MultiObjectPat(BasePat):
 	"""Pattern for expression, that is allowed to be one of multiple objects"""
 	def __init__(self, *objects, **kwargs):
+		"""
+		:param objects: addresses, names or ObjPat patterns of objects
+		"""
 		super().__init__(**kwargs)
-		self.objects = [ObjPat(o) for o in objects]
+		self.objects = [o if isinstance(o, ObjPat) else ObjPat(o) for o in objects]
+		# objects are looked up by address first, then by name or demangled name
+		self.eas = frozenset(o.ea for o in self.objects if o.ea is not None)
+		self.names = frozenset(o.name for o in self.objects if o.name is not None)
+		self.any_object = any(o.ea is None and o.name is None for o in self.objects)
 
 	@BasePat.parent_check
 	def check(self, item, ctx: PatternContext) -> bool:
 		if item.op != idaapi.cot_obj:
 			return False
 
-		for o in self.objects:
-			if o.check(item, ctx):
-				return True
-		return False
+		if self.any_object or item.obj_ea in self.eas:
+			return True
+
+		return len(self.names) != 0 and is_object_named_any(item.obj_ea, self.names)
 
 
 class IntPat(BasePat):
@@ -0,0 +1,92 @@
+"""Function level prefilter of schemes.
+
+Pattern can match only in a function, that contains certain features: items
+with some ops, used objects (by address or name), helpers and numbers. These
+requirements are derived from patterns conservatively as a conjunction of
+clauses, every clause is a set of features, at least one of which must be
+present in function. Function summary is a set of features of its tree, so
+schemes with unsatisfied requirements are skipped without checking tree items.
+
+Features are tuples of (kind, value), kinds are "op", "obj", "name", "helper",
+"num", "member" (offset of accessed structure member) and "callee" (address of
+called object).
+"""
+
+from __future__ import annotations
+import idaapi
+import idautils
+
+from herast.tree.processing import get_children
+from herast.tree.scheme import Scheme
+from herast.tree.symbols import get_symbol_cache
+from herast.tree.patterns.base_pattern import BasePat
+from herast.tree.pattern_analysis import get_required_features, get_objects_clauses, is_satisfied
+
+
+def get_scheme_required_features(scheme: Scheme) -> list[frozenset]|None:
+	"""Get required features of scheme's pattern. None means scheme might
+	do something in any function, e.g. it has custom matching or iteration callbacks."""
+	scheme_type = type(scheme)
+	if scheme_type.on_new_item is not Scheme.on_new_item or \
+			scheme_type.on_tree_iteration_start is not Scheme.on_tree_iteration_start or \
+			scheme_type.on_tree_iteration_end is not Scheme.on_tree_iteration_end:
+		return None
+
+	pattern = getattr(scheme, "pattern", None)
+	if not isinstance(pattern, BasePat):
+		return None
+	return get_required_features(pattern)
+
+def get_object_names(ea) -> list[str]:
+	"""Get names, that object patterns compare with: name and demangled name."""
+	symbol_cache = get_symbol_cache()
+	name = symbol_cache.get_name(ea)
+	if not name:
+		return []
+
+	demangled = symbol_cache.get_demangled_name(ea)
+	if demangled and demangled != name:
+		return [name, demangled]
+	return [name]
+
+def get_tree_features(root, with_names=True) -> set:
+	"""Get summary of features of tree items.
+
+	:param with_names: add names of objects, they are skipped for persistent summaries, since objects might be renamed
+	"""
+	features = set()
+	objects = set()
+	unprocessed = [root]
+	while unprocessed:
+		item = unprocessed.pop()
+		op = item.op
+		features.add(("op", op))
+		if op == idaapi.cot_obj:
+			objects.add(item.obj_ea)
+		elif op == idaapi.cot_num:
+			features.add(("num", item.n._value))
+		elif op == idaapi.cot_helper:
+			features.add(("helper", item.helper))
+		elif op == idaapi.cot_memref or op == idaapi.cot_memptr:
+			features.add(("member", item.m))
+		elif op == idaapi.cot_call:
+			callee = item.x
+			while callee.op == idaapi.cot_cast:
+				callee = callee.x
+			if callee.op == idaapi.cot_obj:
+				features.add(("callee", callee.obj_ea))
+		unprocessed += get_children(item)
+
+	for ea in objects:
+		features.add(("obj", ea))
+		if with_names:
+			features.update(("name", name) for name in get_object_names(ea))
+	return features
+
+def get_names_eas() -> dict[str, set[int]]:
+	"""Get addresses of all names in database, both names and demangled names are keys."""
+	names_eas = {}
+	for ea, _ in idautils.Names():
+		for name in get_object_names(ea):
+			names_eas.setdefault(name, set()).add(ea)
+	return names_eas
@@ -1,52 +1,336 @@
-from __future__ import print_function
+from __future__ import print_function, annotations
 import idaapi
+from collections import deque
 
 import herast.tree.utils as utils
 from herast.tree.consts import binary_expressions_ops, unary_expressions_ops
-
-
-# handler, that maps item_op to children_items_getter
-op2func = {}
-op2func.update({
-	idaapi.cit_expr:     lambda x: [x.cexpr],
-	idaapi.cit_return:   lambda x: [x.creturn.expr],
-	idaapi.cit_block:    lambda x: [i for i in x.cblock],
-	idaapi.cit_if:       lambda x: [x.cif.ithen, x.cif.ielse, x.cif.expr],
-	idaapi.cit_switch:   lambda x: [i for i in x.cswitch.cases] + [x.cswitch.expr],
-	idaapi.cit_while:    lambda x: [x.cwhile.body, x.cwhile.expr],
-	idaapi.cit_do:       lambda x: [x.cdo.body, x.cdo.expr],
-	idaapi.cit_for:      lambda x: [x.cfor.body, x.cfor.init, x.cfor.expr, x.cfor.init],
-	idaapi.cot_call:     lambda x: [i for i in x.a] + [x.x],
-})
+from herast.tree.symbols import get_symbol_cache
+
+
+# traversal orders
+BFS_ORDER = 0
+DFS_ORDER = 1
+
+
+def __push_block(item, push):
+	for i in item.cblock:
+		push(i)
+
+def __push_expr_insn(item, push):
+	push(item.cexpr)
+
+def __push_return(item, push):
+	expr = item.creturn.expr
+	if expr is not None:
+		push(expr)
+
+def __push_if(item, push):
+	cif = item.cif
+	ithen, ielse, expr = cif.ithen, cif.ielse, cif.expr
+	if ithen is not None:
+		push(ithen)
+	if ielse is not None:
+		push(ielse)
+	if expr is not None:
+		push(expr)
+
+def __push_if_branches(item, push):
+	cif = item.cif
+	ithen, ielse = cif.ithen, cif.ielse
+	if ithen is not None:
+		push(ithen)
+	if ielse is not None:
+		push(ielse)
+
+def __push_switch(item, push):
+	cswitch = item.cswitch
+	for i in cswitch.cases:
+		push(i)
+	expr = cswitch.expr
+	if expr is not None:
+		push(expr)
+
+def __push_switch_cases(item, push):
+	for i in item.cswitch.cases:
+		push(i)
+
+def __push_while(item, push):
+	cwhile = item.cwhile
+	body, expr = cwhile.body, cwhile.expr
+	if body is not None:
+		push(body)
+	if expr is not None:
+		push(expr)
+
+def __push_do(item, push):
+	cdo = item.cdo
+	body, expr = cdo.body, cdo.expr
+	if body is not None:
+		push(body)
+	if expr is not None:
+		push(expr)
+
+def __push_for(item, push):
+	cfor = item.cfor
+	body, init, expr, step = cfor.body, cfor.init, cfor.expr, cfor.step
+	if body is not None:
+		push(body)
+	if init is not None:
+		push(init)
+	if expr is not None:
+		push(expr)
+	if step is not None:
+		push(step)
+
+def __push_while_body(item, push):
+	body = item.cwhile.body
+	if body is not None:
+		push(body)
+
+def __push_do_body(item, push):
+	body = item.cdo.body
+	if body is not None:
+		push(body)
+
+def __push_for_body(item, push):
+	body = item.cfor.body
+	if body is not None:
+		push(body)
+
+def __push_call(item, push):
+	for i in item.a:
+		push(i)
+	x = item.x
+	if x is not None:
+		push(x)
+
+def __push_unary(item, push):
+	x = item.x
+	if x is not None:
+		push(x)
+
+def __push_binary(item, push):
+	x, y = item.x, item.y
+	if x is not None:
+		push(x)
+	if y is not None:
+		push(y)
+
+def __push_ternary(item, push):
+	x, y, z = item.x, item.y, item.z
+	if x is not None:
+		push(x)
+	if y is not None:
+		push(y)
+	if z is not None:
+		push(z)
+
+
+# handler, that maps item_op to function, that pushes item's children in a container
+op2push_children = {
+	idaapi.cit_expr:     __push_expr_insn,
+	idaapi.cit_return:   __push_return,
+	idaapi.cit_block:    __push_block,
+	idaapi.cit_if:       __push_if,
+	idaapi.cit_switch:   __push_switch,
+	idaapi.cit_while:    __push_while,
+	idaapi.cit_do:       __push_do,
+	idaapi.cit_for:      __push_for,
+	idaapi.cot_call:     __push_call,
+	idaapi.cot_tern:     __push_ternary,
+	idaapi.cot_memref:   __push_unary,
+	idaapi.cot_memptr:   __push_unary,
+}
 
 for i in unary_expressions_ops:
-	op2func[i] = lambda x: [x.x]
+	op2push_children[i] = __push_unary
 
 for i in binary_expressions_ops:
-	op2func[i] = lambda x: [x.x, x.y]
+	op2push_children[i] = __push_binary
+
+# same as op2push_children, but pushes only instructions
+op2push_subinstrs = {
+	idaapi.cit_block:    __push_block,
+	idaapi.cit_if:       __push_if_branches,
+	idaapi.cit_switch:   __push_switch_cases,
+	idaapi.cit_while:    __push_while_body,
+	idaapi.cit_do:       __push_do_body,
+	idaapi.cit_for:      __push_for_body,
+}
 
 def get_children(item):
-	handler = op2func.get(item.op, None)
-	if handler is None:
-		return []
-	children = handler(item)
-	return list(filter(None, children))
-
-def iterate_all_subitems(item):
-	unprocessed_items = [item]
-	while len(unprocessed_items) != 0:
-		current_item = unprocessed_items.pop(0)
-		yield current_item
-		unprocessed_items += get_children(current_item)
-
-def iterate_all_subinstrs(instr):
-	unprocessed_items = [instr]
-	while len(unprocessed_items) != 0:
-		current_item = unprocessed_items.pop(0)
-		yield current_item
-		children = get_children(current_item)
-		children = [c for c in children if not c.is_expr()]
-		unprocessed_items += children
+	children = []
+	handler = op2push_children.get(item.op, None)
+	if handler is not None:
+		handler(item, children.append)
+	return children
+
+def get_item_slots(item) -> list:
+	"""Get children of item in order of its slots. Missing children are None."""
+	op = item.op
+	if op == idaapi.cot_call:
+		return [item.x] + [arg for arg in item.a]
+	if op in (idaapi.cot_memref, idaapi.cot_memptr) or op in unary_expressions_ops:
+		return [item.x]
+	if op in binary_expressions_ops:
+		return [item.x, item.y]
+	if op == idaapi.cot_tern:
+		return [item.x, item.y, item.z]
+
+	if op == idaapi.cit_block:
+		return [i for i in item.cblock]
+	if op == idaapi.cit_expr:
+		return [item.cexpr]
+	if op == idaapi.cit_if:
+		return [item.cif.expr, item.cif.ithen, item.cif.ielse]
+	if op == idaapi.cit_for:
+		return [item.cfor.init, item.cfor.expr, item.cfor.step, item.cfor.body]
+	if op == idaapi.cit_while:
+		return [item.cwhile.expr, item.cwhile.body]
+	if op == idaapi.cit_do:
+		return [item.cdo.body, item.cdo.expr]
+	if op == idaapi.cit_return:
+		return [item.creturn.expr]
+	if op == idaapi.cit_switch:
+		return [item.cswitch.expr] + [case for case in item.cswitch.cases]
+	return []
+
+def get_item_leaf(item):
+	"""Get value of item, that is not a child item."""
+	op = item.op
+	if op == idaapi.cot_num:
+		return item.n._value
+	if op == idaapi.cot_obj:
+		return item.obj_ea
+	if op == idaapi.cot_var:
+		return item.v.idx
+	if op == idaapi.cot_helper:
+		return item.helper
+	if op == idaapi.cot_str:
+		return item.string
+	if op in (idaapi.cot_memref, idaapi.cot_memptr):
+		return item.m
+	if op == idaapi.cit_goto:
+		return item.cgoto.label_num
+	if op == idaapi.cit_switch:
+		return [[v for v in case.values] for case in item.cswitch.cases]
+	return None
+
+# operators, whose operands might be swapped without changing effect
+commutative_ops = {
+	idaapi.cot_add, idaapi.cot_mul, idaapi.cot_band, idaapi.cot_bor, idaapi.cot_xor,
+	idaapi.cot_land, idaapi.cot_lor, idaapi.cot_eq, idaapi.cot_ne, idaapi.cot_fadd, idaapi.cot_fmul,
+}
+
+# comparisons -> same comparisons with swapped operands
+mirrored_ops = {
+	idaapi.cot_sgt: idaapi.cot_slt,
+	idaapi.cot_sge: idaapi.cot_sle,
+	idaapi.cot_ugt: idaapi.cot_ult,
+	idaapi.cot_uge: idaapi.cot_ule,
+}
+
+def get_node_hash(item, children_hashes: list[int|None]) -> int:
+	"""Get structural hash of item from hashes of its slots.
+	Casts are skipped and operands of commutative operators are unordered,
+	so items, that are equal by effect, have equal hashes."""
+	children_hashes = [h if h is not None else 0 for h in children_hashes]
+	op = item.op
+	if op == idaapi.cot_cast:
+		return children_hashes[0]
+
+	op = mirrored_ops.get(op, op)
+	if op in commutative_ops or op in mirrored_ops.values():
+		children_hashes = sorted(children_hashes)
+
+	leaf = get_item_leaf(item)
+	if isinstance(leaf, list):
+		leaf = repr(leaf)
+	return hash((op, leaf, tuple(children_hashes)))
+
+
+# subtree summary is int: bits of items ops (1 << op) and bloom filter bits
+# of features (used objects, their names, helpers and numbers) above them
+SUMMARY_OPS_BITS = 128
+SUMMARY_FEATURES_BITS = 64
+
+def get_summary_feature_bit(kind: str, value) -> int:
+	"""Get summary bit of feature, kinds are "obj", "name", "helper" and "num"."""
+	return 1 << (SUMMARY_OPS_BITS + hash((kind, value)) % SUMMARY_FEATURES_BITS)
+
+def get_node_summary(item, children_summaries: list[int|None]) -> int:
+	"""Get summary of item's subtree from summaries of its slots."""
+	op = item.op
+	summary = 1 << op
+	for s in children_summaries:
+		if s is not None:
+			summary |= s
+
+	if op == idaapi.cot_obj:
+		symbol_cache = get_symbol_cache()
+		summary |= get_summary_feature_bit("obj", item.obj_ea)
+		name = symbol_cache.get_name(item.obj_ea)
+		if name:
+			summary |= get_summary_feature_bit("name", name)
+			demangled = symbol_cache.get_demangled_name(item.obj_ea)
+			if demangled:
+				summary |= get_summary_feature_bit("name", demangled)
+	elif op == idaapi.cot_helper:
+		summary |= get_summary_feature_bit("helper", item.helper)
+	elif op == idaapi.cot_num:
+		summary |= get_summary_feature_bit("num", item.n._value)
+	elif op == idaapi.cot_memref or op == idaapi.cot_memptr:
+		summary |= get_summary_feature_bit("member", item.m)
+	return summary
+
+def iterate_tree(root, order=BFS_ORDER, op2push=op2push_children):
+	"""Iterate over items of AST subtree. Tree might be modified during
+	iteration, since item's children are collected after item is yielded.
+
+	:param root: AST item
+	:param order: BFS_ORDER or DFS_ORDER (preorder)
+	:param op2push: mapping of items ops to children pushers
+	"""
+	if order == BFS_ORDER:
+		queue = deque((root,))
+		pop = queue.popleft
+		push = queue.append
+		while queue:
+			item = pop()
+			yield item
+			handler = op2push.get(item.op)
+			if handler is not None:
+				handler(item, push)
+
+	elif order == DFS_ORDER:
+		stack = [root]
+		pop = stack.pop
+		push = stack.append
+		while stack:
+			item = pop()
+			yield item
+			handler = op2push.get(item.op)
+			if handler is None:
+				continue
+
+			# children are pushed in order, reversing them in place
+			# for them to be popped in order
+			start = len(stack)
+			handler(item, push)
+			end = len(stack) - 1
+			while start < end:
+				stack[start], stack[end] = stack[end], stack[start]
+				start += 1
+				end -= 1
+
+	else:
+		raise ValueError("Unknown traversal order %s" % order)
+
+def iterate_all_subitems(item, order=BFS_ORDER):
+	return iterate_tree(item, order, op2push_children)
+
+def iterate_all_subinstrs(instr, order=BFS_ORDER):
+	return iterate_tree(instr, order, op2push_subinstrs)
 
 class TreeModificationContext:
 	def __init__(self, tree_proc, item):
@@ -71,7 +355,7 @@ class TreeModificationContext:
 		if self.next_item is None:
 			parent = self.get_parent()
 			if parent is not None:
-				self.next_item = utils.get_following_instr(parent, self.item)
+				self.next_item = self.tree_proc.get_following_instr(self.item)
 		return self.next_item
 
 	def get_parent(self):
@@ -82,19 +366,295 @@ class TreeModificationContext:
 class TreeProcessor:
 	def __init__(self, cfunc):
 		self.cfunc = cfunc
-
-	def iterate_subitems(self, root_item):
-		yield from iterate_all_subitems(root_item)
-
-	def iterate_subinstrs(self, root_item):
-		yield from iterate_all_subinstrs(root_item)
+		# item obj_id -> parent item, lazily built index of the whole function
+		self.__parents : dict|None = None
+		# instruction obj_id -> position in parent block
+		self.__positions : dict[int, int] = {}
+		# block obj_id -> instructions in block
+		self.__blocks : dict[int, list] = {}
+		# item obj_id -> structural hash and summary of item's subtree
+		self.__hashes : dict[int, int] = {}
+		self.__summaries : dict[int, int] = {}
+		# summaries depend on objects names, so they are dropped on renames
+		self.__summaries_names_state = None
+		# (kind, value) -> items with this feature, lazily built index of the whole function
+		self.__items_index : dict[tuple, list]|None = None
+		# item obj_id -> position of item in BFS order
+		self.__items_order : dict[int, int] = {}
+
+	def __get_bottom_up(self, item, values: dict, get_node_value):
+		"""Get value of item, that is computed from values of its slots.
+		Values of subtree are computed in postorder and cached."""
+		value = values.get(item.obj_id)
+		if value is not None:
+			return value
+
+		unprocessed = [(item, None)]
+		while unprocessed:
+			current, slots = unprocessed.pop()
+			if slots is None:
+				slots = get_item_slots(current)
+				unprocessed.append((current, slots))
+				unprocessed += [(s, None) for s in slots if s is not None and s.obj_id not in values]
+				continue
+
+			children_values = [values[s.obj_id] if s is not None else None for s in slots]
+			values[current.obj_id] = get_node_value(current, children_values)
+		return values[item.obj_id]
+
+	def get_item_hash(self, item) -> int:
+		"""Get structural hash of item's subtree. Hashes are computed bottom-up
+		and cached until tree is modified."""
+		return self.__get_bottom_up(item, self.__hashes, get_node_hash)
+
+	def get_subtree_summary(self, item) -> int:
+		"""Get summary of item's subtree. Summaries are computed bottom-up
+		and cached until tree is modified or objects are renamed."""
+		symbol_cache = get_symbol_cache()
+		names_state = (symbol_cache, symbol_cache.generation)
+		if self.__summaries_names_state != names_state:
+			self.__summaries_names_state = names_state
+			self.__summaries.clear()
+		return self.__get_bottom_up(item, self.__summaries, get_node_summary)
+
+	def iterate_subitems_filtered(self, root_item, subtree_filter):
+		"""Iterate over subitems in BFS order, skipping subtrees, whose summaries
+		are rejected by filter.
+
+		:param subtree_filter: function of subtree summary -> bool, None for no filtering
+		"""
+		if subtree_filter is None:
+			yield from iterate_all_subitems(root_item)
+			return
+
+		# summaries of the whole subtree are computed with root's one
+		self.get_subtree_summary(root_item)
+		summaries = self.__summaries
+		queue = deque((root_item,))
+		while queue:
+			item = queue.popleft()
+			summary = summaries.get(item.obj_id)
+			if summary is None:
+				summary = self.get_subtree_summary(item)
+			if not subtree_filter(summary):
+				continue
+
+			yield item
+			handler = op2push_children.get(item.op)
+			if handler is not None:
+				handler(item, queue.append)
+
+	def iterate_subitems(self, root_item, order=BFS_ORDER):
+		return iterate_all_subitems(root_item, order)
+
+	def iterate_subinstrs(self, root_item, order=BFS_ORDER):
+		return iterate_all_subinstrs(root_item, order)
+
+	def invalidate_caches(self):
+		"""Drop everything collected about the tree. Should be called after
+		tree is modified not via remove_item/replace_item."""
+		self.__parents = None
+		self.__positions.clear()
+		self.__blocks.clear()
+		self.__drop_subtrees_caches()
+
+	def __drop_subtrees_caches(self):
+		self.__hashes.clear()
+		self.__summaries.clear()
+		self.__items_index = None
+
+	def __get_items_index(self) -> dict[tuple, list]:
+		if self.__items_index is not None:
+			return self.__items_index
+
+		index = {}
+		order = {}
+		for item in iterate_all_subitems(self.cfunc.body):
+			order[item.obj_id] = len(order)
+			op = item.op
+			index.setdefault(("op", op), []).append(item)
+			if op == idaapi.cot_obj:
+				index.setdefault(("obj", item.obj_ea), []).append(item)
+			elif op == idaapi.cot_helper:
+				index.setdefault(("helper", item.helper), []).append(item)
+			elif op == idaapi.cot_num:
+				index.setdefault(("num", item.n._value), []).append(item)
+			elif op == idaapi.cot_var:
+				index.setdefault(("lvar", item.v.idx), []).append(item)
+			elif op == idaapi.cot_call:
+				callee = item.x
+				while callee.op == idaapi.cot_cast:
+					callee = callee.x
+				if callee.op == idaapi.cot_obj:
+					index.setdefault(("callee", callee.obj_ea), []).append(item)
+				elif callee.op == idaapi.cot_helper:
+					index.setdefault(("callee_helper", callee.helper), []).append(item)
+
+		self.__items_index = index
+		self.__items_order = order
+		return index
+
+	def get_items_by_feature(self, kind: str, value) -> list:
+		"""Get items of function with feature, kinds are "op", "obj" (object's address),
+		"helper", "num", "lvar" (variable's index), "callee" and "callee_helper" (called
+		object's address and helper's name of calls). Index of the whole function is built
+		on first call and kept until tree is modified."""
+		return self.__get_items_index().get((kind, value), [])
+
+	def get_features_values(self, kind: str) -> list:
+		"""Get values of features of kind, that are present in function."""
+		return [value for k, value in self.__get_items_index() if k == kind]
+
+	def get_items_count(self) -> int:
+		"""Get amount of items in function's tree."""
+		self.__get_items_index()
+		return len(self.__items_order)
+
+	def sort_items(self, items) -> list:
+		"""Sort items of function's tree in BFS order."""
+		self.__get_items_index()
+		return sorted(items, key=lambda item: self.__items_order[item.obj_id])
+
+	def find(self, op=None, obj_ea=None, name=None, helper=None, num=None, lvar=None) -> list:
+		"""Get items of function with all given properties in BFS order without
+		traversing the tree. Calls have properties of called object or helper, e.g.
+		find(op=idaapi.cot_call, name="memcpy") gets all calls of memcpy.
+
+		:param op: item's op
+		:param obj_ea: object's address
+		:param name: object's name or demangled name
+		:param helper: helper's name
+		:param num: value of number
+		:param lvar: index of local variable
+		"""
+		index = self.__get_items_index()
+		objects_kind, helpers_kind = ("callee", "callee_helper") if op == idaapi.cot_call else ("obj", "helper")
+		lists = []
+		if obj_ea is not None:
+			lists.append(index.get((objects_kind, obj_ea), []))
+
+		if name is not None:
+			symbol_cache = get_symbol_cache()
+			eas = [ea for ea in self.get_features_values("obj") if symbol_cache.is_named(ea, name)]
+			named = [item for ea in eas for item in index.get((objects_kind, ea), [])]
+			lists.append(self.sort_items(named) if len(eas) > 1 else named)
+
+		if helper is not None:
+			lists.append(index.get((helpers_kind, helper), []))
+		if num is not None:
+			lists.append(index.get(("num", num), []))
+		if lvar is not None:
+			lists.append(index.get(("lvar", lvar), []))
+
+		if not lists:
+			if op is None:
+				return list(iterate_all_subitems(self.cfunc.body))
+			return list(index.get(("op", op), []))
+
+		# the shortest list is filtered by the rest
+		lists.sort(key=len)
+		items = [item for item in lists[0] if op is None or item.op == op]
+		for other in lists[1:]:
+			if not items:
+				break
+			ids = {item.obj_id for item in other}
+			items = [item for item in items if item.obj_id in ids]
+		return items
+
+	def __get_parents(self):
+		if self.__parents is None:
+			self.__parents = {}
+			self.__index_subtree(self.cfunc.body)
+		return self.__parents
+
+	def __index_subtree(self, root_item):
+		for item in iterate_all_subitems(root_item):
+			children = get_children(item)
+			item_id = item.obj_id
+			for c in children:
+				self.__parents[c.obj_id] = item
+
+			if item.op == idaapi.cit_block:
+				self.__blocks[item_id] = children
+				for i, c in enumerate(children):
+					self.__positions[c.obj_id] = i
+
+	def __unindex_subtree(self, root_item, keep_root=False):
+		for item in iterate_all_subitems(root_item):
+			item_id = item.obj_id
+			if keep_root and item_id == root_item.obj_id:
+				continue
+			self.__parents.pop(item_id, None)
+			self.__positions.pop(item_id, None)
+			self.__blocks.pop(item_id, None)
+
+	def __unindex_removed_instr(self, item, subtree_ids):
+		parent = self.__parents.get(item.obj_id)
+		position = self.__positions.get(item.obj_id)
+		for item_id in subtree_ids:
+			self.__parents.pop(item_id, None)
+			self.__positions.pop(item_id, None)
+			self.__blocks.pop(item_id, None)
+
+		if parent is None or position is None:
+			return
+
+		instrs = self.__blocks.get(parent.obj_id)
+		if instrs is None:
+			return
+		del instrs[position]
+		for i in range(position, len(instrs)):
+			self.__positions[instrs[i].obj_id] = i
+
+	def get_parent(self, item):
+		"""Get parent of item in function's tree."""
+		parents = self.__get_parents()
+		parent = parents.get(item.obj_id)
+		if parent is not None:
+			return parent
+
+		if item.obj_id == self.cfunc.body.obj_id:
+			return None
+		return self.cfunc.body.find_parent_of(item)
 
 	def get_parent_block(self, item):
-		parent = self.cfunc.body.find_parent_of(item)
+		parent = self.get_parent(item)
 		if parent is None or parent.op != idaapi.cit_block:
 			return None
 		return parent
 
+	def get_block_instrs(self, block) -> list:
+		"""Get instructions of block item."""
+		self.__get_parents()
+		instrs = self.__blocks.get(block.obj_id)
+		if instrs is None:
+			instrs = [i for i in block.cinsn.cblock]
+		return instrs
+
+	def get_instr_position(self, item) -> int|None:
+		"""Get position of instruction in its parent block."""
+		self.__get_parents()
+		position = self.__positions.get(item.obj_id)
+		if position is not None:
+			return position
+
+		parent = self.get_parent_block(item)
+		if parent is None:
+			return None
+		return parent.cinsn.cblock.index(item)
+
+	def get_following_instr(self, item):
+		"""Get instruction following item in its parent block."""
+		parent = self.get_parent_block(item)
+		position = self.get_instr_position(item)
+		if parent is None or position is None:
+			return None
+
+		instrs = self.get_block_instrs(parent)
+		if position + 1 >= len(instrs):
+			return None
+		return instrs[position + 1]
+
 	def collect_gotos(self, haystack):
 		gotos = []
 		for potential_goto in iterate_all_subinstrs(haystack):
@@ -143,14 +703,22 @@ class TreeProcessor:
 
 		parent = tmc.get_parent()
 		saved_lbl = item.label_num
+		# label moves to the following instruction, it is found while item is still indexed
+		next_item = tmc.get_next_item() if saved_lbl != -1 else None
 		item.label_num = -1
+		# removed item gets deleted, so its subtree is collected beforehand
+		if self.__parents is not None:
+			subtree_ids = [i.obj_id for i in iterate_all_subitems(item)]
 		rv = utils.remove_instruction_from_ast(item, parent.cinsn)
 		if not rv:
 			item.label_num = saved_lbl
 			print("[*] Failed to remove item from tree")
 			return False
 
-		next_item = tmc.get_next_item()
+		if self.__parents is not None:
+			self.__unindex_removed_instr(item, subtree_ids)
+		self.__drop_subtrees_caches()
+
 		if next_item is not None:
 			next_item.label_num = saved_lbl
 		return True
@@ -187,7 +755,18 @@ class TreeProcessor:
 
 		try:
 			idaapi.qswap(item, new_item)
-			return True
 		except Exception as e:
 			print("[!] Got an exception during ctree instr replacing", e)
-			return False
\ No newline at end of file
+			return False
+
+		self.__drop_subtrees_caches()
+
+		if self.__parents is not None:
+			# item keeps its place in tree, but gets new children
+			if new_item.obj_id in self.__parents:
+				self.invalidate_caches()
+			else:
+				self.__unindex_subtree(new_item, keep_root=True)
+				self.__blocks.pop(item.obj_id, None)
+				self.__index_subtree(item)
+		return True
\ No newline at end of file
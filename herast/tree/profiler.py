@@ -0,0 +1,147 @@
+"""Profiler of schemes matching. Disabled by default, when disabled
+matcher only checks enabled flag once per scheme check."""
+
+from __future__ import annotations
+import random
+
+
+class TimeStats:
+	"""Durations of calls. Percentiles are calculated on a random sample of durations."""
+	max_samples = 4096
+
+	def __init__(self):
+		self.count = 0
+		self.total = 0.0
+		self.max = 0.0
+		self.samples : list[float] = []
+
+	def add(self, duration: float):
+		self.count += 1
+		self.total += duration
+		if duration > self.max:
+			self.max = duration
+
+		if len(self.samples) < self.max_samples:
+			self.samples.append(duration)
+		else:
+			# reservoir sampling keeps every duration with equal probability
+			idx = random.randrange(self.count)
+			if idx < self.max_samples:
+				self.samples[idx] = duration
+
+	def merge(self, other: TimeStats):
+		self.count += other.count
+		self.total += other.total
+		self.max = max(self.max, other.max)
+		self.samples = (self.samples + other.samples)[:self.max_samples]
+
+	def percentile(self, p: float) -> float:
+		"""Get approximate percentile of durations.
+
+		:param p: percentile in range [0, 100]
+		"""
+		if not self.samples:
+			return 0.0
+		samples = sorted(self.samples)
+		idx = min(len(samples) - 1, int(len(samples) * p / 100))
+		return samples[idx]
+
+	def to_dict(self) -> dict:
+		return {
+			"count": self.count,
+			"total": self.total,
+			"max": self.max,
+			"p50": self.percentile(50),
+			"p90": self.percentile(90),
+			"p99": self.percentile(99),
+		}
+
+
+class SchemeStats:
+	"""Matching statistics of a single scheme or a group of schemes."""
+	def __init__(self):
+		self.calls = 0
+		self.matches = 0
+		self.modifications = 0
+		# full restarts of tree matching and restarts of modified subtree only
+		self.restarts = 0
+		self.region_restarts = 0
+		self.on_new_item_time = TimeStats()
+		self.on_matched_item_time = TimeStats()
+
+	def merge(self, other: SchemeStats):
+		self.calls += other.calls
+		self.matches += other.matches
+		self.modifications += other.modifications
+		self.restarts += other.restarts
+		self.region_restarts += other.region_restarts
+		self.on_new_item_time.merge(other.on_new_item_time)
+		self.on_matched_item_time.merge(other.on_matched_item_time)
+
+	def get_total_time(self) -> float:
+		return self.on_new_item_time.total + self.on_matched_item_time.total
+
+	def to_dict(self) -> dict:
+		return {
+			"calls": self.calls,
+			"matches": self.matches,
+			"modifications": self.modifications,
+			"restarts": self.restarts,
+			"region_restarts": self.region_restarts,
+			"on_new_item": self.on_new_item_time.to_dict(),
+			"on_matched_item": self.on_matched_item_time.to_dict(),
+		}
+
+
+class MatchingProfiler:
+	def __init__(self):
+		self.enabled = False
+		self.schemes : dict[str, SchemeStats] = {}
+
+	def get_scheme_stats(self, scheme_name: str) -> SchemeStats:
+		stats = self.schemes.get(scheme_name)
+		if stats is None:
+			stats = self.schemes[scheme_name] = SchemeStats()
+		return stats
+
+	def reset(self):
+		self.schemes.clear()
+
+
+__profiler = MatchingProfiler()
+
+def get_profiler() -> MatchingProfiler:
+	return __profiler
+
+
+"""PUBLIC API"""
+
+def enable_profiling():
+	"""Start collecting per scheme matching statistics."""
+	__profiler.enabled = True
+
+def disable_profiling():
+	"""Stop collecting matching statistics, collected ones are kept."""
+	__profiler.enabled = False
+
+def reset_profiling():
+	"""Drop collected matching statistics."""
+	__profiler.reset()
+
+def get_schemes_profile() -> dict[str, SchemeStats]:
+	"""Get matching statistics of schemes, {scheme_name -> SchemeStats}"""
+	return dict(__profiler.schemes)
+
+def print_profile(profile: dict[str, SchemeStats]|None = None):
+	"""Print matching statistics sorted by total time, schemes profile is printed by default."""
+	if profile is None:
+		profile = get_schemes_profile()
+
+	print("%-40s %9s %8s %8s %8s %10s %10s %10s" % ("name", "calls", "matches", "modified", "restarts", "total ms", "p50 us", "p99 us"))
+	for name, stats in sorted(profile.items(), key=lambda x: x[1].get_total_time(), reverse=True):
+		print("%-40s %9d %8d %8d %8d %10.2f %10.2f %10.2f" % (
+			name, stats.calls, stats.matches, stats.modifications, stats.restarts + stats.region_restarts,
+			stats.get_total_time() * 1000,
+			stats.on_new_item_time.percentile(50) * 1000000,
+			stats.on_new_item_time.percentile(99) * 1000000,
+		))
@@ -1,8 +1,14 @@
 from herast.tree.pattern_context import PatternContext
 from herast.tree.patterns.base_pattern import BasePat
+from herast.tree.pattern_compiler import get_pattern_checker
+from herast.settings import runtime_settings
 
 class Scheme:
 	"""Class with logic on what to do with successfully found patterns in AST"""
+	# pattern, that checker was made for, and whether it is compiled and optimized
+	__checker_key = None
+	__checker = None
+
 	def __init__(self, pattern: BasePat):
 		"""Scheme initialization
 
@@ -21,7 +27,17 @@ class Scheme:
 		:param ctx: matching context
 		:return: is item matched successfully?
 		"""
-		return self.pattern.check(item, ctx)
+		return self.get_pattern_checker()(item, ctx)
+
+	def get_pattern_checker(self):
+		"""Get function of (item, ctx), that checks item with scheme's pattern.
+		Pattern is optimized and compiled on first use if it is enabled in runtime settings.
+		"""
+		key = (self.pattern, (runtime_settings.COMPILE_PATTERNS, runtime_settings.OPTIMIZE_PATTERNS))
+		if self.__checker_key is None or self.__checker_key[0] is not key[0] or self.__checker_key[1] != key[1]:
+			self.__checker = get_pattern_checker(self.pattern)
+			self.__checker_key = key
+		return self.__checker
 
 	def on_matched_item(self, item, ctx: PatternContext) -> bool:
 		"""Callback for successful match of scheme's patterns on item.
@@ -0,0 +1,121 @@
+"""Cache of objects names and demangled names, that are used by patterns
+matching objects by name. Entries are invalidated on renames in IDB."""
+
+from __future__ import annotations
+import idaapi
+
+
+DEMANGLE_FLAGS = idaapi.MNG_NODEFINIT | idaapi.MNG_NORETTYPE
+
+# demangled name is resolved only when name itself did not match
+NOT_DEMANGLED = object()
+
+
+class SymbolCacheHooks(idaapi.IDB_Hooks):
+	def __init__(self, cache: SymbolCache):
+		super().__init__()
+		self.cache = cache
+
+	def renamed(self, ea, *args):
+		self.cache.invalidate(ea)
+		return 0
+
+	def closebase(self):
+		self.cache.invalidate()
+		return 0
+
+
+class SymbolCache:
+	"""Cache of "ea -> [name, demangled name]"."""
+	def __init__(self):
+		self.__entries : dict[int, list] = {}
+		self.hits = 0
+		self.misses = 0
+		# incremented on every invalidation, so results, derived from names, could be dropped
+		self.generation = 0
+		self.hooks : SymbolCacheHooks|None = None
+
+	def install_hooks(self):
+		if self.hooks is not None:
+			return
+		self.hooks = SymbolCacheHooks(self)
+		self.hooks.hook()
+
+	def remove_hooks(self):
+		if self.hooks is None:
+			return
+		self.hooks.unhook()
+		self.hooks = None
+
+	def __get_entry(self, ea) -> list:
+		entry = self.__entries.get(ea)
+		if entry is not None:
+			self.hits += 1
+			return entry
+
+		self.misses += 1
+		# renames are hooked since names are cached
+		self.install_hooks()
+		entry = self.__entries[ea] = [idaapi.get_name(ea), NOT_DEMANGLED]
+		return entry
+
+	def __get_demangled(self, entry: list) -> str|None:
+		if entry[1] is NOT_DEMANGLED:
+			entry[1] = idaapi.demangle_name(entry[0], DEMANGLE_FLAGS) if entry[0] else None
+		return entry[1]
+
+	def get_name(self, ea) -> str:
+		return self.__get_entry(ea)[0]
+
+	def get_demangled_name(self, ea) -> str|None:
+		return self.__get_demangled(self.__get_entry(ea))
+
+	def is_named(self, ea, name: str) -> bool:
+		"""Whether object's name or demangled name is equal to given name."""
+		entry = self.__get_entry(ea)
+		if entry[0] == name:
+			return True
+		return self.__get_demangled(entry) == name
+
+	def is_named_any(self, ea, names) -> bool:
+		"""Whether object's name or demangled name is in given names."""
+		entry = self.__get_entry(ea)
+		if entry[0] in names:
+			return True
+		return self.__get_demangled(entry) in names
+
+	def invalidate(self, ea=None):
+		"""Drop cached names of object, all names are dropped by default."""
+		self.generation += 1
+		if ea is None:
+			self.__entries.clear()
+		else:
+			self.__entries.pop(ea, None)
+
+	def get_hit_rate(self) -> float:
+		total = self.hits + self.misses
+		return self.hits / total if total else 0.0
+
+	def __len__(self):
+		return len(self.__entries)
+
+
+__symbol_cache = SymbolCache()
+
+def get_symbol_cache() -> SymbolCache:
+	"""Get cache of objects names. Renames are hooked since first use."""
+	__symbol_cache.install_hooks()
+	return __symbol_cache
+
+def reset_symbol_cache():
+	"""Drop cached names and hook renames again, e.g. when IDB is changed."""
+	global __symbol_cache
+	__symbol_cache.remove_hooks()
+	__symbol_cache = SymbolCache()
+	__symbol_cache.install_hooks()
+
+def is_object_named(ea, name: str) -> bool:
+	return __symbol_cache.is_named(ea, name)
+
+def is_object_named_any(ea, names) -> bool:
+	return __symbol_cache.is_named_any(ea, names)